@@ -0,0 +1,8 @@
+"""
+Benchmarks for the mysql_distill package
+
+Run with plain Python from the repository root:
+
+    python -m benchmarks
+    python -m benchmarks --engine lexer --output results.json
+"""
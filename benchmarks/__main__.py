@@ -0,0 +1,146 @@
+"""
+Usage:
+    python -m benchmarks
+    python -m benchmarks --engine lexer --corpus tests --corpus mysqldump
+    python -m benchmarks --min-time 5 --output results.json
+
+Each function is timed over each corpus, one call per query, for at least
+--min-time seconds. The results are written as JSON with the throughput
+in queries per second and the per-call latency percentiles in
+microseconds.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+import mysql_distill
+from benchmarks import corpus
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "distill": mysql_distill.distill,
+    "distill_verbs": mysql_distill.distill_verbs,
+    "get_tables": mysql_distill.get_tables,
+    "strip_comments": mysql_distill.strip_comments,
+}
+
+
+def percentile(latencies: List[int], percent: float) -> float:
+    """
+    Get a percentile of sorted latencies by nearest rank
+
+    :param latencies: Sorted latencies in nanoseconds
+    :param percent: The percentile, between 0 and 100
+    :return: The latency in microseconds
+    """
+    index = min(len(latencies) - 1, int(percent / 100 * len(latencies)))
+    return latencies[index] / 1000
+
+
+def run(
+    function: Callable[[str], Any], queries: List[str], min_time: float
+) -> Dict[str, Any]:
+    """
+    Time a function over a corpus
+
+    The corpus is run once to warm up, then repeatedly until min_time has
+    passed.
+
+    :param function: The function to time
+    :param queries: The queries to call it with
+    :param min_time: The minimum measuring time in seconds
+    :return: The result record
+    """
+    perf_counter_ns = time.perf_counter_ns
+    for query in queries:
+        function(query)
+
+    latencies: List[int] = []
+    rounds = 0
+    total = 0
+    deadline = min_time * 1e9
+    while total < deadline or not rounds:
+        for query in queries:
+            start = perf_counter_ns()
+            function(query)
+            latency = perf_counter_ns() - start
+            latencies.append(latency)
+            total += latency
+        rounds += 1
+
+    latencies.sort()
+    return {
+        "queries": len(queries),
+        "characters": sum(map(len, queries)),
+        "rounds": rounds,
+        "calls": len(latencies),
+        "seconds": total / 1e9,
+        "queries_per_second": len(latencies) / (total / 1e9),
+        "latency_us": {
+            "min": latencies[0] / 1000,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] / 1000,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "--function",
+        action="append",
+        choices=tuple(FUNCTIONS),
+        help="function to time, repeatable (default: all)",
+    )
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        choices=tuple(corpus.CORPORA),
+        help="corpus to time with, repeatable (default: all)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=mysql_distill.ENGINES,
+        default=mysql_distill.ENGINE_REGEX,
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="minimum seconds per function and corpus",
+    )
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    mysql_distill.disable_cache()
+    mysql_distill.set_engine(args.engine)
+
+    results = []
+    for corpus_name, queries in corpus.corpora(args.corpus or list(corpus.CORPORA)):
+        for function_name in args.function or FUNCTIONS:
+            result = run(FUNCTIONS[function_name], queries, args.min_time)
+            results.append({"function": function_name, "corpus": corpus_name, **result})
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "engine": args.engine,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+            output.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Query corpora for the benchmarks
+
+The test corpora are the literal queries passed to distill(), get_tables()
+and strip_comments() in the test suite, extracted from the test modules'
+source so that they follow the tests as these change. The synthetic
+corpora are stress cases that are generated deterministically.
+"""
+import ast
+import os
+
+from typing import Callable, Dict, Iterator, List, Tuple
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests")
+
+_test_modules = ("test_parser.py", "test_rewriter.py")
+_query_functions = {"distill", "get_tables", "strip_comments", "_test_query"}
+
+
+def test_queries() -> List[str]:
+    """
+    Get the queries used in the parser and rewriter tests
+
+    :return: The distinct queries in order of appearance
+    """
+    queries: Dict[str, None] = {}
+    for name in _test_modules:
+        with open(os.path.join(TESTS, name)) as module:
+            tree = ast.parse(module.read())
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in _query_functions
+                and node.args
+            ):
+                try:
+                    query = ast.literal_eval(node.args[0])
+                except ValueError:
+                    continue
+                if isinstance(query, str):
+                    queries[query] = None
+    return list(queries)
+
+
+def multi_row_insert(size: int = 1 << 20) -> str:
+    """
+    A multi-row INSERT of at least size characters
+    """
+    rows: List[str] = []
+    length = 0
+    i = 0
+    while length < size:
+        row = f"({i},'name {i}','2023-05-01 10:00:{i % 60:02d}',{i * 0.5},NULL)"
+        rows.append(row)
+        length += len(row) + 1
+        i += 1
+    return (
+        "INSERT INTO `shop`.`orders` (`id`,`name`,`created`,`amount`,`note`) "
+        "VALUES " + ",".join(rows)
+    )
+
+
+def nested_subqueries(depth: int = 50) -> str:
+    """
+    A SELECT with subqueries nested depth levels deep
+    """
+    query = f"SELECT id FROM t{depth} WHERE a = 1"
+    for level in range(depth - 1, -1, -1):
+        query = f"SELECT id FROM t{level} WHERE id IN ({query})"
+    return query
+
+
+def in_list(size: int = 10000) -> str:
+    """
+    A SELECT with an IN list of size elements
+    """
+    items = ",".join(str(i) for i in range(size))
+    return (
+        "SELECT * FROM users u JOIN accounts a ON a.id = u.id "
+        f"WHERE u.id IN ({items})"
+    )
+
+
+def mysqldump_statements() -> List[str]:
+    """
+    Comment-heavy statements as written by mysqldump
+    """
+    statements = [
+        "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */",
+        "/*!40101 SET NAMES utf8mb4 */",
+        "/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */",
+        "/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */",
+    ]
+    for i in range(20):
+        statements += [
+            f"--\n-- Table structure for table `t{i}`\n--\n\n"
+            f"DROP TABLE IF EXISTS `t{i}`",
+            "/*!40101 SET @saved_cs_client     = @@character_set_client */",
+            f"CREATE TABLE `t{i}` (\n"
+            "  `id` int(11) NOT NULL AUTO_INCREMENT, -- surrogate key\n"
+            "  `name` varchar(255) DEFAULT NULL /* display name */,\n"
+            "  PRIMARY KEY (`id`)\n"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 /* generated */",
+            f"--\n-- Dumping data for table `t{i}`\n--\n\nLOCK TABLES `t{i}` WRITE",
+            f"/*!40000 ALTER TABLE `t{i}` DISABLE KEYS */",
+            f"INSERT INTO `t{i}` VALUES (1,'a /* not a comment */'),(2,'-- nor this')",
+            f"/*!40000 ALTER TABLE `t{i}` ENABLE KEYS */",
+            "UNLOCK TABLES",
+        ]
+    return statements
+
+
+CORPORA: Dict[str, Callable[[], List[str]]] = {
+    "tests": test_queries,
+    "insert_1mb": lambda: [multi_row_insert()],
+    "nested_subqueries": lambda: [nested_subqueries()],
+    "in_list_10k": lambda: [in_list()],
+    "mysqldump": mysqldump_statements,
+}
+
+
+def corpora(names: List[str]) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Build the named corpora
+
+    :param names: Names from CORPORA
+    :return: Iterator of (name, queries) tuples
+    """
+    for name in names:
+        yield name, CORPORA[name]()
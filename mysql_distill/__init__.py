@@ -7,5 +7,20 @@ A simple MySQL query distiller.
 :license: MIT, see LICENSE for more details.
 """
 from mysql_distill import *
+from mysql_distill.cache import *
+from mysql_distill.interning import *
+from mysql_distill.limits import *
+from mysql_distill.prepared import *
+from mysql_distill.tokenizer import *
 from mysql_distill.parser import *
 from mysql_distill.rewriter import *
+from mysql_distill.slowlog import *
+from mysql_distill.generallog import *
+from mysql_distill.pcap import *
+from mysql_distill.exports import *
+from mysql_distill.splitter import *
+from mysql_distill.aggregate import *
+from mysql_distill.topn import *
+from mysql_distill.access import *
+from mysql_distill.output import *
+from mysql_distill.stats import *
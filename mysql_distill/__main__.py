@@ -2,25 +2,478 @@
 Usage:
     mysql-distill --query "SELECT * FROM table WHERE id = 1"
     cat queries.sql | mysql-distill
+    cat queries.sql | mysql-distill --jobs 8
+    cat queries.txt | mysql-distill --input-format lines
+    mysql-distill --input-format slowlog < slow.log
+    mysql-distill --input-format slowlog --aggregate < slow.log
+    mysql-distill --input-format generallog --file general.log
+    mysql-distill --input-format pcap --port 3306 --aggregate < mysql.pcap
+    mysql-distill --input-format slowlog --top 50 --weight query_time < slow.log
+    mysql-distill --input-format slowlog --tables < slow.log
+    mysql-distill --input-format csv --query-field SQL_TEXT \
+        --field TIMER_WAIT=query_time --field ROWS_EXAMINED --time-unit ps \
+        --aggregate --file events_statements_history_long.csv
+    mysql-distill --input-format jsonl --query-field general_data.query < audit.log
+    mysql-distill --input-format slowlog --output-format jsonl --fingerprint < slow.log
+    mysql-distill --stats < queries.sql > /dev/null
+    mysql-distill --max-query-length 65536 < dump.sql
+    mysql-distill --file dump1.sql --file dump2.sql --jobs 0
 """
 import argparse
-import re
 import sys
 
-import mysql_distill
-
-parser = argparse.ArgumentParser()
-parser.add_argument("--query")
-args = parser.parse_args()
-
-if args.query:
-    print(mysql_distill.distill(args.query))
-else:
-    for line in sys.stdin:
-        query = line.rstrip().split(";")[0]  # Split on ';', get first part
-        query = re.sub(
-            r"^#.*$", "", query, flags=re.MULTILINE
-        )  # Remove lines starting with '#'
-        query = query.lstrip()  # Remove leading whitespaces
-        if re.match(r"^[\w(]", query):  # Continue if query starts with a word character
-            print(mysql_distill.distill(query))
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from mysql_distill import (
+    access,
+    aggregate,
+    exports,
+    generallog,
+    mapped,
+    output,
+    parallel,
+    pcap,
+    slowlog,
+    splitter,
+    stats,
+    topn,
+)
+
+# The input formats read as logs of records
+_log_formats = ("slowlog", "generallog", "pcap", "csv", "jsonl")
+
+# The input formats read as exports of records
+_export_formats = ("csv", "jsonl")
+
+# The seconds per unit of --time-unit
+_time_units = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9, "ps": 1e-12}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--query")
+    parser.add_argument(
+        "--file",
+        action="append",
+        dest="files",
+        metavar="PATH",
+        help="memory-map and distill this file instead of stdin, can be repeated",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=(
+            "statements",
+            "lines",
+            "slowlog",
+            "generallog",
+            "pcap",
+            "csv",
+            "jsonl",
+        ),
+        default="statements",
+        help="SQL statements separated by the delimiter (default), one query "
+        "per line, a MySQL slow query log, a MySQL general query log, a "
+        "pcap capture of MySQL traffic, or a CSV or JSON lines export",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        action="append",
+        dest="ports",
+        help="with --input-format pcap, the MySQL server port (default 3306), "
+        "can be repeated",
+    )
+    parser.add_argument(
+        "--query-field",
+        metavar="NAME",
+        help="with --input-format csv or jsonl, the column or field of the "
+        "query text, e.g. general_data.query",
+    )
+    parser.add_argument(
+        "--field",
+        action="append",
+        dest="fields",
+        metavar="NAME[=ATTRIBUTE]",
+        help="with --input-format csv or jsonl, pass this column or field "
+        "through as an attribute, e.g. TIMER_WAIT=query_time, can be repeated",
+    )
+    parser.add_argument(
+        "--time-unit",
+        choices=tuple(_time_units),
+        help="with --input-format csv or jsonl, the unit of the query_time "
+        "and lock_time attributes (default s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="distill the input in N worker processes, 0 for one per CPU",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="with --jobs, write output as soon as it is ready",
+    )
+    parser.add_argument(
+        "--aggregate",
+        action="store_true",
+        help="write one line per class with counts and query time statistics",
+    )
+    parser.add_argument(
+        "--tables",
+        action="store_true",
+        help="write one line per table with query counts and query time by "
+        "access type",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        metavar="N",
+        help="write the N most frequent classes, counted in fixed memory, with "
+        "the maximum error of each count",
+    )
+    parser.add_argument(
+        "--counters",
+        type=int,
+        metavar="M",
+        help="with --top, the number of classes counted at a time (default 10 "
+        "times N), more counters give lower errors",
+    )
+    parser.add_argument(
+        "--weight",
+        metavar="ATTRIBUTE",
+        help="with --top, weight queries by this attribute, e.g. query_time",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=output.OUTPUT_FORMATS,
+        default="text",
+        help="one class per line (default), or one record per query with its "
+        "class, verbs, tables, attributes and query as TSV, CSV or JSON lines",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="with --output-format tsv, csv or jsonl, add the fingerprint and "
+        "checksum of each query",
+    )
+    parser.add_argument(
+        "--attribute",
+        action="append",
+        dest="attributes",
+        metavar="NAME",
+        help="with --output-format tsv, csv or jsonl, write this attribute, "
+        "can be repeated (default: all, or those of the first query for tsv "
+        "and csv)",
+    )
+    parser.add_argument(
+        "--max-query-length",
+        type=int,
+        metavar="N",
+        help="distill longer queries from their first N characters",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="write per-stage timings and branch counts to stderr",
+    )
+    args = parser.parse_args(argv)
+
+    if args.query and args.files:
+        parser.error("--query cannot be combined with --file")
+    if args.query and args.aggregate:
+        parser.error("--aggregate cannot be combined with --query")
+    if args.query and args.top is not None:
+        parser.error("--top cannot be combined with --query")
+    if args.query and args.tables:
+        parser.error("--tables cannot be combined with --query")
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.unordered and args.jobs == 1:
+        parser.error("--unordered requires --jobs")
+    if args.jobs != 1 and args.input_format in _log_formats:
+        parser.error(f"--jobs is not supported with --input-format {args.input_format}")
+    if args.ports and args.input_format != "pcap":
+        parser.error("--port requires --input-format pcap")
+    if (
+        args.query_field or args.fields or args.time_unit
+    ) and args.input_format not in _export_formats:
+        parser.error(
+            "--query-field, --field and --time-unit require --input-format csv "
+            "or jsonl"
+        )
+    if args.aggregate + (args.top is not None) + args.tables > 1:
+        parser.error("--aggregate, --top and --tables cannot be combined")
+    if args.tables and args.jobs != 1:
+        parser.error("--jobs is not supported with --tables")
+    if args.top is not None:
+        if args.top < 1:
+            parser.error("--top must be positive")
+        if args.counters is not None and args.counters < args.top:
+            parser.error("--counters must be at least --top")
+    elif args.counters is not None or args.weight:
+        parser.error("--counters and --weight require --top")
+    if args.output_format != "text":
+        if args.aggregate or args.top is not None or args.tables:
+            parser.error("--aggregate, --top and --tables require --output-format text")
+        if args.jobs != 1:
+            parser.error("--jobs requires --output-format text")
+    elif args.fingerprint or args.attributes:
+        parser.error(
+            "--fingerprint and --attribute require --output-format tsv, csv or jsonl"
+        )
+    if args.max_query_length is not None and args.max_query_length < 1:
+        parser.error("--max-query-length must be positive")
+    if args.jobs != 1 and args.stats:
+        parser.error("--jobs is not supported with --stats")
+
+    collector = stats.enable_stats() if args.stats else None
+    try:
+        _run(args)
+    finally:
+        if collector is not None:
+            stats.disable_stats()
+            print(collector.report(), file=sys.stderr)
+
+
+def _run(args: argparse.Namespace) -> None:
+    """
+    Distill the input selected on the command line
+
+    :param args: The parsed command line
+    """
+    max_length = args.max_query_length
+    if args.aggregate:
+        aggregator = aggregate.Aggregator()
+        if args.input_format in _log_formats:
+            for record in _log_records(args):
+                aggregator.add_class(
+                    parallel.distill_query(record.query, max_length),
+                    record.attributes,
+                )
+        else:
+            for line in _distilled_lines(args):
+                aggregator.add_class(line)
+        for line in aggregator.report():
+            print(line)
+    elif args.top is not None:
+        summary = topn.SpaceSaving(args.counters or 10 * args.top, args.weight)
+        if args.input_format in _log_formats:
+            for record in _log_records(args):
+                summary.add_class(
+                    parallel.distill_query(record.query, max_length),
+                    record.attributes,
+                )
+        else:
+            for line in _distilled_lines(args):
+                summary.add_class(line)
+        for line in summary.report(args.top):
+            print(line)
+    elif args.tables:
+        matrix = access.TableAccess()
+        for query, attributes in _queries(args):
+            matrix.add_distilled(
+                output.distill_record(query, max_length)[0], attributes
+            )
+        for line in matrix.report():
+            print(line)
+    elif (
+        args.output_format == "text"
+        and not args.query
+        and args.input_format not in _log_formats
+        and (args.jobs != 1 or args.files)
+    ):
+        for block in _distilled_blocks(args):
+            sys.stdout.write(block)
+    else:
+        # A terminal shows each class as soon as it is distilled
+        buffer_size = 0 if sys.stdout.isatty() else output.DEFAULT_BUFFER_SIZE
+        with output.RecordWriter(
+            sys.stdout,
+            args.output_format,
+            args.attributes,
+            args.fingerprint,
+            buffer_size,
+        ) as writer:
+            for query, attributes in _queries(args):
+                distilled, fingerprint = output.distill_record(
+                    query, max_length, args.fingerprint
+                )
+                writer.write(query, distilled, attributes, fingerprint)
+
+
+def _queries(
+    args: argparse.Namespace,
+) -> Iterator[Tuple[str, Optional[Mapping[str, Any]]]]:
+    """
+    Read the queries of the input, with their attributes
+
+    :param args: The parsed command line
+    :return: Iterator of queries and their attributes, or None
+    """
+    if args.query:
+        yield args.query, None
+    elif args.input_format in _log_formats:
+        for record in _log_records(args):
+            yield record.query, record.attributes
+    elif not args.files:
+        for query in _stream_queries(sys.stdin, args.input_format == "statements"):
+            yield query, None
+    else:
+        for path in args.files:
+            with open(path, errors="replace") as stream:
+                for query in _stream_queries(stream, args.input_format == "statements"):
+                    yield query, None
+
+
+def _stream_queries(stream: TextIO, statements: bool) -> Iterator[str]:
+    """
+    Read the statements or lines of a stream
+
+    :param stream: The stream
+    :param statements: Split the stream into statements instead of lines
+    :return: Iterator of queries
+    """
+    if statements:
+        yield from splitter.split_statements(stream)
+        return
+    for line in stream:
+        query = parallel.prepare_line(line)
+        if query is not None:
+            yield query
+
+
+def _log_records(
+    args: argparse.Namespace,
+) -> Iterator[
+    Union[
+        slowlog.SlowLogRecord,
+        generallog.GeneralLogRecord,
+        pcap.CapturedQuery,
+        exports.ExportRecord,
+    ]
+]:
+    """
+    Parse the logs, captures or exports given with --file, or stdin
+
+    :param args: The parsed command line
+    :return: Iterator of records
+    """
+    if args.input_format == "pcap":
+        ports = args.ports or pcap.DEFAULT_SERVER_PORTS
+        if not args.files:
+            yield from pcap.read_pcap(sys.stdin.buffer, ports)
+            return
+        for path in args.files:
+            with open(path, "rb") as capture:
+                yield from pcap.read_pcap(capture, ports)
+        return
+
+    if args.input_format in _export_formats:
+        read: Callable[
+            [Iterable[str], Optional[str], Mapping[str, str], float],
+            Iterator[exports.ExportRecord],
+        ]
+        if args.input_format == "csv":
+            read = exports.read_csv_export
+        else:
+            read = exports.read_jsonl_export
+        fields = _export_fields(args.fields or ())
+        time_unit = _time_units[args.time_unit or "s"]
+        if not args.files:
+            yield from read(sys.stdin, args.query_field, fields, time_unit)
+            return
+        for path in args.files:
+            yield from read(
+                mapped.read_lines(path), args.query_field, fields, time_unit
+            )
+        return
+
+    parse: Callable[
+        [Iterable[str]],
+        Iterator[Union[slowlog.SlowLogRecord, generallog.GeneralLogRecord]],
+    ]
+    if args.input_format == "slowlog":
+        parse = slowlog.parse_slow_log
+    else:
+        parse = generallog.parse_general_log
+    if not args.files:
+        yield from parse(sys.stdin)
+        return
+    for path in args.files:
+        yield from parse(mapped.read_lines(path))
+
+
+def _export_fields(fields: Sequence[str]) -> Dict[str, str]:
+    """
+    Map the fields given with --field to their attribute names
+
+    :param fields: NAME or NAME=ATTRIBUTE, by default the lower-cased last
+        part of the name
+    :return: The attribute names by field
+    """
+    attributes = {}
+    for field in fields:
+        name, _, attribute = field.partition("=")
+        attributes[name] = attribute or name.rpartition(".")[2].lower()
+    return attributes
+
+
+def _distilled_blocks(args: argparse.Namespace) -> Iterator[str]:
+    """
+    Distill the statements or lines of the input in blocks
+
+    Files given with --file are memory-mapped, see mapped.distill_files().
+
+    :param args: The parsed command line
+    :return: Iterator of output blocks, one class per line
+    """
+    statements = args.input_format == "statements"
+    if args.files:
+        return mapped.distill_files(
+            args.files,
+            args.jobs,
+            ordered=not args.unordered,
+            statements=statements,
+            max_length=args.max_query_length,
+        )
+    return parallel.distill_parallel(
+        sys.stdin,
+        args.jobs,
+        ordered=not args.unordered,
+        statements=statements,
+        max_length=args.max_query_length,
+    )
+
+
+def _distilled_lines(args: argparse.Namespace) -> Iterator[str]:
+    """
+    Distill the statements or lines of the input
+
+    :param args: The parsed command line
+    :return: Iterator of classes
+    """
+    max_length = args.max_query_length
+    if args.jobs != 1 or args.files:
+        for block in _distilled_blocks(args):
+            yield from block.splitlines()
+    else:
+        for query in _stream_queries(sys.stdin, args.input_format == "statements"):
+            yield parallel.distill_query(query, max_length)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Per-table access matrix
+
+This file is part of the mysql_distill package.
+
+A TableAccess aggregates queries by table instead of by class. For every
+table it counts the queries and sums their query time per access type,
+one of ACCESS_TYPES, and keeps the classes of the queries that touched
+it. The access type of a query comes from its first verb:
+
+    SELECT, INSERT, UPDATE, DELETE, REPLACE, LOCK  as is
+    LOAD DATA                                      INSERT
+    CREATE, ALTER, DROP, RENAME, TRUNCATE          DDL
+
+A write statement writes to its first table. Its other tables are
+counted as SELECT if the statement has a SELECT, e.g. INSERT ... SELECT
+or a subquery, and under the statement's verb otherwise, since a
+multi-table UPDATE or DELETE can write to any of them. Queries of other
+types, e.g. SHOW, are not counted. The query time of a query is added to
+each of its tables.
+
+The counters are two flat arrays with one row of len(ACCESS_TYPES) slots
+per table, 112 bytes per table. The inverted index from tables to classes
+holds an array of class ids per table. The slots a class adds to are
+resolved when the class is first seen, and the index is updated then.
+Adding another query of a known class only increments array slots.
+"""
+from array import array
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from mysql_distill.rewriter import KIND_DDL, DistilledQuery, distill_result
+
+__all__ = ["ACCESS_TYPES", "TableAccess"]
+
+ACCESS_TYPES: Tuple[str, ...] = (
+    "SELECT",
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "REPLACE",
+    "DDL",
+    "LOCK",
+)
+
+_access_indexes: Dict[str, int] = {
+    **{name: index for index, name in enumerate(ACCESS_TYPES)},
+    "LOAD": ACCESS_TYPES.index("INSERT"),
+}
+_select = ACCESS_TYPES.index("SELECT")
+_ddl = ACCESS_TYPES.index("DDL")
+_zero_counts = array("Q", bytes(8 * len(ACCESS_TYPES)))
+_zero_times = array("d", bytes(8 * len(ACCESS_TYPES)))
+_writes = frozenset(
+    ACCESS_TYPES.index(name) for name in ("INSERT", "UPDATE", "DELETE", "REPLACE")
+)
+
+
+class TableAccess:
+    """
+    Count queries and sum their query time per table and access type
+    """
+
+    def __init__(self) -> None:
+        # The tables, in the order they were first seen
+        self.tables: List[str] = []
+        # The query counts and times, len(ACCESS_TYPES) slots per table
+        self.counts = array("Q")
+        self.times = array("d")
+        self._table_indexes: Dict[str, int] = {}
+        # The ids of the classes that touched each table
+        self._table_classes: List[array] = []
+        self._classes: List[str] = []
+        self._class_ids: Dict[str, int] = {}
+        self._class_slots: Dict[str, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def add(self, query: str, attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """
+        Distill a query and add it to its tables
+
+        :param query: The query
+        :param attributes: Its attributes, e.g. SlowLogRecord.attributes
+        :return: The class of the query
+        """
+        distilled = distill_result(query)
+        self.add_distilled(distilled, attributes)
+        return distilled.canonical
+
+    def add_distilled(
+        self, distilled: DistilledQuery, attributes: Optional[Mapping[str, Any]] = None
+    ) -> None:
+        """
+        Add an already distilled query
+
+        :param distilled: The distilled query, see distill_result()
+        :param attributes: Its attributes, the query_time is summed
+        """
+        slots = self._class_slots.get(distilled.canonical)
+        if slots is None:
+            slots = self._add_class(distilled)
+        if not slots:
+            return
+        counts = self.counts
+        for slot in slots:
+            counts[slot] += 1
+        query_time = attributes.get("query_time") if attributes else None
+        if isinstance(query_time, (int, float)):
+            times = self.times
+            for slot in slots:
+                times[slot] += query_time
+
+    def merge(self, other: "TableAccess") -> None:
+        """
+        Add the tables of another matrix
+
+        :param other: The matrix to merge into this one
+        """
+        width = len(ACCESS_TYPES)
+        for other_index, table in enumerate(other.tables):
+            index = self._table_index(table)
+            for offset in range(width):
+                slot = index * width + offset
+                other_slot = other_index * width + offset
+                self.counts[slot] += other.counts[other_slot]
+                self.times[slot] += other.times[other_slot]
+            classes = self._table_classes[index]
+            for other_id in other._table_classes[other_index]:
+                class_id = self._class_id(other._classes[other_id])
+                if class_id not in classes:
+                    classes.append(class_id)
+
+    def get_counts(self, table: str) -> Dict[str, int]:
+        """
+        Get the number of queries per access type of a table
+
+        :param table: The table, as distill() reports it
+        :return: The counts by access type, empty for an unknown table
+        """
+        return self._row(self.counts, table)
+
+    def get_times(self, table: str) -> Dict[str, float]:
+        """
+        Get the total query time per access type of a table
+
+        :param table: The table, as distill() reports it
+        :return: The query times by access type, empty for an unknown table
+        """
+        return self._row(self.times, table)
+
+    def get_classes(self, table: str) -> List[str]:
+        """
+        Get the classes of the queries that touched a table
+
+        :param table: The table, as distill() reports it
+        :return: The classes, in the order they were first seen
+        """
+        index = self._table_indexes.get(table)
+        if index is None:
+            return []
+        classes = sorted(self._table_classes[index])
+        return [self._classes[class_id] for class_id in classes]
+
+    def most_accessed(self) -> List[str]:
+        """
+        Get the tables, most queried first
+
+        Tables with the same count are ordered by total query time.
+
+        :return: The tables
+        """
+        width = len(ACCESS_TYPES)
+        keys = {
+            table: (
+                -sum(self.counts[index * width : (index + 1) * width]),
+                -sum(self.times[index * width : (index + 1) * width]),
+                table,
+            )
+            for index, table in enumerate(self.tables)
+        }
+        return sorted(self.tables, key=keys.__getitem__)
+
+    def report(self) -> Iterator[str]:
+        """
+        Format the tables as tab-separated lines, most queried first
+
+        :return: Iterator of lines without newlines, starting with a header
+        """
+        names = [name.lower() for name in ACCESS_TYPES]
+        times = [f"{name}_query_time" for name in names]
+        yield "\t".join(["table"] + names + times + ["class_count"])
+        width = len(ACCESS_TYPES)
+        for table in self.most_accessed():
+            index = self._table_indexes[table]
+            start = index * width
+            yield "\t".join(
+                [table]
+                + [str(count) for count in self.counts[start : start + width]]
+                + [f"{time:.6f}" for time in self.times[start : start + width]]
+                + [str(len(self._table_classes[index]))]
+            )
+
+    def _add_class(self, distilled: DistilledQuery) -> Tuple[int, ...]:
+        """
+        Resolve the slots a class adds to and index its tables
+
+        :param distilled: The distilled query
+        :return: The slots, one per table and access type
+        """
+        class_id = self._class_id(distilled.canonical)
+        width = len(ACCESS_TYPES)
+        slots: List[int] = []
+        for table, access in _table_accesses(distilled):
+            index = self._table_index(table)
+            slot = index * width + access
+            if slot not in slots:
+                slots.append(slot)
+            classes = self._table_classes[index]
+            if not classes or classes[-1] != class_id:
+                classes.append(class_id)
+        self._class_slots[distilled.canonical] = result = tuple(slots)
+        return result
+
+    def _class_id(self, distilled: str) -> int:
+        """
+        Get the id of a class, registering new classes
+
+        :param distilled: The class
+        :return: Its position in the list of classes
+        """
+        class_id = self._class_ids.get(distilled)
+        if class_id is None:
+            class_id = self._class_ids[distilled] = len(self._classes)
+            self._classes.append(distilled)
+        return class_id
+
+    def _table_index(self, table: str) -> int:
+        """
+        Get the row of a table, adding a row for new tables
+
+        :param table: The table
+        :return: Its position in the list of tables
+        """
+        index = self._table_indexes.get(table)
+        if index is None:
+            index = self._table_indexes[table] = len(self.tables)
+            self.tables.append(table)
+            self._table_classes.append(array("I"))
+            self.counts.extend(_zero_counts)
+            self.times.extend(_zero_times)
+        return index
+
+    def _row(self, values: array, table: str) -> Dict[str, Any]:
+        """
+        Get the values of a table by access type
+
+        :param values: The counts or times
+        :param table: The table
+        :return: The values by access type, empty for an unknown table
+        """
+        index = self._table_indexes.get(table)
+        if index is None:
+            return {}
+        start = index * len(ACCESS_TYPES)
+        return dict(zip(ACCESS_TYPES, values[start : start + len(ACCESS_TYPES)]))
+
+
+def _table_accesses(distilled: DistilledQuery) -> List[Tuple[str, int]]:
+    """
+    Get the tables of a distilled query and how it accesses them
+
+    :param distilled: The distilled query
+    :return: The tables and their access type indexes, empty if the query
+        is not of one of ACCESS_TYPES
+    """
+    if not distilled.tables:
+        return []
+    if distilled.kind == KIND_DDL:
+        access = _ddl
+    else:
+        first = distilled.verbs[0] if distilled.verbs else ""
+        access = _access_indexes.get(first, -1)
+        if access < 0 or access == _ddl:
+            return []
+    accesses = [(distilled.tables[0], access)]
+    others = access
+    if access in _writes and "SELECT" in distilled.verbs:
+        others = _select
+    accesses += [(table, others) for table in distilled.tables[1:]]
+    return accesses
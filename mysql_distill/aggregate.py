@@ -0,0 +1,315 @@
+"""
+Streaming per-class aggregation
+
+This file is part of the mysql_distill package.
+
+An Aggregator groups queries by their distill() class and keeps, for each
+class, the count and the sum, minimum and maximum of the query time, lock
+time and rows examined, plus a LatencyHistogram of the query time for
+approximate percentiles. Memory use depends on the number of classes, not
+on the number of queries.
+
+LatencyHistogram is a log-bucketed histogram in the spirit of HDR
+histograms: every value in a bucket is within a fixed relative error of
+the bucket's representative value, and the buckets cover a fixed range,
+so the memory per class is bounded. Histograms and aggregators with the
+same accuracy can be merged, e.g. to combine the results of several logs.
+"""
+import math
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from mysql_distill.rewriter import distill
+
+DEFAULT_RELATIVE_ACCURACY: float = 0.01
+
+_metrics: Tuple[str, ...] = ("query_time", "lock_time", "rows_examined")
+
+
+class LatencyHistogram:
+    """
+    A mergeable histogram with log-sized buckets
+
+    Values up to min_value share the lowest bucket and values above
+    max_value the highest one. In between, percentiles are accurate to
+    within relative_accuracy.
+    """
+
+    __slots__ = (
+        "relative_accuracy",
+        "count",
+        "zero_count",
+        "buckets",
+        "_gamma",
+        "_min_index",
+        "_max_index",
+    )
+
+    def __init__(
+        self,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        min_value: float = 1e-6,
+        max_value: float = 1e6,
+    ):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.zero_count = 0
+        self.buckets: Dict[int, int] = {}
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._min_index = self._index(min_value)
+        self._max_index = self._index(max_value)
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value, self._gamma))
+
+    def add(self, value: float, count: int = 1) -> None:
+        """
+        Add a value
+
+        :param value: The value, e.g. a query time in seconds
+        :param count: The number of times to add it
+        """
+        self.count += count
+        index = self._index(value) if value > 0 else self._min_index
+        if index <= self._min_index:
+            self.zero_count += count
+            return
+        if index > self._max_index:
+            index = self._max_index
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Add the values of another histogram with the same accuracy
+
+        :param other: The histogram to merge into this one
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge histograms of different accuracy")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Get an approximate percentile
+
+        :param percent: The percentile, between 0 and 100
+        :return: The value, or None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        index = self._min_index
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                break
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+
+class Metric:
+    """
+    Sum, minimum and maximum of one attribute
+    """
+
+    __slots__ = ("sum", "min", "max")
+
+    def __init__(self) -> None:
+        self.sum: float = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "Metric") -> None:
+        if other.min is None or other.max is None:
+            return
+        self.sum += other.sum
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+
+class ClassStats:
+    """
+    The aggregated statistics of one query class
+
+    Metrics are only present once a query with that attribute was added.
+    """
+
+    __slots__ = ("count", "metrics", "histogram")
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.count = 0
+        self.metrics: Dict[str, Metric] = {}
+        self.histogram = LatencyHistogram(relative_accuracy)
+
+    def add(self, attributes: Optional[Mapping[str, Any]] = None) -> None:
+        self.count += 1
+        if not attributes:
+            return
+        for name in _metrics:
+            value = attributes.get(name)
+            if isinstance(value, (int, float)):
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = Metric()
+                metric.add(value)
+                if name == "query_time":
+                    self.histogram.add(value)
+
+    def merge(self, other: "ClassStats") -> None:
+        self.count += other.count
+        for name, other_metric in other.metrics.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric()
+            metric.merge(other_metric)
+        self.histogram.merge(other.histogram)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Get an approximate percentile of the query time
+
+        :param percent: The percentile, between 0 and 100
+        :return: The query time, or None if no query time was recorded
+        """
+        value = self.histogram.percentile(percent)
+        query_time = self.metrics.get("query_time")
+        if value is None or query_time is None:
+            return value
+        # The exact extremes are known, so never report a value beyond them
+        return min(max(value, query_time.min), query_time.max)  # type: ignore
+
+
+class Aggregator:
+    """
+    Group queries by class and aggregate their attributes
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.classes: Dict[str, ClassStats] = {}
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def add(self, query: str, attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """
+        Distill a query and add it to its class
+
+        :param query: The query
+        :param attributes: Its attributes, e.g. SlowLogRecord.attributes
+        :return: The class of the query
+        """
+        distilled = distill(query)
+        self.add_class(distilled, attributes)
+        return distilled
+
+    def add_class(
+        self, distilled: str, attributes: Optional[Mapping[str, Any]] = None
+    ) -> None:
+        """
+        Add an already distilled query
+
+        :param distilled: The class of the query
+        :param attributes: Its attributes
+        """
+        stats = self.classes.get(distilled)
+        if stats is None:
+            stats = self.classes[distilled] = ClassStats(self.relative_accuracy)
+        stats.add(attributes)
+
+    def merge(self, other: "Aggregator") -> None:
+        """
+        Add the classes of another aggregator
+
+        :param other: The aggregator to merge into this one
+        """
+        for distilled, other_stats in other.classes.items():
+            stats = self.classes.get(distilled)
+            if stats is None:
+                stats = self.classes[distilled] = ClassStats(self.relative_accuracy)
+            stats.merge(other_stats)
+
+    def most_common(self) -> List[Tuple[str, ClassStats]]:
+        """
+        Get the classes, most frequent first
+
+        Classes with the same count are ordered by total query time.
+
+        :return: List of (class, statistics) tuples
+        """
+        return sorted(self.classes.items(), key=_sort_key)
+
+    def report(self) -> Iterator[str]:
+        """
+        Format the classes as tab-separated lines, most frequent first
+
+        :return: Iterator of lines without newlines, starting with a header
+        """
+        yield "\t".join(
+            (
+                "count",
+                "query_time_sum",
+                "query_time_min",
+                "query_time_max",
+                "query_time_p50",
+                "query_time_p95",
+                "query_time_p99",
+                "lock_time_sum",
+                "rows_examined_sum",
+                "class",
+            )
+        )
+        for distilled, stats in self.most_common():
+            query_time = stats.metrics.get("query_time")
+            lock_time = stats.metrics.get("lock_time")
+            rows_examined = stats.metrics.get("rows_examined")
+            yield "\t".join(
+                (
+                    str(stats.count),
+                    _format(None if query_time is None else query_time.sum),
+                    _format(None if query_time is None else query_time.min),
+                    _format(None if query_time is None else query_time.max),
+                    _format(stats.percentile(50)),
+                    _format(stats.percentile(95)),
+                    _format(stats.percentile(99)),
+                    _format(None if lock_time is None else lock_time.sum),
+                    _format(None if rows_examined is None else rows_examined.sum),
+                    distilled,
+                )
+            )
+
+
+def _sort_key(item: Tuple[str, ClassStats]) -> Tuple[int, float, str]:
+    distilled, stats = item
+    query_time = stats.metrics.get("query_time")
+    return -stats.count, -(query_time.sum if query_time else 0), distilled
+
+
+def _format(value: Optional[float]) -> str:
+    """
+    Format a metric for the report
+
+    :param value: The value, or None if it was not recorded
+    :return: The formatted value, "-" for None
+    """
+    if value is None:
+        return "-"
+    if isinstance(value, int):
+        return str(value)
+    return f"{value:.6f}"
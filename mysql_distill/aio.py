@@ -0,0 +1,154 @@
+"""
+Distill queries from asyncio code
+
+This file is part of the mysql_distill package.
+
+The distill_async() async generator takes an async iterable of queries or
+log records and yields each with its class, without running the distiller
+on the event loop:
+
+    async for record, distilled in distill_async(records, executor):
+        ...
+
+A reader task moves items from the source into a bounded queue. Items are
+taken from the queue in micro-batches of whatever is available, up to
+batch_size, and each batch is distilled in the executor: a thread pool
+keeps the loop responsive, a process pool also uses more cores. At most
+concurrency batches are in flight. When they are, or when the consumer
+stops iterating, the queue fills up and the reader stops pulling from the
+source, so memory use is bounded by queue_size + concurrency * batch_size
+items however fast the source produces.
+"""
+import asyncio
+
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
+    List,
+    Optional,
+    Tuple,
+)
+
+from mysql_distill import parallel
+
+__all__ = ["distill_async"]
+
+DEFAULT_BATCH_SIZE: int = 256
+DEFAULT_CONCURRENCY: int = 2
+DEFAULT_QUEUE_SIZE: int = 1024
+
+
+class _End:
+    """
+    Marks the end of the source, and the error that ended it if any
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+
+
+async def distill_async(
+    source: AsyncIterable[Any],
+    executor: Optional[Executor] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    max_length: Optional[int] = None,
+) -> AsyncIterator[Tuple[Any, str]]:
+    """
+    Distill queries from an async iterable in an executor
+
+    Results are yielded in source order. An error raised by the source is
+    raised after the results of the items before it.
+
+    :param source: Query strings, or records with a query attribute such as
+        SlowLogRecord
+    :param executor: The executor to distill in, None for the loop's default
+        thread pool
+    :param concurrency: The maximum number of batches in flight
+    :param batch_size: The maximum number of items per batch
+    :param queue_size: The maximum number of items read ahead of the batches
+    :param max_length: See distill_bounded(), None for no limit
+    :return: Async iterator of (item, class) tuples
+    """
+    if concurrency < 1 or batch_size < 1 or queue_size < 1:
+        raise ValueError("concurrency, batch_size and queue_size must be positive")
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Any] = asyncio.Queue(queue_size)
+    reader = asyncio.create_task(_read(source, queue))
+    function = partial(distill_queries, max_length=max_length)
+    pending: Deque[Tuple[List[Any], asyncio.Future[List[str]]]] = deque()
+    end: Optional[_End] = None
+
+    try:
+        while True:
+            # Wait for items only when idle, so that finished batches are
+            # not held back by a slow source
+            while end is None and len(pending) < concurrency:
+                if pending and queue.empty():
+                    break
+                items: List[Any] = []
+                item = await queue.get()
+                while not isinstance(item, _End):
+                    items.append(item)
+                    if len(items) >= batch_size or queue.empty():
+                        break
+                    item = queue.get_nowait()
+                else:
+                    end = item
+                if items:
+                    queries = [
+                        entry if isinstance(entry, str) else entry.query
+                        for entry in items
+                    ]
+                    pending.append(
+                        (items, loop.run_in_executor(executor, function, queries))
+                    )
+
+            if not pending:
+                break
+            items, future = pending.popleft()
+            for item, distilled in zip(items, await future):
+                yield item, distilled
+
+        if end is not None and end.error is not None:
+            raise end.error
+    finally:
+        reader.cancel()
+        for _items, future in pending:
+            future.cancel()
+
+
+def distill_queries(queries: List[str], max_length: Optional[int] = None) -> List[str]:
+    """
+    Distill a batch of queries, e.g. in an executor
+
+    :param queries: The queries
+    :param max_length: See distill_bounded(), None for no limit
+    :return: The distilled queries
+    """
+    return [parallel.distill_query(query, max_length) for query in queries]
+
+
+async def _read(source: AsyncIterable[Any], queue: "asyncio.Queue[Any]") -> None:
+    """
+    Move the items of the source into a queue, followed by an _End
+
+    :param source: The source
+    :param queue: The bounded queue
+    """
+    try:
+        async for item in source:
+            await queue.put(item)
+    except Exception as error:
+        await queue.put(_End(error))
+    else:
+        await queue.put(_End())
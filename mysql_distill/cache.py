@@ -0,0 +1,247 @@
+"""
+Bounded LRU memoization for distill() and get_tables()
+
+This file is part of the mysql_distill package.
+
+Query logs are repetitive, so the same query text is distilled over and
+over. The cache is opt-in: enable_cache() puts a size-bounded LRU cache in
+front of distill() and get_tables(), disable_cache() removes it again.
+
+Entries are keyed on the query text and the engine argument, like
+functools.lru_cache. A normalize function can be given to key on a cheaper
+canonical form instead; normalize_whitespace() makes queries that differ
+only in whitespace outside quoted strings, backtick identifiers and
+comments share one entry. The value of a normalized entry is computed from
+the normalized text, so a key always maps to one result.
+"""
+import re
+import sys
+import threading
+
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Match,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+    TypeVar,
+)
+
+__all__ = [
+    "CacheInfo",
+    "LRUCache",
+    "cache_clear",
+    "cache_info",
+    "disable_cache",
+    "enable_cache",
+    "normalize_whitespace",
+]
+
+T = TypeVar("T")
+
+_newline_run_re: Pattern[str] = re.compile(r"[^\S\r\n]*[\r\n]\s*")
+_blank_run_re: Pattern[str] = re.compile(r"[^\S\r\n]{2,}|[\t\f\v]")
+# Quoted strings, backtick identifiers and comments, which are kept as they
+# are, or a run of whitespace (group 1)
+_span_or_blank_re: Pattern[str] = re.compile(
+    r"""(?:--|\#)[^\r\n]*
+       |/\*.*?(?:\*/|\Z)
+       |'[^'\\]*(?:\\.[^'\\]*)*(?:'|\Z)
+       |"[^"\\]*(?:\\.[^"\\]*)*(?:"|\Z)
+       |`[^`]*(?:`|\Z)
+       |(\s+)""",
+    flags=re.VERBOSE | re.DOTALL,
+)
+
+distill_cache: Optional["LRUCache"] = None
+tables_cache: Optional["LRUCache"] = None
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    currbytes: int
+    maxsize: Optional[int]
+    maxbytes: Optional[int]
+
+
+def normalize_whitespace(query: str) -> str:
+    """
+    Collapse runs of whitespace in a query
+
+    Runs containing a line break become a single newline so that one-line
+    comments still end where they did; other runs become a single space.
+    Whitespace in quoted strings, backtick identifiers and comments is
+    kept, so that e.g. `a  b` and `a b` remain different tables.
+
+    :param query: The query to normalize
+    :return: The normalized query
+    """
+    if "'" not in query and '"' not in query and "`" not in query:
+        return _blank_run_re.sub(" ", _newline_run_re.sub("\n", query))
+    return _span_or_blank_re.sub(_collapse_blank, query)
+
+
+def _collapse_blank(match: Match[str]) -> str:
+    """
+    Collapse a run of whitespace, see normalize_whitespace()
+
+    :param match: A match of _span_or_blank_re
+    :return: The replacement
+    """
+    blank = match.group(1)
+    if blank is None or blank == " ":
+        return match.group(0)
+    return "\n" if "\n" in blank or "\r" in blank else " "
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache bounded by entries and/or bytes
+
+    The byte size of an entry is approximated with sys.getsizeof() of the
+    query text and the cached value.
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 4096,
+        maxbytes: Optional[int] = None,
+        normalize: Optional[Callable[[str], str]] = None,
+    ):
+        if maxsize is None and maxbytes is None:
+            raise ValueError("maxsize and maxbytes cannot both be None")
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.normalize = normalize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.currbytes = 0
+        self._data: OrderedDict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(
+        self, query: str, engine: Optional[str], compute: Callable[[str], T]
+    ) -> T:
+        """
+        Get the cached value for a query, computing and storing it on a miss
+
+        :param query: The query text
+        :param engine: The engine argument, part of the key
+        :param compute: Called with the (normalized) query on a miss
+        :return: The cached or computed value
+        """
+        if self.normalize is not None:
+            query = self.normalize(query)
+        key = (query, engine)
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = compute(query)
+        size = sys.getsizeof(query) + sys.getsizeof(value)
+
+        with self._lock:
+            if key in self._data:
+                return value
+            self._data[key] = (value, size)
+            self.currbytes += size
+            while self._data and (
+                (self.maxsize is not None and len(self._data) > self.maxsize)
+                or (self.maxbytes is not None and self.currbytes > self.maxbytes)
+            ):
+                _key, (_value, evicted_size) = self._data.popitem(last=False)
+                self.currbytes -= evicted_size
+                self.evictions += 1
+
+        return value
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Get the cache statistics
+
+        :return: Hits, misses, evictions, current size and limits
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self._data),
+                self.currbytes,
+                self.maxsize,
+                self.maxbytes,
+            )
+
+    def cache_clear(self) -> None:
+        """
+        Remove all entries and reset the statistics
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.currbytes = 0
+
+
+def enable_cache(
+    maxsize: Optional[int] = 4096,
+    maxbytes: Optional[int] = None,
+    normalize: Optional[Callable[[str], str]] = None,
+) -> None:
+    """
+    Put an LRU cache in front of distill() and get_tables()
+
+    The limits apply to each of the two caches separately.
+
+    :param maxsize: Maximum number of entries, or None for no limit
+    :param maxbytes: Maximum approximate size in bytes, or None for no limit
+    :param normalize: Function computing the cache key, e.g. normalize_whitespace
+    """
+    global distill_cache, tables_cache
+    distill_cache = LRUCache(maxsize, maxbytes, normalize)
+    tables_cache = LRUCache(maxsize, maxbytes, normalize)
+
+
+def disable_cache() -> None:
+    """
+    Remove the caches from distill() and get_tables()
+    """
+    global distill_cache, tables_cache
+    distill_cache = tables_cache = None
+
+
+def cache_info() -> Dict[str, CacheInfo]:
+    """
+    Get the statistics of the enabled caches
+
+    :return: CacheInfo by function name, empty if caching is disabled
+    """
+    return {
+        name: lru.cache_info()
+        for name, lru in (("distill", distill_cache), ("get_tables", tables_cache))
+        if lru is not None
+    }
+
+
+def cache_clear() -> None:
+    """
+    Clear the enabled caches
+    """
+    for lru in (distill_cache, tables_cache):
+        if lru is not None:
+            lru.cache_clear()
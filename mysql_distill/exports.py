@@ -0,0 +1,310 @@
+"""
+Streaming readers for CSV and JSON lines exports
+
+This file is part of the mysql_distill package.
+
+The read_csv_export() and read_jsonl_export() functions read files exported
+from tables such as performance_schema.events_statements_history_long or
+from the audit log, and yield one ExportRecord per row or object:
+
+    THREAD_ID,EVENT_ID,SQL_TEXT,TIMER_WAIT,ROWS_EXAMINED
+    42,7,"SELECT * FROM orders WHERE id = 1",2500000000,1
+
+    {"audit_record": {"name": "Query", "sqltext": "select 1", "db": "shop"}}
+
+The query text and the attributes are picked by field name. Nested JSON
+fields are named by their path, e.g. "general_data.query". CSV columns are
+matched ignoring case. Attribute values are converted to int or float like
+the slow log's. Rename fields to query_time, lock_time and rows_examined to
+aggregate them. performance_schema timers are in picoseconds, so pass
+time_unit=1e-12 to report query_time and lock_time in seconds:
+
+    read_csv_export(
+        export,
+        "SQL_TEXT",
+        {"TIMER_WAIT": "query_time", "ROWS_EXAMINED": "rows_examined"},
+        time_unit=1e-12,
+    )
+
+The CSV columns are looked up once from the header. Each row is read as a
+tuple, so no dict is built per row. JSON lines are decoded in batches,
+with one json.loads() call per batch. Lines that cannot contain the query
+field are skipped before decoding, e.g. the connect events of an audit
+log.
+"""
+import csv
+import json
+
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+__all__ = [
+    "DEFAULT_QUERY_FIELDS",
+    "ExportRecord",
+    "read_csv_export",
+    "read_jsonl_export",
+]
+
+# The query fields looked for when none is given, in order
+DEFAULT_QUERY_FIELDS: Tuple[str, ...] = (
+    "SQL_TEXT",
+    "sql_text",
+    "query",
+    "sqltext",
+    "general_data.query",
+    "audit_record.sqltext",
+)
+
+# The number of JSON lines decoded at a time
+DEFAULT_BATCH_SIZE = 1000
+
+_null_values = frozenset(("", "NULL", "\\N"))
+_time_attributes = frozenset(("query_time", "lock_time"))
+
+
+class ExportRecord:
+    """
+    One query from an export, with the attributes picked from its fields
+    """
+
+    __slots__ = ("query", "attributes")
+
+    def __init__(self, query: str, attributes: Optional[Dict[str, Any]] = None):
+        self.query = query
+        self.attributes: Dict[str, Any] = {} if attributes is None else attributes
+
+    def __repr__(self) -> str:
+        return f"ExportRecord({self.query!r}, {self.attributes!r})"
+
+
+def read_csv_export(
+    lines: Iterable[str],
+    query_field: Optional[str] = None,
+    fields: Optional[Mapping[str, str]] = None,
+    time_unit: float = 1.0,
+    delimiter: str = ",",
+) -> Iterator[ExportRecord]:
+    """
+    Read the queries of a CSV file with a header line
+
+    :param lines: The lines of the file, e.g. a text file opened with newline=""
+    :param query_field: The column of the query text, by default the first
+        of DEFAULT_QUERY_FIELDS in the header
+    :param fields: The columns to pass through, by attribute name
+    :param time_unit: The number of seconds per unit of the columns renamed
+        to query_time or lock_time
+    :param delimiter: The field delimiter
+    :return: Iterator of records, rows without a query are skipped
+    :raises ValueError: If a column is not in the header
+    """
+    rows = csv.reader(lines, delimiter=delimiter)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns: Dict[str, int] = {}
+    for pos, name in enumerate(header):
+        columns.setdefault(name.lstrip("\ufeff").strip().lower(), pos)
+
+    if query_field is None:
+        query_pos = next(
+            (
+                columns[name.lower()]
+                for name in DEFAULT_QUERY_FIELDS
+                if name.lower() in columns
+            ),
+            None,
+        )
+        if query_pos is None:
+            raise ValueError("No query column in the header")
+    else:
+        query_pos = _column(columns, query_field)
+    selected = [
+        (_column(columns, name), attribute, _scale(attribute, time_unit))
+        for name, attribute in (fields or {}).items()
+    ]
+
+    for row in rows:
+        if len(row) <= query_pos:
+            continue
+        query = row[query_pos]
+        if query in _null_values:
+            continue
+        attributes: Dict[str, Any] = {}
+        for pos, attribute, scale in selected:
+            if pos < len(row):
+                value = row[pos]
+                if value not in _null_values:
+                    attributes[attribute] = _value(value, scale)
+        yield ExportRecord(query, attributes)
+
+
+def read_jsonl_export(
+    lines: Iterable[str],
+    query_field: Optional[str] = None,
+    fields: Optional[Mapping[str, str]] = None,
+    time_unit: float = 1.0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[ExportRecord]:
+    """
+    Read the queries of a JSON lines file, one object per line
+
+    Lines that are not valid JSON are skipped.
+
+    :param lines: The lines of the file, e.g. an open text file
+    :param query_field: The path of the query text, by default the first of
+        DEFAULT_QUERY_FIELDS found in the objects
+    :param fields: The paths of the fields to pass through, by attribute name
+    :param time_unit: The number of seconds per unit of the fields renamed
+        to query_time or lock_time
+    :param batch_size: The number of lines to decode at a time
+    :return: Iterator of records, objects without a query are skipped
+    """
+    candidates = [
+        tuple(name.split("."))
+        for name in (DEFAULT_QUERY_FIELDS if query_field is None else (query_field,))
+    ]
+    keys = _keys(candidates)
+    selected = [
+        (tuple(name.split(".")), attribute, _scale(attribute, time_unit))
+        for name, attribute in (fields or {}).items()
+    ]
+
+    batch: List[str] = []
+    for line in lines:
+        for key in keys:
+            if key in line:
+                batch.append(line)
+                break
+        else:
+            continue
+        if len(batch) >= batch_size:
+            yield from _records(_decode(batch), candidates, selected)
+            batch = []
+            keys = _keys(candidates)
+    yield from _records(_decode(batch), candidates, selected)
+
+
+def _keys(candidates: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+    """
+    The strings a JSON line must contain to have a query
+
+    :param candidates: The possible paths of the query text
+    :return: The quoted last key of each path
+    """
+    return tuple({f'"{path[-1]}"' for path in candidates})
+
+
+def _decode(batch: List[str]) -> List[Any]:
+    """
+    Decode JSON lines
+
+    :param batch: The lines
+    :return: The values of the valid lines
+    """
+    if not batch:
+        return []
+    try:
+        return json.loads("[" + ",".join(batch) + "]")
+    except ValueError:
+        pass
+    values = []
+    for line in batch:
+        try:
+            values.append(json.loads(line))
+        except ValueError:
+            continue
+    return values
+
+
+def _records(
+    values: List[Any],
+    candidates: List[Tuple[str, ...]],
+    selected: List[Tuple[Tuple[str, ...], str, float]],
+) -> Iterator[ExportRecord]:
+    """
+    Pick the query and the attributes of decoded JSON objects
+
+    Once a query is found, candidates is narrowed down to its path, as the
+    objects of one file name their query the same way.
+
+    :param values: The objects
+    :param candidates: The possible paths of the query text, updated
+    :param selected: The paths of the attributes, their names and scales
+    :return: Iterator of records
+    """
+    for value in values:
+        for path in candidates:
+            query = _lookup(value, path)
+            if isinstance(query, str) and query:
+                break
+        else:
+            continue
+        if len(candidates) > 1:
+            candidates[:] = [path]
+        attributes: Dict[str, Any] = {}
+        for field_path, attribute, scale in selected:
+            field = _lookup(value, field_path)
+            if field is not None:
+                attributes[attribute] = _value(field, scale)
+        yield ExportRecord(query, attributes)
+
+
+def _lookup(value: Any, path: Tuple[str, ...]) -> Any:
+    """
+    Look up a nested field
+
+    :param value: The decoded object
+    :param path: The keys of the field
+    :return: The value of the field, or None
+    """
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _column(columns: Dict[str, int], name: str) -> int:
+    """
+    Look up a CSV column
+
+    :param columns: The positions of the columns, by lower-cased name
+    :param name: The name of the column
+    :return: Its position
+    :raises ValueError: If the column is not in the header
+    """
+    try:
+        return columns[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"No column {name!r} in the header") from None
+
+
+def _scale(attribute: str, time_unit: float) -> float:
+    """
+    The factor to convert the values of an attribute with
+
+    :param attribute: The name of the attribute
+    :param time_unit: The number of seconds per unit of the times
+    :return: The factor
+    """
+    return time_unit if attribute in _time_attributes else 1.0
+
+
+def _value(value: Any, scale: float) -> Any:
+    """
+    Convert the value of a field into an attribute value
+
+    :param value: The value, numbers in strings are converted
+    :param scale: The factor to multiply numbers with
+    :return: The attribute value
+    """
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                return value
+    if scale != 1.0 and isinstance(value, (int, float)):
+        return value * scale
+    return value
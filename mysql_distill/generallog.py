@@ -0,0 +1,207 @@
+"""
+Streaming reader for the MySQL general query log
+
+This file is part of the mysql_distill package.
+
+The parse_general_log() function reads a general log line by line and
+yields one GeneralLogRecord per logged statement:
+
+    Time                 Id Command    Argument
+    2023-05-01T10:00:00.123456Z	   42 Connect	app@10.0.0.1 on shop using TCP/IP
+    2023-05-01T10:00:00.124000Z	   42 Query	SELECT *
+      FROM orders WHERE id = 1
+    2023-05-01T10:00:00.125000Z	   42 Init DB	archive
+    2023-05-01T10:00:00.126000Z	   42 Quit
+
+The log does not repeat the user or the default database on each line, so
+the reader tracks them per connection from the Connect, Change user and
+Init DB commands and from USE statements. Only the open connections are
+kept, so memory use does not depend on the size of the log. The older
+format with "230501 10:00:00" timestamps, omitted for the lines logged in
+the same second, is read as well.
+
+Every line is checked with one string comparison; only lines starting
+with a digit or a tab are matched against the command line pattern, and
+all others continue the argument of the previous command.
+"""
+import re
+
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Pattern
+
+__all__ = ["GeneralLogRecord", "QUERY_COMMANDS", "parse_general_log"]
+
+# The commands parse_general_log() yields by default
+QUERY_COMMANDS: AbstractSet[str] = frozenset(("Query", "Execute"))
+
+_command_re: Pattern[str] = re.compile(
+    r"(?:(\d{4}-\d\d-\d\dT\S+|\d{6}\s+\d{1,2}:\d\d:\d\d)|\t)"
+    r"\t *(\d+) ([A-Z][A-Za-z ]*?) *(?:\t|\r?\n|\Z)"
+)
+_connect_re: Pattern[str] = re.compile(r"([^@\s]*)@(\S*) on ?(\S*)")
+_use_re: Pattern[str] = re.compile(r"use\s+`?([^`\s;]+)`?\s*;?\s*\Z", re.IGNORECASE)
+_server_banner_re: Pattern[str] = re.compile(
+    r"(?:\S+, Version: |Tcp port: |Time\s+Id\s+Command\b)"
+)
+
+_command_starts = frozenset("0123456789\t")
+_server_banner_prefixes = ("Tcp port: ", "Time ")
+_connect_commands = frozenset(("Connect", "Change user"))
+
+
+class GeneralLogRecord:
+    """
+    One command from a general log, with the state of its connection
+    """
+
+    __slots__ = ("query", "command", "connection_id", "time", "db", "user", "host")
+
+    def __init__(
+        self,
+        query: str,
+        command: str,
+        connection_id: int,
+        time: Optional[str] = None,
+        db: Optional[str] = None,
+        user: Optional[str] = None,
+        host: Optional[str] = None,
+    ):
+        self.query = query
+        self.command = command
+        self.connection_id = connection_id
+        self.time = time
+        self.db = db
+        self.user = user
+        self.host = host
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """
+        The attributes that are known, named like SlowLogRecord.attributes
+        """
+        attributes: Dict[str, Any] = {
+            "id": self.connection_id,
+            "command": self.command,
+        }
+        for name in ("time", "db", "user", "host"):
+            value = getattr(self, name)
+            if value is not None:
+                attributes[name] = value
+        return attributes
+
+    def __repr__(self) -> str:
+        return f"GeneralLogRecord({self.query!r}, {self.attributes!r})"
+
+
+class _Connection:
+    """
+    The state of an open connection
+    """
+
+    __slots__ = ("db", "user", "host")
+
+    def __init__(
+        self,
+        db: Optional[str] = None,
+        user: Optional[str] = None,
+        host: Optional[str] = None,
+    ):
+        self.db = db
+        self.user = user
+        self.host = host
+
+
+def parse_general_log(
+    lines: Iterable[str], commands: Optional[AbstractSet[str]] = QUERY_COMMANDS
+) -> Iterator[GeneralLogRecord]:
+    """
+    Parse a general query log into records
+
+    :param lines: The lines of the log, e.g. an open text file
+    :param commands: The commands to yield records for, None for all
+    :return: Iterator of records in log order
+    """
+    connections: Dict[int, _Connection] = {}
+    record: Optional[GeneralLogRecord] = None
+    argument: List[str] = []
+    # Whether the lines that do not start a command belong to a record
+    collecting = False
+    time: Optional[str] = None
+
+    for line in lines:
+        if line[:1] in _command_starts:
+            match = _command_re.match(line)
+            if match:
+                if record is not None:
+                    yield _finish(record, argument)
+                    record = None
+
+                line_time, line_id, command = match.groups()
+                if line_time is not None:
+                    time = line_time
+                connection_id = int(line_id)
+                first = line[match.end() :]
+                connection = connections.get(connection_id)
+                if connection is None:
+                    connection = connections[connection_id] = _Connection()
+
+                if command in _connect_commands:
+                    connect = _connect_re.match(first)
+                    if connect:
+                        connection.user, connection.host, db = connect.groups()
+                        connection.db = db or None
+                    else:
+                        # e.g. Access denied for user ...
+                        connection.user = connection.host = connection.db = None
+
+                collecting = commands is None or command in commands
+                if collecting:
+                    record = GeneralLogRecord(
+                        "",
+                        command,
+                        connection_id,
+                        time,
+                        connection.db,
+                        connection.user,
+                        connection.host,
+                    )
+                    argument = [first]
+
+                if command == "Init DB":
+                    connection.db = first.strip() or None
+                elif command == "Query" and first[:3].upper() == "USE":
+                    use = _use_re.match(first)
+                    if use:
+                        connection.db = use.group(1)
+                elif command == "Quit":
+                    del connections[connection_id]
+                continue
+
+        if (
+            line.startswith(_server_banner_prefixes) or ", Version: " in line
+        ) and _server_banner_re.match(line):
+            if ", Version: " in line:
+                # The server restarted, so all connections were closed
+                connections.clear()
+            if record is not None:
+                yield _finish(record, argument)
+                record = None
+            collecting = False
+            continue
+
+        if collecting:
+            argument.append(line)
+
+    if record is not None:
+        yield _finish(record, argument)
+
+
+def _finish(record: GeneralLogRecord, argument: List[str]) -> GeneralLogRecord:
+    """
+    Set the query of a record from the lines of its argument
+
+    :param record: The record
+    :param argument: The lines of the argument
+    :return: The record
+    """
+    record.query = "".join(argument).rstrip()
+    return record
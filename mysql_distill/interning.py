@@ -0,0 +1,128 @@
+"""
+Share the strings distill() and get_tables() return
+
+This file is part of the mysql_distill package.
+
+Every call builds fresh strings for its verbs, tables and class, so a
+long-running aggregation that keeps its results holds one copy per query.
+The interning layer is opt-in: enable_interning() makes distill(),
+distill_result() and get_tables() return one shared object per distinct
+string (and per distinct tuple of verbs or tables), so memory use follows
+the number of distinct classes instead of the number of queries.
+
+Unlike sys.intern(), the table can be bounded, inspected and emptied:
+once maxsize values are held, new values are returned as they are and
+only the values already held keep being shared.
+"""
+from typing import Dict, Hashable, NamedTuple, Optional, TypeVar
+
+from mysql_distill import cache
+
+__all__ = [
+    "InternInfo",
+    "InternTable",
+    "disable_interning",
+    "enable_interning",
+    "intern_clear",
+    "intern_info",
+]
+
+T = TypeVar("T", bound=Hashable)
+
+intern_table: Optional["InternTable"] = None
+
+
+class InternInfo(NamedTuple):
+    hits: int
+    misses: int
+    currsize: int
+    maxsize: Optional[int]
+
+
+class InternTable:
+    """
+    A table of shared strings and tuples, optionally bounded by entries
+    """
+
+    __slots__ = ("maxsize", "hits", "misses", "_values")
+
+    def __init__(self, maxsize: Optional[int] = None):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be positive or None")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values: Dict[Hashable, Hashable] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: T) -> T:
+        """
+        Get the shared object equal to a value
+
+        :param value: A string or a tuple of strings
+        :return: The shared object, or the value itself if it is new
+        """
+        shared = self._values.get(value)
+        if shared is not None:
+            self.hits += 1
+            return shared  # type: ignore
+        self.misses += 1
+        if self.maxsize is None or len(self._values) < self.maxsize:
+            self._values[value] = value
+        return value
+
+    def intern_info(self) -> InternInfo:
+        """
+        Get the table statistics
+
+        :return: Hits, misses, current size and limit
+        """
+        return InternInfo(self.hits, self.misses, len(self._values), self.maxsize)
+
+    def intern_clear(self) -> None:
+        """
+        Remove all values and reset the statistics
+        """
+        self._values.clear()
+        self.hits = self.misses = 0
+
+
+def enable_interning(maxsize: Optional[int] = None) -> InternTable:
+    """
+    Share the verbs, tables and classes returned by distill() and get_tables()
+
+    :param maxsize: Maximum number of shared values, or None for no limit
+    :return: The installed table
+    """
+    global intern_table
+    intern_table = InternTable(maxsize)
+    # Cached results were built without the table
+    cache.cache_clear()
+    return intern_table
+
+
+def disable_interning() -> None:
+    """
+    Remove the intern table
+    """
+    global intern_table
+    intern_table = None
+
+
+def intern_info() -> Optional[InternInfo]:
+    """
+    Get the statistics of the intern table
+
+    :return: The statistics, or None if interning is disabled
+    """
+    return intern_table.intern_info() if intern_table is not None else None
+
+
+def intern_clear() -> None:
+    """
+    Empty the intern table, if enabled
+    """
+    if intern_table is not None:
+        intern_table.intern_clear()
@@ -0,0 +1,287 @@
+"""
+Limit the part of a query that has to be scanned
+
+This file is part of the mysql_distill package.
+
+The class of a multi-row INSERT or REPLACE is known once its VALUES
+keyword is reached if the rows that follow only hold literals. trim_values()
+cuts such rows off, so the later stages of distilling a bulk insert cost as
+much as its prefix no matter how many megabytes of rows it carries. The
+rows are still matched once to make sure they hold nothing but literals;
+rows with a subquery or a function call are kept. An ON DUPLICATE KEY
+UPDATE clause after the last row is kept, since it can add verbs and
+tables.
+
+For other statements, set_scan_window() bounds the number of characters
+that distill() and get_tables() look at. It is off by default; see also
+distill_bounded(), which reports whether a query was cut.
+"""
+import re
+
+from typing import Optional, Pattern, Tuple, Union, overload
+
+from mysql_distill import cache
+from mysql_distill.tokenizer import BytesLike
+
+__all__ = [
+    "get_scan_window",
+    "scan_prefix",
+    "set_scan_window",
+    "trim_values",
+    "truncate_query",
+]
+
+_scan_window: Optional[int] = None
+
+# A literal in a row of a bulk insert: a string, a number or a keyword
+_literal: str = r"""(?:
+    (?:_\w+\s*|N)?'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'
+  | "[^"\\]*(?:(?:\\.|"")[^"\\]*)*"
+  | 0x[0-9a-f]+ | 0b[01]+ | [xb]'[0-9a-f]*'
+  | [-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?
+  | (?:NULL|TRUE|FALSE|DEFAULT)\b | \?
+)"""
+_row: str = rf"\(\s*(?:{_literal}\s*(?:,\s*{_literal}\s*)*)?\)"
+_on_duplicate: str = r"ON\s+DUPLICATE\s+KEY\s+UPDATE\b"
+
+_trim_flags = re.IGNORECASE | re.DOTALL | re.VERBOSE
+# Bulk insert
+_bulk_re: Pattern[str] = re.compile(r"\s*(?:INSERT|REPLACE)\b", flags=_trim_flags)
+_bulk_bytes_re: Pattern[bytes] = re.compile(
+    rb"\s*(?:INSERT|REPLACE)\b", flags=_trim_flags
+)
+# The tokens before the rows: quoted strings and names, comments,
+# parentheses and the VALUES keyword
+_values_re: Pattern[str] = re.compile(
+    r"""'[^'\\]*(?:\\.[^'\\]*)*'?|"[^"\\]*(?:\\.[^"\\]*)*"?|`[^`]*`?
+      | /\*.*?(?:\*/|\Z) | (?:--|\#)[^\n]* | (\() | (\)) | \b(VALUES?)\s*(?=\()""",
+    flags=_trim_flags,
+)
+# Rows of literals, and what may follow them
+_rows_re: Pattern[str] = re.compile(rf"{_row}(?:\s*,\s*{_row})*", flags=_trim_flags)
+_end_re: Pattern[str] = re.compile(r"\s*;?\s*\Z", flags=_trim_flags)
+_on_duplicate_re: Pattern[str] = re.compile(
+    rf"\s*(?:AS\s+\w+\s*(?:\([^()]*\)\s*)?)?({_on_duplicate})", flags=_trim_flags
+)
+_on_duplicate_bytes_re: Pattern[bytes] = re.compile(
+    _on_duplicate.encode(), flags=_trim_flags
+)
+# The characters of numbers and row lists, mapped to spaces
+_row_chars = bytes.maketrans(b"0123456789,.+-();", b" " * 17)
+
+_whitespace: Tuple[str, ...] = (" ", "\n", "\t")
+_whitespace_bytes: Tuple[bytes, ...] = (b" ", b"\n", b"\t")
+
+
+def set_scan_window(window: Optional[int]) -> None:
+    """
+    Set the maximum number of characters distill() and get_tables() scan
+
+    :param window: The number of characters, or None for no limit
+    """
+    global _scan_window
+    if window is not None and window < 1:
+        raise ValueError("The scan window must be positive")
+    if window != _scan_window:
+        # Cached results were computed with the old window
+        cache.cache_clear()
+    _scan_window = window
+
+
+def get_scan_window() -> Optional[int]:
+    """
+    Get the maximum number of characters distill() and get_tables() scan
+
+    :return: The number of characters, or None for no limit
+    """
+    return _scan_window
+
+
+@overload
+def scan_prefix(query: str) -> str:
+    ...
+
+
+@overload
+def scan_prefix(query: BytesLike) -> BytesLike:
+    ...
+
+
+def scan_prefix(query: Union[str, BytesLike]) -> Union[str, BytesLike]:
+    """
+    Get the part of a query that determines its class
+
+    :param query: The query, as str or bytes-like
+    :return: The query without the rows of a bulk insert, cut to the scan
+        window if one is set
+    """
+    if isinstance(query, str):
+        text = trim_values(query)
+        if _scan_window is not None and len(text) > _scan_window:
+            text = truncate_query(text, _scan_window)
+        return text
+    data = trim_values(query)
+    if _scan_window is not None and len(data) > _scan_window:
+        data = truncate_query(data, _scan_window)
+    return data
+
+
+@overload
+def trim_values(query: str) -> str:
+    ...
+
+
+@overload
+def trim_values(query: BytesLike) -> BytesLike:
+    ...
+
+
+def trim_values(query: Union[str, BytesLike]) -> Union[str, BytesLike]:
+    """
+    Cut the rows off an INSERT or REPLACE ... VALUES statement
+
+    The VALUES keyword is looked for outside quotes, comments and
+    parentheses. The rows are only cut if they hold nothing but literals
+    and are followed by the end of the statement or by an ON DUPLICATE KEY
+    UPDATE clause, which is kept. Bytes-like queries are searched as
+    latin-1, so that invalid UTF-8 is never an issue, and a memoryview is
+    cut without a copy.
+
+    :param query: The query, as str or bytes-like
+    :return: The query up to and including VALUES, plus the clause if any,
+        or the query if its rows cannot be cut
+    """
+    if isinstance(query, str):
+        bulk = _bulk_re.match(query)
+        positions = _trim_positions(query, bulk.end()) if bulk else None
+        if positions is None:
+            return query
+        values, clause = positions
+        if clause == len(query):
+            return query[:values]
+        return " ".join((query[:values], query[clause:]))
+
+    bulk_bytes = _bulk_bytes_re.match(query)
+    # One character per byte, so positions in the text are positions in query
+    positions = (
+        _trim_positions(str(query, "latin-1"), bulk_bytes.end()) if bulk_bytes else None
+    )
+    if positions is None:
+        return query
+    values, clause = positions
+    if clause == len(query):
+        return query[:values]
+    return b" ".join((query[:values], query[clause:]))
+
+
+def _trim_positions(text: str, start: int) -> Optional[Tuple[int, int]]:
+    """
+    Find the rows of a bulk insert, see trim_values()
+
+    :param text: The query
+    :param start: The position after its INSERT or REPLACE keyword
+    :return: The position of the first row and of the ON DUPLICATE KEY
+        UPDATE clause, or len(text) if there is none, or None if the rows
+        cannot be cut
+    """
+    depth = 0
+    for token in _values_re.finditer(text, start):
+        group = token.lastindex
+        if group == 1:
+            depth += 1
+        elif group == 2:
+            depth -= 1
+        elif group == 3 and depth == 0:
+            values = token.end()
+            break
+    else:
+        return None
+
+    clause = _literal_rows_end(text, values)
+    if clause is not None:
+        return values, clause
+    rows = _rows_re.match(text, values)
+    if not rows:
+        return None
+    if _end_re.match(text, rows.end()):
+        return values, len(text)
+    on_duplicate = _on_duplicate_re.match(text, rows.end())
+    if on_duplicate:
+        return values, on_duplicate.start(1)
+    return None
+
+
+def _literal_rows_end(text: str, start: int) -> Optional[int]:
+    """
+    Find the end of rows of numbers, NULLs and single-quoted strings
+
+    Most bulk inserts, e.g. those of mysqldump, only hold such literals.
+    Splitting their rows at the quotes and checking what is left outside
+    the strings takes a few string operations instead of a regex match per
+    row.
+
+    :param text: The query
+    :param start: The position of the first row
+    :return: The position of the ON DUPLICATE KEY UPDATE clause, or
+        len(text) if there is none, or None if the rows have to be matched
+        by _rows_re
+    """
+    rows = text[start:]
+    if '"' in rows:
+        return None
+    if "\\" in rows:
+        # Same length, so that positions do not move
+        rows = rows.replace("\\\\", "  ").replace("\\'", "  ")
+    parts = rows.split("'")
+    if len(parts) % 2 == 0:
+        return None
+    outside = "".join(parts[::2])
+    if not outside.isascii():
+        return None
+    data = outside.encode().replace(b"NULL", b"    ").translate(_row_chars)
+    end = len(data) - len(data.lstrip())
+    if end == len(data):
+        return len(text)
+    if not _on_duplicate_bytes_re.match(data, end):
+        return None
+    # Walk back from the end over the parts of the clause, with the strings
+    # and quotes between them
+    remaining = len(data) - end
+    position = start + len(rows)
+    index = len(parts) - 1
+    while remaining > len(parts[index]):
+        remaining -= len(parts[index])
+        position -= len(parts[index]) + len(parts[index - 1]) + 2
+        index -= 2
+    return position - remaining
+
+
+@overload
+def truncate_query(query: str, max_length: int) -> str:
+    ...
+
+
+@overload
+def truncate_query(query: BytesLike, max_length: int) -> BytesLike:
+    ...
+
+
+def truncate_query(
+    query: Union[str, BytesLike], max_length: int
+) -> Union[str, BytesLike]:
+    """
+    Cut a query to at most max_length characters at whitespace
+
+    :param query: The query, as str or bytes-like
+    :param max_length: The maximum length
+    :return: The query, or its longest prefix ending before whitespace
+    """
+    if len(query) <= max_length:
+        return query
+    if isinstance(query, str):
+        prefix = query[:max_length]
+        cut = max(prefix.rfind(space) for space in _whitespace)
+        return prefix[:cut] if cut > 0 else prefix
+    prefix_bytes = bytes(query[:max_length])
+    cut = max(prefix_bytes.rfind(space) for space in _whitespace_bytes)
+    return prefix_bytes[:cut] if cut > 0 else prefix_bytes
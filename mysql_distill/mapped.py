@@ -0,0 +1,386 @@
+"""
+Distill memory-mapped files
+
+This file is part of the mysql_distill package.
+
+Each file is memory-mapped, its statements or lines are found directly in
+the mapping, and each query is handed over as a memoryview of the
+mapping, so the text is neither read through a stream nor copied. With
+the lexer engine it is not decoded either, see distill_view().
+
+In this process, each file is split in one pass. For worker processes,
+file_ranges() cuts a mapping into ranges of about chunk_size bytes without
+scanning it: lines are cut at a newline, statements after a line that ends
+with ";". Only (path, start, end, delimiter) tuples cross process
+boundaries: each worker maps the file itself and distills the statements
+that start in its range, sharing the OS page cache with the other workers.
+
+A cut after ";" is usually between two statements, but it can be inside a
+string or comment, or where another delimiter is in effect. So each worker
+reports where its first statement starts and where the statement after its
+range starts. Where the two do not match, the range is distilled again
+from where the range before it ended.
+"""
+import mmap
+import re
+
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterable, Iterator, List, Optional, Pattern, Tuple, Union
+
+import mysql_distill
+from mysql_distill import limits, parallel, splitter, stats, tokenizer
+
+DEFAULT_CHUNK_SIZE: int = 1 << 20
+
+# A part of a file: path, start, end and the statement delimiter at start
+FileRange = Tuple[str, int, int, str]
+
+# A statement boundary: the start of a statement and its delimiter
+Boundary = Tuple[int, str]
+
+# A distilled range: the range, its output, the first statement boundary
+# at or after its start and the first at or after its end
+RangeResult = Tuple[FileRange, str, Boundary, Boundary]
+
+# What map_file() yields: an mmap, or bytes for an empty file
+Mapping = Union[mmap.mmap, bytes]
+
+# The query on one line of input, see parallel.prepare_line(): the line up
+# to its first ";", without the whitespace around it unless a ";" follows.
+# Lines that may start or end with non-ASCII whitespace match the
+# [\x80-\xff] branch or end with such a byte, and are decoded instead.
+_line_query_re: Pattern[bytes] = re.compile(
+    rb"[\s\x1c-\x1f]*(?:([\w(](?:[^;]*[^;\s\x1c-\x1f])?)[\s\x1c-\x1f]*(;)?|[\x80-\xff])"
+)
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[Mapping]:
+    """
+    Memory-map a file for reading
+
+    :param path: The path of the file
+    :return: The mapping, closed when the with block ends
+    """
+    with open(path, "rb") as file:
+        file.seek(0, 2)
+        if not file.tell():
+            # Empty files cannot be mapped
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            if hasattr(mapping, "madvise"):
+                mapping.madvise(mmap.MADV_SEQUENTIAL)
+            yield mapping
+
+
+def line_spans(
+    buffer: Mapping, start: int = 0, end: Optional[int] = None
+) -> Iterator[Tuple[int, int]]:
+    """
+    Find the queries of a buffer holding one query per line
+
+    Lines are handled like parallel.prepare_line() does.
+
+    :param buffer: The buffer
+    :param start: The position to start at, at the start of a line
+    :param end: The position to stop at, None for the end of the buffer
+    :return: Iterator of (start, stop) spans of the queries
+    """
+    if end is None:
+        end = len(buffer)
+    pos = start
+    while pos < end:
+        stop = buffer.find(b"\n", pos, end)
+        if stop < 0:
+            stop = end
+        span = _line_span(buffer, pos, stop)
+        if span is not None:
+            yield span
+        pos = stop + 1
+
+
+def file_ranges(
+    path: str,
+    buffer: Mapping,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    statements: bool = True,
+) -> Iterator[FileRange]:
+    """
+    Cut a mapped file into ranges without scanning it
+
+    Lines are cut at a newline. Statements are cut after a line that ends
+    with ";", assuming that the default delimiter is in effect there.
+    distill_files() checks these cuts, see distill_range().
+
+    :param path: The path of the file
+    :param buffer: The mapping of the file
+    :param chunk_size: The number of bytes per range
+    :param statements: Cut between statements instead of lines
+    :return: Iterator of ranges covering the file
+    """
+    separator = b";\n" if statements else b"\n"
+    delimiter = splitter.DEFAULT_DELIMITER if statements else ""
+    pos = 0
+    size = len(buffer)
+    while pos < size:
+        end = buffer.find(separator, pos + chunk_size)
+        end = size if end < 0 else end + len(separator)
+        yield path, pos, end, delimiter
+        pos = end
+
+
+def distill_view(
+    view: memoryview, max_length: Optional[int] = None, engine: Optional[str] = None
+) -> str:
+    """
+    Distill a query held in a memoryview, optionally bounded by its length
+
+    With the lexer engine the query is distilled straight from its bytes,
+    see distill_bytes(). Otherwise it is decoded, replacing invalid UTF-8,
+    and distilled like a query read from a text stream.
+
+    :param view: The query
+    :param max_length: See distill_bounded(), None for no limit
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: The distilled query
+    """
+    query: tokenizer.BytesLike = view
+    if max_length is not None and len(view) > max_length:
+        if stats.collector is not None:
+            stats.collector.hit("truncated")
+        query = limits.truncate_query(view, max_length)
+    if tokenizer.use_lexer(engine):
+        return mysql_distill.distill_bytes(query)
+    return mysql_distill.distill(str(query, "utf-8", "replace"), engine)
+
+
+def distill_range(
+    file_range: FileRange,
+    statements: bool = True,
+    max_length: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> str:
+    """
+    Distill the statements or lines in a range of a file
+
+    The range holds the lines between its start and end, or the statements
+    that start between them. The last statement may end after the range.
+
+    :param file_range: The range, see file_ranges()
+    :param statements: The range holds statements instead of lines
+    :param max_length: See distill_bounded(), None for no limit
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: The distilled queries, one per line
+    """
+    return _distill_range(file_range, statements, max_length, engine)[1]
+
+
+def distill_files(
+    paths: Iterable[str],
+    jobs: int = 1,
+    ordered: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    statements: bool = True,
+    max_length: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Distill memory-mapped files, optionally in a process pool
+
+    :param paths: The paths of the files, distilled in order
+    :param jobs: The number of worker processes, 0 for one per CPU, 1 to
+        distill in this process
+    :param ordered: Yield output in input order, else as ranges complete.
+        Statements are always yielded in order, since each range is
+        checked against the one before it.
+    :param chunk_size: The number of bytes per range
+    :param statements: Split the files into statements instead of lines
+    :param max_length: See distill_bounded(), None for no limit
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: Iterator of output blocks, one distilled query per line
+    """
+    if jobs == 1:
+        return _distill_files(paths, chunk_size, statements, max_length, engine)
+    function = partial(
+        _distill_range, statements=statements, max_length=max_length, engine=engine
+    )
+    ranges = _ranges(paths, chunk_size, statements)
+    if not statements:
+        return (
+            result[1] for result in parallel.map_blocks(function, ranges, jobs, ordered)
+        )
+    return _checked_outputs(
+        parallel.map_blocks(function, ranges, jobs), max_length, engine
+    )
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """
+    Read the lines of a memory-mapped file, e.g. for parse_slow_log()
+
+    Invalid UTF-8 is replaced rather than raising an error.
+
+    :param path: The path of the file
+    :return: Iterator of lines, including their newline
+    """
+    with map_file(path) as buffer:
+        pos = 0
+        size = len(buffer)
+        while pos < size:
+            end = buffer.find(b"\n", pos)
+            end = size if end < 0 else end + 1
+            yield buffer[pos:end].decode(errors="replace")
+            pos = end
+
+
+def _line_span(buffer: Mapping, start: int, stop: int) -> Optional[Tuple[int, int]]:
+    """
+    Find the query on one line, see line_spans()
+
+    :param buffer: The buffer
+    :param start: The start of the line
+    :param stop: The end of the line, before its newline
+    :return: The (start, stop) span of the query, or None
+    """
+    match = _line_query_re.match(buffer, start, stop)
+    if match is None:
+        return None
+    if match.group(2) is not None:
+        return match.start(1), match.start(2)
+    if match.group(1) is not None and buffer[match.end(1) - 1] < 0x80:
+        return match.span(1)
+    line = bytes(buffer[start:stop]).decode(errors="surrogateescape")
+    query = parallel.prepare_line(line)
+    if query is None:
+        return None
+    start += len(
+        line[: len(line) - len(line.lstrip())].encode(errors="surrogateescape")
+    )
+    return start, start + len(query.encode(errors="surrogateescape"))
+
+
+def _ranges(
+    paths: Iterable[str], chunk_size: int, statements: bool
+) -> Iterator[FileRange]:
+    """
+    Cut several files into ranges, see file_ranges()
+
+    :param paths: The paths of the files
+    :param chunk_size: The number of bytes per range
+    :param statements: Cut between statements instead of lines
+    :return: Iterator of ranges, file by file
+    """
+    for path in paths:
+        with map_file(path) as buffer:
+            yield from file_ranges(path, buffer, chunk_size, statements)
+
+
+def _distill_files(
+    paths: Iterable[str],
+    chunk_size: int,
+    statements: bool,
+    max_length: Optional[int],
+    engine: Optional[str],
+) -> Iterator[str]:
+    """
+    Distill files in this process, splitting each in one pass
+
+    :return: Iterator of output blocks of about chunk_size input bytes, see
+        distill_files()
+    """
+    for path in paths:
+        with map_file(path) as buffer:
+            if statements:
+                spans: Iterable[Tuple[int, int]] = (
+                    (start, stop) for start, stop, _ in splitter.split_buffer(buffer)
+                )
+            else:
+                spans = line_spans(buffer)
+            view = memoryview(buffer)
+            try:
+                block: List[str] = []
+                block_end = chunk_size
+                for start, stop in spans:
+                    block.append(distill_view(view[start:stop], max_length, engine))
+                    if stop >= block_end:
+                        yield "".join(f"{distilled}\n" for distilled in block)
+                        block = []
+                        block_end = stop + chunk_size
+                if block:
+                    yield "".join(f"{distilled}\n" for distilled in block)
+            finally:
+                view.release()
+
+
+def _distill_range(
+    file_range: FileRange,
+    statements: bool = True,
+    max_length: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> RangeResult:
+    """
+    Distill a range of a file, see distill_range()
+
+    :return: The range, its distilled queries, and the statement boundaries
+        around them. For lines, the start and end of the range.
+    """
+    path, start, end, delimiter = file_range
+    with map_file(path) as buffer:
+        view = memoryview(buffer)
+        try:
+            if not statements:
+                output = "".join(
+                    distill_view(view[query_start:query_stop], max_length, engine)
+                    + "\n"
+                    for query_start, query_stop in line_spans(buffer, start, end)
+                )
+                return file_range, output, (start, ""), (end, "")
+
+            distilled: List[str] = []
+            first: Optional[Boundary] = None
+            after: Boundary = (len(buffer), delimiter)
+            for query_start, query_stop, delimiter in splitter.split_buffer(
+                buffer, start, None, delimiter
+            ):
+                if first is None:
+                    first = query_start, delimiter
+                if query_start >= end:
+                    after = query_start, delimiter
+                    break
+                distilled.append(
+                    distill_view(view[query_start:query_stop], max_length, engine)
+                )
+            else:
+                after = len(buffer), delimiter
+            output = "".join(f"{query}\n" for query in distilled)
+            return file_range, output, first or after, after
+        finally:
+            view.release()
+
+
+def _checked_outputs(
+    results: Iterable[RangeResult], max_length: Optional[int], engine: Optional[str]
+) -> Iterator[str]:
+    """
+    Check that each range of statements starts where the one before ended
+
+    A range whose first statement is not the statement after the range
+    before it was not cut between statements. It is distilled again, from
+    where the statements of the range before it ended.
+
+    :param results: The distilled ranges, in file order
+    :param max_length: See distill_bounded(), None for no limit
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: Iterator of the outputs of the ranges
+    """
+    after: Boundary = (0, splitter.DEFAULT_DELIMITER)
+    for file_range, output, first, range_after in results:
+        path, start, end, _ = file_range
+        if start and first != after:
+            _, output, _, range_after = _distill_range(
+                (path, after[0], end, after[1]), True, max_length, engine
+            )
+        yield output
+        after = range_after
@@ -0,0 +1,359 @@
+"""
+Buffered writers for distilled queries
+
+This file is part of the mysql_distill package.
+
+A RecordWriter writes one record per query in one of OUTPUT_FORMATS:
+
+    text   the class, as distill() returns it
+    tsv    tab-separated columns with a header line, tabs, newlines and
+           backslashes escaped with a backslash
+    csv    comma-separated columns with a header line
+    jsonl  one JSON object per line
+
+The tsv and csv columns are class, kind, verbs (separated by spaces),
+tables (separated by commas), fingerprint and checksum if fingerprints are
+written, one column per attribute and the query. A jsonl record holds the
+same fields, with the verbs and tables as lists and the attributes as an
+object.
+
+Records are serialized into an in-memory buffer and written to the stream
+with one write() call per buffer_size characters. The serialized class,
+kind, verbs and tables of the most recent classes are reused, since most
+records of a log share a few classes.
+"""
+import csv
+import io
+import json
+import math
+import re
+
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from mysql_distill import limits, rewriter, stats
+from mysql_distill.rewriter import DistilledQuery, Fingerprint
+
+__all__ = [
+    "DEFAULT_BUFFER_SIZE",
+    "OUTPUT_FORMATS",
+    "RecordWriter",
+    "distill_record",
+]
+
+OUTPUT_FORMATS: Tuple[str, ...] = ("text", "tsv", "csv", "jsonl")
+
+# The number of characters buffered before they are written
+DEFAULT_BUFFER_SIZE: int = 1 << 20
+
+# The number of serialized classes kept for reuse
+_MAX_CACHED_CLASSES = 4096
+
+_tsv_special_re: Pattern[str] = re.compile(r"[\\\t\n\r]")
+_tsv_escapes = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def distill_record(
+    query: str, max_length: Optional[int] = None, fingerprint: bool = False
+) -> Tuple[DistilledQuery, Optional[Fingerprint]]:
+    """
+    Distill a query for RecordWriter.write()
+
+    :param query: The query
+    :param max_length: See distill_bounded(), None for no limit
+    :param fingerprint: Also fingerprint the query, see
+        distill_result(query, checksum=True)
+    :return: The distilled query, and its fingerprint or None
+    """
+    if max_length is not None and len(query) > max_length:
+        if stats.collector is not None:
+            stats.collector.hit("truncated")
+        query = limits.truncate_query(query, max_length)
+    if not fingerprint:
+        return rewriter.distill_result(query), None
+    distilled = rewriter.distill_result(query, checksum=True)
+    assert distilled.fingerprint is not None and distilled.checksum is not None
+    return distilled, Fingerprint(distilled.fingerprint, distilled.checksum)
+
+
+class RecordWriter:
+    """
+    Write distilled queries to a text stream in batches
+
+    Use it as a context manager, or call close() to write the last batch.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        output_format: str = "text",
+        attributes: Optional[Sequence[str]] = None,
+        fingerprint: bool = False,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        """
+        :param stream: The stream to write to
+        :param output_format: One of OUTPUT_FORMATS
+        :param attributes: The attributes to write. By default a jsonl
+            record holds all attributes of its query, and the tsv and csv
+            columns are the attributes of the first query.
+        :param fingerprint: Write the fingerprint and checksum of queries
+        :param buffer_size: The number of characters to buffer, 0 to write
+            every record as it comes
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}")
+        self.stream = stream
+        self.output_format = output_format
+        self.attributes: Optional[List[str]] = (
+            None if attributes is None else list(attributes)
+        )
+        self.fingerprint = fingerprint
+        self.buffer_size = buffer_size
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer, lineterminator="\n")
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=str
+        )
+        self._classes: Dict[str, str] = {}
+        self._keys: Dict[str, str] = {}
+        self._header = output_format in ("text", "jsonl")
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(
+        self,
+        query: str,
+        distilled: DistilledQuery,
+        attributes: Optional[Mapping[str, Any]] = None,
+        fingerprint: Optional[Fingerprint] = None,
+    ) -> None:
+        """
+        Write the record of a query
+
+        :param query: The query
+        :param distilled: The distilled query, see distill_record()
+        :param attributes: Its attributes, e.g. SlowLogRecord.attributes
+        :param fingerprint: Its fingerprint, if fingerprints are written
+        """
+        output_format = self.output_format
+        buffer = self._buffer
+        if output_format == "text":
+            buffer.write(distilled.canonical)
+            buffer.write("\n")
+        else:
+            if not self._header:
+                self._write_header(attributes)
+            if output_format == "jsonl":
+                self._write_json(query, distilled, attributes, fingerprint)
+            elif output_format == "tsv":
+                self._write_tsv(query, distilled, attributes, fingerprint)
+            else:
+                self._write_csv(query, distilled, attributes, fingerprint)
+        if buffer.tell() >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to the stream
+        """
+        buffer = self._buffer
+        if buffer.tell():
+            self.stream.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+
+    def close(self) -> None:
+        """
+        Write the header if no query was written, and the buffered records
+        """
+        if not self._header:
+            self._write_header(None)
+        self.flush()
+
+    def _write_header(self, attributes: Optional[Mapping[str, Any]]) -> None:
+        """
+        Write the column names of tsv and csv output
+
+        :param attributes: The attributes of the first query
+        """
+        if self.attributes is None:
+            self.attributes = list(attributes or ())
+        columns = ["class", "kind", "verbs", "tables"]
+        if self.fingerprint:
+            columns += ["fingerprint", "checksum"]
+        columns += self.attributes
+        columns.append("query")
+        if self.output_format == "tsv":
+            self._buffer.write(
+                "\t".join(column.translate(_tsv_escapes) for column in columns) + "\n"
+            )
+        else:
+            self._csv.writerow(columns)
+        self._header = True
+
+    def _serialized_class(self, distilled: DistilledQuery) -> str:
+        """
+        Serialize the class, kind, verbs and tables of a distilled query
+
+        :param distilled: The distilled query
+        :return: Its columns, or the start of its JSON object
+        """
+        classes = self._classes
+        serialized = classes.get(distilled.canonical)
+        if serialized is None:
+            if self.output_format == "jsonl":
+                serialized = self._encoder.encode(
+                    {
+                        "class": distilled.canonical,
+                        "kind": distilled.kind,
+                        "verbs": distilled.verbs,
+                        "tables": distilled.tables,
+                    }
+                )[:-1]
+            else:
+                serialized = "\t".join(
+                    column.translate(_tsv_escapes)
+                    for column in (
+                        distilled.canonical,
+                        distilled.kind,
+                        " ".join(distilled.verbs),
+                        ",".join(distilled.tables),
+                    )
+                )
+            if len(classes) >= _MAX_CACHED_CLASSES:
+                classes.clear()
+            classes[distilled.canonical] = serialized
+        return serialized
+
+    def _write_json(
+        self,
+        query: str,
+        distilled: DistilledQuery,
+        attributes: Optional[Mapping[str, Any]],
+        fingerprint: Optional[Fingerprint],
+    ) -> None:
+        """
+        Write a jsonl record, see write()
+        """
+        buffer = self._buffer
+        buffer.write(self._serialized_class(distilled))
+        if self.fingerprint:
+            if fingerprint is None:
+                buffer.write(',"fingerprint":null,"checksum":null')
+            else:
+                buffer.write(',"fingerprint":')
+                buffer.write(self._encoder.encode(fingerprint.fingerprint))
+                buffer.write(',"checksum":')
+                buffer.write(self._encoder.encode(fingerprint.checksum))
+        buffer.write(',"attributes":{')
+        if attributes:
+            names = attributes if self.attributes is None else self.attributes
+            keys = self._keys
+            separator = ""
+            for name in names:
+                if name not in attributes:
+                    continue
+                key = keys.get(name)
+                if key is None:
+                    key = keys[name] = self._encoder.encode(str(name)) + ":"
+                buffer.write(separator)
+                buffer.write(key)
+                buffer.write(self._json_value(attributes[name]))
+                separator = ","
+        buffer.write('},"query":')
+        buffer.write(self._encoder.encode(query))
+        buffer.write("}\n")
+
+    def _json_value(self, value: Any) -> str:
+        """
+        Serialize an attribute value
+
+        Numbers are serialized without going through the JSON encoder,
+        which has a fast path of its own for strings.
+
+        :param value: The value
+        :return: Its JSON
+        """
+        kind = type(value)
+        if kind is int:
+            return int.__repr__(value)
+        if kind is float and math.isfinite(value):
+            return float.__repr__(value)
+        return self._encoder.encode(value)
+
+    def _write_tsv(
+        self,
+        query: str,
+        distilled: DistilledQuery,
+        attributes: Optional[Mapping[str, Any]],
+        fingerprint: Optional[Fingerprint],
+    ) -> None:
+        """
+        Write a tsv record, see write()
+        """
+        buffer = self._buffer
+        buffer.write(self._serialized_class(distilled))
+        for column in self._columns(query, attributes, fingerprint):
+            buffer.write("\t")
+            if _tsv_special_re.search(column):
+                column = column.translate(_tsv_escapes)
+            buffer.write(column)
+        buffer.write("\n")
+
+    def _write_csv(
+        self,
+        query: str,
+        distilled: DistilledQuery,
+        attributes: Optional[Mapping[str, Any]],
+        fingerprint: Optional[Fingerprint],
+    ) -> None:
+        """
+        Write a csv record, see write()
+        """
+        self._csv.writerow(
+            [
+                distilled.canonical,
+                distilled.kind,
+                " ".join(distilled.verbs),
+                ",".join(distilled.tables),
+            ]
+            + self._columns(query, attributes, fingerprint)
+        )
+
+    def _columns(
+        self,
+        query: str,
+        attributes: Optional[Mapping[str, Any]],
+        fingerprint: Optional[Fingerprint],
+    ) -> List[str]:
+        """
+        The columns of a record after its class, kind, verbs and tables
+
+        :return: The fingerprint and checksum, attributes and query
+        """
+        columns = []
+        if self.fingerprint:
+            if fingerprint is None:
+                columns += ["", ""]
+            else:
+                columns += [fingerprint.fingerprint, fingerprint.checksum]
+        attributes = attributes or {}
+        for name in self.attributes or ():
+            value = attributes.get(name)
+            columns.append("" if value is None else str(value))
+        columns.append(query)
+        return columns
@@ -0,0 +1,203 @@
+"""
+Distill CLI input on multiple cores
+
+This file is part of the mysql_distill package.
+
+The input stream is read in large blocks, cut at line boundaries or made
+of whole statements, and distilled in a process pool. Each worker returns
+the output for a whole block as one string, so both the pickling overhead
+and the number of writes stay proportional to the number of blocks rather
+than lines.
+"""
+import os
+import re
+
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from functools import partial
+from typing import (
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    TextIO,
+    TypeVar,
+)
+
+import mysql_distill
+from mysql_distill import splitter
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_comment_line_re: Pattern[str] = re.compile(r"^#.*$", flags=re.MULTILINE)
+_query_start_re: Pattern[str] = re.compile(r"^[\w(]")
+
+DEFAULT_CHUNK_SIZE: int = 1 << 20
+
+
+def prepare_line(line: str) -> Optional[str]:
+    """
+    Extract the query from one line of CLI input
+
+    :param line: The input line
+    :return: The query, or None if the line does not start with one
+    """
+    query = line.rstrip().split(";")[0]  # Split on ';', get first part
+    query = _comment_line_re.sub("", query)  # Remove lines starting with '#'
+    query = query.lstrip()  # Remove leading whitespaces
+    if _query_start_re.match(query):  # Continue if query starts with a word char
+        return query
+    return None
+
+
+def distill_query(query: str, max_length: Optional[int] = None) -> str:
+    """
+    Distill a query, optionally bounded by its length
+
+    :param query: The query
+    :param max_length: See distill_bounded(), None for no limit
+    :return: The distilled query
+    """
+    if max_length is None:
+        return mysql_distill.distill(query)
+    return mysql_distill.distill_bounded(query, max_length)[0]
+
+
+def distill_block(block: str, max_length: Optional[int] = None) -> str:
+    """
+    Distill every query in a block of lines
+
+    :param block: Lines of input, separated by newlines
+    :param max_length: See distill_bounded(), None for no limit
+    :return: The distilled queries, one per line
+    """
+    distilled = [
+        distill_query(query, max_length)
+        for query in map(prepare_line, block.split("\n"))
+        if query is not None
+    ]
+    return "".join(f"{line}\n" for line in distilled)
+
+
+def distill_statements(statements: List[str], max_length: Optional[int] = None) -> str:
+    """
+    Distill a batch of statements
+
+    :param statements: The statements to distill
+    :param max_length: See distill_bounded(), None for no limit
+    :return: The distilled statements, one per line
+    """
+    return "".join(f"{distill_query(query, max_length)}\n" for query in statements)
+
+
+def read_blocks(stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Read a stream in blocks that end at line boundaries
+
+    :param stream: The stream to read
+    :param chunk_size: The number of characters to read at a time
+    :return: Iterator of blocks without their final newline
+    """
+    # The chunks read since the last newline, joined once one is found
+    pending: List[str] = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        end = chunk.rfind("\n")
+        if end < 0:
+            pending.append(chunk)
+            continue
+        pending.append(chunk[:end])
+        yield "".join(pending)
+        pending = [chunk[end + 1 :]]
+    remainder = "".join(pending)
+    if remainder:
+        yield remainder
+
+
+def distill_parallel(
+    stream: TextIO,
+    jobs: int = 0,
+    ordered: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    statements: bool = False,
+    max_length: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Distill a stream in a process pool
+
+    At most two blocks per worker are in flight, so memory use does not
+    depend on the size of the input.
+
+    :param stream: The stream to read
+    :param jobs: The number of worker processes, 0 for one per CPU
+    :param ordered: Yield output in input order, else as blocks complete
+    :param chunk_size: The number of characters per block
+    :param statements: Split the stream into statements instead of lines
+    :param max_length: See distill_bounded(), None for no limit
+    :return: Iterator of output blocks, one distilled query per line
+    """
+    if statements:
+        batches = splitter.batch_statements(
+            splitter.split_statements(stream, chunk_size), chunk_size
+        )
+        return map_blocks(
+            partial(distill_statements, max_length=max_length), batches, jobs, ordered
+        )
+    return map_blocks(
+        partial(distill_block, max_length=max_length),
+        read_blocks(stream, chunk_size),
+        jobs,
+        ordered,
+    )
+
+
+def map_blocks(
+    function: Callable[[T], R],
+    blocks: Iterable[T],
+    jobs: int = 0,
+    ordered: bool = True,
+) -> Iterator[R]:
+    """
+    Apply a function to blocks of input in a process pool
+
+    :param function: The function to apply, must be picklable
+    :param blocks: The blocks of input
+    :param jobs: The number of worker processes, 0 for one per CPU
+    :param ordered: Yield output in input order, else as blocks complete
+    :return: Iterator of the function results
+    """
+    jobs = jobs or os.cpu_count() or 1
+    max_pending = jobs * 2
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if ordered:
+            queue: Deque[Future[R]] = deque()
+            for block in blocks:
+                if len(queue) >= max_pending:
+                    yield queue.popleft().result()
+                queue.append(executor.submit(function, block))
+            while queue:
+                yield queue.popleft().result()
+        else:
+            pending: Set[Future[R]] = set()
+            for block in blocks:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(executor.submit(function, block))
+            for future in as_completed(pending):
+                yield future.result()
@@ -6,7 +6,10 @@ This file is part of the mysql_distill package.
 import re
 import logging
 
-from typing import List, Pattern, Match
+from typing import List, Pattern, Match, Optional, Union
+
+from mysql_distill import cache, interning, limits, tokenizer
+from mysql_distill.prepared import PreparedQuery, data_def_stmts
 
 _logger = logging.getLogger(__name__)
 
@@ -28,12 +31,8 @@ _tbl_regex: Pattern[str] = re.compile(
 
 _tbl_split_re = re.compile(rf"\s*({tbl_ident_sub})(\s+.*)?", flags=re.IGNORECASE)
 
-# Data Definition Statements
-data_def_stmts: str = r"(?:CREATE|ALTER|TRUNCATE|DROP|RENAME)"
-
 # Data Manipulation Statements
 # data_manip_stmts: Pattern[str] = re.compile(r"(?:INSERT|UPDATE|DELETE|REPLACE)", re.IGNORECASE)
-_ddl_stmts: Pattern[str] = re.compile(rf"^\s*({data_def_stmts})\b", flags=re.IGNORECASE)
 
 _tbl_ident: Pattern[str] = re.compile(
     rf"TABLE\s+({tbl_ident_sub})(\s+.*)?", flags=re.IGNORECASE
@@ -52,21 +51,82 @@ _verb_insert_replace_re = re.compile(
     r"\A\s*(?:INSERT|REPLACE)(?!\s+INTO)", flags=re.IGNORECASE
 )
 _verb_load_data_re = re.compile(r"\A\s*LOAD DATA", flags=re.IGNORECASE)
+_create_re = re.compile(r"CREATE", flags=re.IGNORECASE)
+_select_re = re.compile(r"\bSELECT\b", flags=re.IGNORECASE)
 
 
-def get_tables(query: str) -> List[str]:
+def get_tables(
+    query: Union[str, PreparedQuery], engine: Optional[str] = None
+) -> List[str]:
     """
     Get all tables used in a query
 
-    :param query: Query to parse
+    :param query: Query to parse, or a PreparedQuery to reuse the steps
+        computed for it
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: List of tables
+    """
+    if cache.tables_cache is not None:
+        key = query.query if isinstance(query, PreparedQuery) else query
+        # A normalized key must be parsed as normalized
+        return list(
+            cache.tables_cache.lookup(
+                key,
+                engine,
+                lambda text: tuple(
+                    _interned(_get_tables(query if text is key else text, engine))
+                ),
+            )
+        )
+    return _interned(_get_tables(query, engine))
+
+
+def _interned(tables: List[str]) -> List[str]:
+    """
+    Share the table names, if interning is enabled
+
+    :param tables: The tables
+    :return: The tables, interned
+    """
+    table = interning.intern_table
+    if table is None:
+        return tables
+    return [table.intern(name) for name in tables]
+
+
+def get_tables_bytes(query: tokenizer.BytesLike) -> List[str]:
+    """
+    Get all tables used in an undecoded query
+
+    The query is parsed with the lexer engine and only the table names are
+    decoded. The results are not cached.
+
+    :param query: Query to parse, as bytes, bytearray or memoryview
+    :return: List of tables
+    """
+    return _interned(
+        tokenizer.tokens_get_tables(tokenizer.tokenize_bytes(limits.scan_prefix(query)))
+    )
+
+
+def _get_tables(query: Union[str, PreparedQuery], engine: Optional[str]) -> List[str]:
+    """
+    Get all tables used in a query, bypassing the cache
+
+    :param query: Query to parse, or a PreparedQuery
+    :param engine: Engine to use, see tokenizer.set_engine()
     :return: List of tables
     """
 
     _logger.debug("Getting tables for %s", query)
 
-    match = _ddl_stmts.search(query)
-    if match:
-        ddl_stmt = match.group(1)
+    prepared = query if isinstance(query, PreparedQuery) else PreparedQuery(query)
+    if tokenizer.use_lexer(engine):
+        return tokenizer.tokens_get_tables(prepared.tokens)
+
+    query = prepared.text
+    ddl_stmt = prepared.data_def
+    if ddl_stmt:
         _logger.debug("Special table type: %s", ddl_stmt)
         query = re.sub(r"IF\s+(?:NOT\s+)?EXISTS", "", query, flags=re.IGNORECASE)
 
@@ -74,39 +134,20 @@ def get_tables(query: str) -> List[str]:
             _logger.debug("Query alters database, not a table")
             return []
 
-        if re.search(r"CREATE.+?\bSELECT\b", query, flags=re.IGNORECASE):
+        if _create_select(query):
             select = re.search(
                 r"\b(SELECT\b.+)", query, flags=re.IGNORECASE | re.DOTALL
             )
             assert select
             _logger.debug("CREATE TABLE ... SELECT: %s", select.group(1))
-            return get_tables(select.group(1))
+            return _get_tables(select.group(1), engine)
         ddl_tbl_match = _tbl_ident.search(query)
         _logger.debug(
             "Table match: %s", ddl_tbl_match.group(1) if ddl_tbl_match else None
         )
         return list([ddl_tbl_match.group(1)]) if ddl_tbl_match else []
 
-    query = _modifier_re.sub(" ", query)
-
-    if _verb_lock_tables_re.search(query):
-        query = re.sub(r"^\s*LOCK TABLES\s+", "", query, flags=re.IGNORECASE)
-        _logger.debug("Special table type: LOCK TABLES")
-        query = re.sub(
-            r"\s+(?:READ(?:\s+LOCAL)?|WRITE)\s*", "", query, flags=re.IGNORECASE
-        )
-        _logger.debug("Locked tables: %s")
-        query = "FROM " + query
-
-    # quoted strings
-    query = _unescape_quotes_re.sub("", query)
-    for pattern in _quoted_strings_rs:
-        query = pattern.sub("?", query)
-
-    if _verb_insert_replace_re.search(query):
-        query = re.sub(
-            r"\A\s*(INSERT|REPLACE)\s+", r"\1 INTO ", query, flags=re.IGNORECASE
-        )
+    query = prepared.masked
 
     if _verb_load_data_re.match(query):
         tbl_match: Match[str] | None = re.search(
@@ -133,3 +174,60 @@ def get_tables(query: str) -> List[str]:
             tables.append(tbl_sub)
 
     return tables
+
+
+def _mask_literals(query: str) -> str:
+    """
+    Prepare a query for the table search of the regex engine
+
+    Modifiers are removed, LOCK TABLES lists become FROM lists, quoted
+    strings are masked and INTO is added to INSERT and REPLACE.
+
+    :param query: Query to prepare, see PreparedQuery.masked
+    :return: The prepared query
+    """
+    query = _modifier_re.sub(" ", query)
+
+    if _verb_lock_tables_re.search(query):
+        query = re.sub(r"^\s*LOCK TABLES\s+", "", query, flags=re.IGNORECASE)
+        _logger.debug("Special table type: LOCK TABLES")
+        query = re.sub(
+            r"\s+(?:READ(?:\s+LOCAL)?|WRITE)\s*", "", query, flags=re.IGNORECASE
+        )
+        _logger.debug("Locked tables: %s")
+        query = "FROM " + query
+
+    # quoted strings
+    query = _unescape_quotes_re.sub("", query)
+    for pattern in _quoted_strings_rs:
+        query = pattern.sub("?", query)
+
+    if _verb_insert_replace_re.search(query):
+        query = re.sub(
+            r"\A\s*(INSERT|REPLACE)\s+", r"\1 INTO ", query, flags=re.IGNORECASE
+        )
+    return query
+
+
+def _create_select(query: str) -> bool:
+    """
+    Check for CREATE ... SELECT on one line
+
+    Like re.search(r"CREATE.+?\bSELECT\b"), but in linear time: once a
+    line fails, later occurrences of CREATE on the same line need not be
+    tried.
+
+    :param query: Query to check
+    :return: Whether a SELECT follows a CREATE on the same line
+    """
+    skip = 0
+    for create in _create_re.finditer(query):
+        if create.start() < skip:
+            continue
+        line_end = query.find("\n", create.end())
+        if line_end < 0:
+            line_end = len(query)
+        if _select_re.search(query, create.end() + 1, line_end):
+            return True
+        skip = line_end
+    return False
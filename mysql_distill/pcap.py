@@ -0,0 +1,971 @@
+"""
+Extract queries from packet captures of MySQL traffic
+
+This file is part of the mysql_distill package.
+
+The PcapReader class turns the bytes of a classic pcap file, e.g. from
+tcpdump -w, into CapturedQuery records. It does no I/O of its own: feed()
+takes the file in chunks of any size and returns the queries completed so
+far, so a capture of any size streams with memory bounded by the open
+connections. read_pcap() drives it from a binary file:
+
+    with open("mysql.pcap", "rb") as capture:
+        for captured in read_pcap(capture):
+            print(distill(captured.query), captured.latency)
+
+Packets to or from the server ports are reassembled into TCP streams and
+split into MySQL protocol packets. Payloads of 16 MB and more, which are
+sent as several packets, are joined. The handshake, when captured, gives
+the connection id, user and default database, and tells whether the
+connection uses the compressed protocol (zlib) or TLS. TLS and zstd
+connections cannot be read and are skipped. For connections that were
+already open when the capture started, the reader waits for a segment
+that starts a command, and recognizes the compressed protocol from its
+framing.
+
+A COM_QUERY is returned when the first response bytes arrive from the
+server, with the time between the end of the query and that response as
+its latency, or when the connection ends without a response.
+"""
+import ipaddress
+import struct
+import zlib
+
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+__all__ = ["CapturedQuery", "PcapReader", "read_pcap"]
+
+DEFAULT_CHUNK_SIZE: int = 1 << 20
+DEFAULT_SERVER_PORTS: Tuple[int, ...] = (3306,)
+
+# Out-of-order bytes held per direction before the missing data is given up
+MAX_OUT_OF_ORDER: int = 1 << 20
+
+_pcap_magic = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_pcapng_magic = b"\x0a\x0d\x0d\x0a"
+
+# Link types
+_LINKTYPE_NULL = 0
+_LINKTYPE_ETHERNET = 1
+_LINKTYPE_RAW = (101, 12, 14, 228, 229)
+_LINKTYPE_LINUX_SLL = 113
+_LINKTYPE_LINUX_SLL2 = 276
+
+_ETHERTYPE_IPV4 = 0x0800
+_ETHERTYPE_IPV6 = 0x86DD
+_ETHERTYPE_VLAN = (0x8100, 0x88A8)
+_IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+# TCP flags
+_FIN = 0x01
+_SYN = 0x02
+_RST = 0x04
+
+# Capability flags
+_CLIENT_CONNECT_WITH_DB = 0x00000008
+_CLIENT_COMPRESS = 0x00000020
+_CLIENT_SSL = 0x00000800
+_CLIENT_SECURE_CONNECTION = 0x00008000
+_CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA = 0x00200000
+_CLIENT_ZSTD_COMPRESSION_ALGORITHM = 0x04000000
+_CLIENT_QUERY_ATTRIBUTES = 0x08000000
+
+# Commands
+_COM_INIT_DB = 0x02
+_COM_QUERY = 0x03
+_COM_CHANGE_USER = 0x11
+# The commands a client may start a packet with, for resynchronizing
+_COMMANDS = frozenset(
+    (0x01, 0x02, 0x03, 0x04, 0x09, 0x0C, 0x0E, 0x11, 0x16, 0x17, 0x19, 0x1A)
+    + (0x1B, 0x1C, 0x1F)
+)
+
+# Connection phases
+_GREETING = 0
+_LOGIN = 1
+_AUTH = 2
+_COMMAND = 3
+_SKIPPED = 4
+
+_MAX_PACKET = 0xFFFFFF
+
+
+class CapturedQuery:
+    """
+    One COM_QUERY from a capture, with its connection and timing
+    """
+
+    __slots__ = (
+        "query",
+        "time",
+        "latency",
+        "client",
+        "server",
+        "connection_id",
+        "user",
+        "db",
+    )
+
+    def __init__(
+        self,
+        query: str,
+        time: float,
+        client: str,
+        server: str,
+        connection_id: Optional[int] = None,
+        user: Optional[str] = None,
+        db: Optional[str] = None,
+        latency: Optional[float] = None,
+    ):
+        self.query = query
+        self.time = time
+        self.latency = latency
+        self.client = client
+        self.server = server
+        self.connection_id = connection_id
+        self.user = user
+        self.db = db
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """
+        The attributes that are known, named like SlowLogRecord.attributes
+
+        The latency is reported as query_time.
+        """
+        attributes: Dict[str, Any] = {
+            "time": self.time,
+            "client": self.client,
+            "server": self.server,
+        }
+        for name, value in (
+            ("query_time", self.latency),
+            ("id", self.connection_id),
+            ("user", self.user),
+            ("db", self.db),
+        ):
+            if value is not None:
+                attributes[name] = value
+        return attributes
+
+    def __repr__(self) -> str:
+        return f"CapturedQuery({self.query!r}, {self.attributes!r})"
+
+
+class PcapReader:
+    """
+    Sans-IO reader of MySQL queries from a classic pcap file
+
+    :param server_ports: The TCP ports of the MySQL servers
+    """
+
+    def __init__(self, server_ports: Iterable[int] = DEFAULT_SERVER_PORTS):
+        self.server_ports = frozenset(server_ports)
+        self.packets = 0
+        # Connections that could not be read, and data lost in the capture
+        self.skipped = 0
+        self.gaps = 0
+        self._buffer = bytearray()
+        self._record_header: Optional[struct.Struct] = None
+        self._time_unit = 1e-6
+        self._link_type = _LINKTYPE_ETHERNET
+        self._connections: Dict[Tuple[bytes, int, bytes, int], _Connection] = {}
+
+    def feed(self, data: bytes) -> List[CapturedQuery]:
+        """
+        Read the next bytes of the capture
+
+        :param data: The bytes following those fed before
+        :return: The queries completed by these bytes
+        """
+        buffer = self._buffer
+        buffer += data
+        queries: List[CapturedQuery] = []
+        pos = 0
+        if self._record_header is None:
+            if len(buffer) < 24:
+                return queries
+            self._read_file_header(bytes(buffer[:24]))
+            pos = 24
+
+        record_header = self._record_header
+        assert record_header is not None
+        end = len(buffer)
+        while end - pos >= 16:
+            seconds, fraction, captured, _length = record_header.unpack_from(
+                buffer, pos
+            )
+            if end - pos - 16 < captured:
+                break
+            frame = bytes(buffer[pos + 16 : pos + 16 + captured])
+            pos += 16 + captured
+            self.packets += 1
+            self._read_frame(frame, seconds + fraction * self._time_unit, queries)
+        del buffer[:pos]
+        return queries
+
+    def close(self) -> List[CapturedQuery]:
+        """
+        End the capture
+
+        :return: The queries still waiting for a response
+        """
+        queries: List[CapturedQuery] = []
+        for connection in self._connections.values():
+            connection.flush(queries)
+        self._connections.clear()
+        return queries
+
+    def _read_file_header(self, header: bytes) -> None:
+        """
+        Read the global header of the capture
+
+        :param header: The first 24 bytes of the capture
+        """
+        magic = header[:4]
+        if magic == _pcapng_magic:
+            raise ValueError(
+                "pcapng captures are not supported, write classic pcap with "
+                "tcpdump -w or convert with editcap -F pcap"
+            )
+        if magic not in _pcap_magic:
+            raise ValueError("Not a pcap capture")
+        byte_order, self._time_unit = _pcap_magic[magic]
+        self._link_type = struct.unpack(byte_order + "I", header[20:24])[0] & 0xFFFF
+        self._record_header = struct.Struct(byte_order + "IIII")
+
+    def _read_frame(
+        self, frame: bytes, time: float, queries: List[CapturedQuery]
+    ) -> None:
+        """
+        Read one captured frame
+
+        :param frame: The frame, as captured
+        :param time: The capture time
+        :param queries: The completed queries, to add to
+        """
+        segment = _tcp_segment(self._link_type, frame)
+        if segment is None:
+            return
+        (
+            source,
+            source_port,
+            destination,
+            destination_port,
+            seq,
+            flags,
+            payload,
+            size,
+        ) = segment
+        if destination_port in self.server_ports:
+            key = (source, source_port, destination, destination_port)
+            from_client = True
+        elif source_port in self.server_ports:
+            key = (destination, destination_port, source, source_port)
+            from_client = False
+        else:
+            return
+
+        connection = self._connections.get(key)
+        if connection is None:
+            if not (flags & _SYN or payload):
+                return
+            connection = self._connections[key] = _Connection(key, flags & _SYN)
+        stream = connection.client_stream if from_client else connection.server_stream
+        for data, gap in stream.accept(seq, flags, payload, size):
+            if gap:
+                self.gaps += 1
+            if from_client:
+                connection.client_data(data, gap, time, queries)
+            else:
+                connection.server_data(data, gap, time, queries)
+        if connection.phase == _SKIPPED and not connection.counted:
+            connection.counted = True
+            self.skipped += 1
+        if flags & (_FIN | _RST):
+            connection.flush(queries)
+            del self._connections[key]
+
+
+class _Stream:
+    """
+    One direction of a TCP connection, reassembled in sequence order
+    """
+
+    __slots__ = ("next_seq", "pending", "pending_bytes")
+
+    def __init__(self) -> None:
+        self.next_seq: Optional[int] = None
+        self.pending: Dict[int, bytes] = {}
+        self.pending_bytes = 0
+
+    def accept(
+        self, seq: int, flags: int, payload: bytes, size: int
+    ) -> List[Tuple[bytes, bool]]:
+        """
+        Add a segment
+
+        :param seq: Its sequence number
+        :param flags: Its TCP flags
+        :param payload: Its payload, as captured
+        :param size: The size of its payload, which may not all be captured
+        :return: The data now in sequence, each with whether data was lost
+            before it
+        """
+        if flags & _SYN:
+            self.next_seq = (seq + 1) & 0xFFFFFFFF
+            return []
+        if not size:
+            return []
+        if self.next_seq is None:
+            self.next_seq = seq
+        next_seq = self.next_seq
+        if len(payload) < size:
+            # Cut by the snapshot length: the rest of the segment is lost
+            offset = _seq_offset(seq, next_seq)
+            if offset + size <= 0:
+                return []
+            self.next_seq = (seq + size) & 0xFFFFFFFF
+            self.pending.clear()
+            self.pending_bytes = 0
+            return [(b"", True)]
+
+        offset = _seq_offset(seq, next_seq)
+        if offset > 0:
+            if seq not in self.pending:
+                self.pending[seq] = payload
+                self.pending_bytes += len(payload)
+            if self.pending_bytes <= MAX_OUT_OF_ORDER:
+                return []
+            # Give up on the missing data
+            first = min(self.pending, key=lambda key: _seq_offset(key, next_seq))
+            return self._drain(first, True)
+
+        self.pending[seq] = payload
+        self.pending_bytes += len(payload)
+        return self._drain(next_seq, False)
+
+    def _drain(self, next_seq: int, gap: bool) -> List[Tuple[bytes, bool]]:
+        """
+        Take the pending segments that are now in sequence
+
+        :param next_seq: The sequence number of the next byte expected
+        :param gap: Whether data was lost before the first of them
+        :return: See accept()
+        """
+        chunks: List[Tuple[bytes, bool]] = []
+        found = True
+        while found and self.pending:
+            found = False
+            for seq in list(self.pending):
+                offset = _seq_offset(seq, next_seq)
+                if offset > 0:
+                    continue
+                payload = self.pending.pop(seq)
+                self.pending_bytes -= len(payload)
+                if len(payload) + offset > 0:
+                    data = payload[-offset:] if offset else payload
+                    chunks.append((data, gap))
+                    gap = False
+                    next_seq = (next_seq + len(data)) & 0xFFFFFFFF
+                found = True
+        self.next_seq = next_seq
+        return chunks
+
+
+class _Framer:
+    """
+    Splits the client side of a connection into MySQL packet payloads
+    """
+
+    __slots__ = ("buffer", "raw", "partial", "partial_seq", "compressed", "synced")
+
+    def __init__(self, synced: bool) -> None:
+        # Plain protocol bytes, and compressed protocol bytes
+        self.buffer = bytearray()
+        self.raw = bytearray()
+        # The payload so far of a packet split at 16 MB
+        self.partial: Optional[bytearray] = None
+        self.partial_seq = 0
+        self.compressed = False
+        self.synced = synced
+
+    def reset(self) -> None:
+        """
+        Forget the data so far, after data was lost
+        """
+        self.buffer.clear()
+        self.raw.clear()
+        self.partial = None
+        self.synced = False
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Add the next data of the stream
+
+        :param data: The data
+        :return: The sequence ids and payloads of the complete packets
+        """
+        if not self.synced:
+            if not self._resync(data):
+                return []
+        if self.compressed:
+            self.raw += data
+            try:
+                data = self._inflate()
+            except zlib.error:
+                self.reset()
+                return []
+        self.buffer += data
+        return self._payloads()
+
+    def _inflate(self) -> bytes:
+        """
+        Unpack the complete compressed packets
+
+        :return: The plain protocol bytes they hold
+        """
+        raw = self.raw
+        parts = []
+        pos = 0
+        while len(raw) - pos >= 7:
+            length = raw[pos] | raw[pos + 1] << 8 | raw[pos + 2] << 16
+            end = pos + 7 + length
+            if end > len(raw):
+                break
+            body = bytes(raw[pos + 7 : end])
+            if raw[pos + 4] or raw[pos + 5] or raw[pos + 6]:
+                body = zlib.decompress(body)
+            parts.append(body)
+            pos = end
+        del raw[:pos]
+        return b"".join(parts)
+
+    def _payloads(self) -> List[Tuple[int, bytes]]:
+        """
+        Take the complete packets from the buffer
+
+        :return: Their sequence ids and payloads, with packets split at 16 MB
+            joined under the sequence id of the first
+        """
+        buffer = self.buffer
+        payloads: List[Tuple[int, bytes]] = []
+        pos = 0
+        while len(buffer) - pos >= 4:
+            length = buffer[pos] | buffer[pos + 1] << 8 | buffer[pos + 2] << 16
+            end = pos + 4 + length
+            if end > len(buffer):
+                break
+            if self.partial is None:
+                if length == _MAX_PACKET:
+                    self.partial_seq = buffer[pos + 3]
+                    self.partial = bytearray(buffer[pos + 4 : end])
+                else:
+                    payloads.append((buffer[pos + 3], bytes(buffer[pos + 4 : end])))
+            else:
+                self.partial += buffer[pos + 4 : end]
+                if length < _MAX_PACKET:
+                    payloads.append((self.partial_seq, bytes(self.partial)))
+                    self.partial = None
+            pos = end
+        del buffer[:pos]
+        return payloads
+
+    def _resync(self, data: bytes) -> bool:
+        """
+        Check whether a segment starts a command, in either framing
+
+        :param data: The segment
+        :return: Whether the stream can be read from this segment on
+        """
+        if _starts_compressed_command(data):
+            self.compressed = True
+        elif _starts_command(data):
+            self.compressed = False
+        else:
+            return False
+        self.synced = True
+        return True
+
+
+class _Connection:
+    """
+    The state of one client connection
+    """
+
+    __slots__ = (
+        "client",
+        "server",
+        "client_stream",
+        "server_stream",
+        "client_framer",
+        "server_framer",
+        "phase",
+        "counted",
+        "capabilities",
+        "connection_id",
+        "user",
+        "db",
+        "pending",
+    )
+
+    def __init__(self, key: Tuple[bytes, int, bytes, int], syn: int):
+        client, client_port, server, server_port = key
+        self.client = _address(client, client_port)
+        self.server = _address(server, server_port)
+        self.client_stream = _Stream()
+        self.server_stream = _Stream()
+        # A connection seen from its start is read from the handshake on
+        self.client_framer = _Framer(bool(syn))
+        self.server_framer = _Framer(True)
+        self.phase = _GREETING if syn else _COMMAND
+        self.counted = False
+        self.capabilities = 0
+        self.connection_id: Optional[int] = None
+        self.user: Optional[str] = None
+        self.db: Optional[str] = None
+        self.pending: Optional[CapturedQuery] = None
+
+    def client_data(
+        self, data: bytes, gap: bool, time: float, queries: List[CapturedQuery]
+    ) -> None:
+        """
+        Read data sent by the client
+
+        :param data: The data
+        :param gap: Whether data was lost before it
+        :param time: The capture time
+        :param queries: The completed queries, to add to
+        """
+        if self.phase == _SKIPPED:
+            return
+        if gap:
+            if self.phase != _COMMAND:
+                self.phase = _SKIPPED
+                return
+            self.client_framer.reset()
+        for seq, payload in self.client_framer.feed(data):
+            if self.phase == _COMMAND:
+                # Other packets answer the server, e.g. during COM_CHANGE_USER
+                if not seq:
+                    self._command(payload, time, queries)
+            elif self.phase == _LOGIN:
+                self._login(payload)
+
+    def server_data(
+        self, data: bytes, gap: bool, time: float, queries: List[CapturedQuery]
+    ) -> None:
+        """
+        Read data sent by the server
+
+        After the handshake, only the time of the first response to a query
+        is of interest, so the data is not split into packets.
+
+        :param data: The data
+        :param gap: Whether data was lost before it
+        :param time: The capture time
+        :param queries: The completed queries, to add to
+        """
+        if self.phase == _COMMAND:
+            pending = self.pending
+            if pending is not None:
+                pending.latency = max(time - pending.time, 0.0)
+                queries.append(pending)
+                self.pending = None
+            return
+        if self.phase == _SKIPPED:
+            return
+        if gap:
+            self.phase = _SKIPPED
+            return
+        for _seq, payload in self.server_framer.feed(data):
+            if not payload:
+                continue
+            if self.phase == _GREETING:
+                self._greeting(payload)
+            elif self.phase == _AUTH:
+                if payload[0] == 0x00:
+                    # OK: commands follow, compressed if negotiated
+                    self.phase = _COMMAND
+                    self.client_framer.compressed = bool(
+                        self.capabilities & _CLIENT_COMPRESS
+                    )
+                elif payload[0] == 0xFF:
+                    self.phase = _SKIPPED
+
+    def flush(self, queries: List[CapturedQuery]) -> None:
+        """
+        Return the query waiting for a response, without latency
+
+        :param queries: The completed queries, to add to
+        """
+        if self.pending is not None:
+            queries.append(self.pending)
+            self.pending = None
+
+    def _greeting(self, payload: bytes) -> None:
+        """
+        Read the initial handshake of the server
+
+        :param payload: The payload
+        """
+        if payload[0] != 10:
+            self.phase = _SKIPPED
+            return
+        version_end = payload.find(b"\0", 1)
+        try:
+            pos = version_end + 1
+            self.connection_id = struct.unpack_from("<I", payload, pos)[0]
+            pos += 4 + 8 + 1
+            lower = struct.unpack_from("<H", payload, pos)[0]
+            upper = struct.unpack_from("<H", payload, pos + 5)[0]
+            self.capabilities = lower | upper << 16
+        except struct.error:
+            self.capabilities = 0xFFFFFFFF
+        self.phase = _LOGIN
+
+    def _login(self, payload: bytes) -> None:
+        """
+        Read the handshake response of the client
+
+        :param payload: The payload
+        """
+        if len(payload) < 32:
+            self.phase = _SKIPPED
+            return
+        client_capabilities = struct.unpack_from("<I", payload)[0]
+        capabilities = self.capabilities & client_capabilities
+        if client_capabilities & _CLIENT_SSL:
+            # SSLRequest: TLS follows
+            self.phase = _SKIPPED
+            return
+        if capabilities & _CLIENT_ZSTD_COMPRESSION_ALGORITHM and not (
+            capabilities & _CLIENT_COMPRESS
+        ):
+            self.phase = _SKIPPED
+            return
+        self.capabilities = capabilities
+        user, pos = _null_terminated(payload, 32)
+        self.user = user
+        try:
+            if capabilities & _CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA:
+                length, pos = _length_encoded(payload, pos)
+            elif capabilities & _CLIENT_SECURE_CONNECTION:
+                length = payload[pos]
+                pos += 1
+            else:
+                length = payload.index(b"\0", pos) - pos + 1
+            if capabilities & _CLIENT_CONNECT_WITH_DB:
+                self.db = _null_terminated(payload, pos + length)[0] or None
+        except (IndexError, ValueError):
+            pass
+        self.phase = _AUTH
+
+    def _command(
+        self, payload: bytes, time: float, queries: List[CapturedQuery]
+    ) -> None:
+        """
+        Read a command of the client
+
+        :param payload: The payload
+        :param time: The capture time
+        :param queries: The completed queries, to add to
+        """
+        if not payload:
+            return
+        command = payload[0]
+        if command == _COM_QUERY:
+            self.flush(queries)
+            text = _query_text(payload, self.capabilities & _CLIENT_QUERY_ATTRIBUTES)
+            query = text.decode(errors="replace")
+            self.pending = CapturedQuery(
+                query,
+                time,
+                self.client,
+                self.server,
+                self.connection_id,
+                self.user,
+                self.db,
+            )
+            if query[:3].upper() == "USE":
+                db = query[3:].strip().rstrip(";").strip().strip("`")
+                if db and query[3:4].isspace():
+                    self.db = db
+        elif command == _COM_INIT_DB:
+            self.db = payload[1:].decode(errors="replace") or None
+        elif command == _COM_CHANGE_USER:
+            self.user, pos = _null_terminated(payload, 1)
+            try:
+                if self.capabilities & _CLIENT_SECURE_CONNECTION:
+                    pos += 1 + payload[pos]
+                else:
+                    pos = payload.index(b"\0", pos) + 1
+                self.db = _null_terminated(payload, pos)[0] or None
+            except (IndexError, ValueError):
+                self.db = None
+
+
+def read_pcap(
+    capture: BinaryIO,
+    server_ports: Iterable[int] = DEFAULT_SERVER_PORTS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[CapturedQuery]:
+    """
+    Read the queries of a pcap file
+
+    :param capture: The capture, opened in binary mode
+    :param server_ports: The TCP ports of the MySQL servers
+    :param chunk_size: The number of bytes to read at a time
+    :return: Iterator of queries, in the order their responses were captured
+    """
+    reader = PcapReader(server_ports)
+    while True:
+        data = capture.read(chunk_size)
+        if not data:
+            break
+        yield from reader.feed(data)
+    yield from reader.close()
+
+
+def _tcp_segment(
+    link_type: int, frame: bytes
+) -> Optional[Tuple[bytes, int, bytes, int, int, int, bytes, int]]:
+    """
+    Decode the TCP segment of a frame
+
+    :param link_type: The link type of the capture
+    :param frame: The frame
+    :return: Source and destination addresses and ports, sequence number,
+        flags, payload as captured and payload size, or None
+    """
+    try:
+        if link_type == _LINKTYPE_ETHERNET:
+            pos = 14
+            ethertype = frame[12] << 8 | frame[13]
+            while ethertype in _ETHERTYPE_VLAN:
+                ethertype = frame[pos + 2] << 8 | frame[pos + 3]
+                pos += 4
+            if ethertype not in (_ETHERTYPE_IPV4, _ETHERTYPE_IPV6):
+                return None
+        elif link_type == _LINKTYPE_LINUX_SLL:
+            pos = 16
+        elif link_type == _LINKTYPE_LINUX_SLL2:
+            pos = 20
+        elif link_type == _LINKTYPE_NULL:
+            pos = 4
+        elif link_type in _LINKTYPE_RAW:
+            pos = 0
+        else:
+            return None
+
+        version = frame[pos] >> 4
+        if version == 4:
+            header_length = (frame[pos] & 0x0F) * 4
+            total_length = frame[pos + 2] << 8 | frame[pos + 3]
+            if not total_length:
+                # Segmentation offload: the length is not set yet
+                total_length = len(frame) - pos
+            if frame[pos + 9] != 6 or (frame[pos + 6] & 0x3F or frame[pos + 7]):
+                # Not TCP, or a fragment
+                return None
+            source = frame[pos + 12 : pos + 16]
+            destination = frame[pos + 16 : pos + 20]
+            end = pos + total_length
+            pos += header_length
+        elif version == 6:
+            next_header = frame[pos + 6]
+            end = pos + 40 + (frame[pos + 4] << 8 | frame[pos + 5])
+            source = frame[pos + 8 : pos + 24]
+            destination = frame[pos + 24 : pos + 40]
+            pos += 40
+            while next_header in _IPV6_EXTENSION_HEADERS:
+                next_header = frame[pos]
+                pos += (frame[pos + 1] + 1) * 8
+            if next_header != 6:
+                return None
+        else:
+            return None
+
+        source_port, destination_port, seq = struct.unpack_from("!HHI", frame, pos)
+        flags = frame[pos + 13]
+        pos += (frame[pos + 12] >> 4) * 4
+    except (IndexError, struct.error):
+        return None
+    # Frames may be padded after the IP packet, or cut before its end
+    return (
+        source,
+        source_port,
+        destination,
+        destination_port,
+        seq,
+        flags,
+        frame[pos:end],
+        max(end - pos, 0),
+    )
+
+
+def _seq_offset(seq: int, next_seq: int) -> int:
+    """
+    Compare sequence numbers, allowing for wrap-around
+
+    :param seq: A sequence number
+    :param next_seq: The next expected sequence number
+    :return: How far seq is ahead of next_seq, negative if behind
+    """
+    return ((seq - next_seq + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def _starts_command(data: bytes, whole: bool = True) -> bool:
+    """
+    Check whether data looks like the start of a command packet
+
+    :param data: The data
+    :param whole: The data is a segment, so a packet cannot be longer than it
+        unless it is a query
+    :return: Whether it does
+    """
+    if len(data) < 5 or data[3] or data[4] not in _COMMANDS:
+        return False
+    length = data[0] | data[1] << 8 | data[2] << 16
+    if not length:
+        return False
+    return not whole or length + 4 <= len(data) or data[4] == _COM_QUERY
+
+
+def _starts_compressed_command(data: bytes) -> bool:
+    """
+    Check whether data looks like the start of a compressed command packet
+
+    The compressed packet must end with the segment, or continue after it.
+
+    :param data: The segment
+    :return: Whether it does
+    """
+    if len(data) < 12 or data[3]:
+        return False
+    length = data[0] | data[1] << 8 | data[2] << 16
+    if not length or length + 7 < len(data):
+        return False
+    body = data[7:]
+    if data[4] or data[5] or data[6]:
+        try:
+            body = zlib.decompressobj().decompress(body, 5)
+        except zlib.error:
+            return False
+    return _starts_command(body, False)
+
+
+def _query_text(payload: bytes, attributes: int) -> bytes:
+    """
+    Get the text of a COM_QUERY
+
+    :param payload: The payload of the command
+    :param attributes: Whether the client sends query attributes
+    :return: The query text
+    """
+    if not attributes:
+        return payload[1:]
+    try:
+        count, pos = _length_encoded(payload, 1)
+        _sets, pos = _length_encoded(payload, pos)
+        if count:
+            nulls = payload[pos : pos + (count + 7) // 8]
+            pos += len(nulls)
+            if not payload[pos]:
+                return payload[1:]
+            pos += 1
+            types = []
+            for _ in range(count):
+                types.append(payload[pos])
+                name_length, pos = _length_encoded(payload, pos + 2)
+                pos += name_length
+            for index, value_type in enumerate(types):
+                if not nulls[index // 8] & 1 << index % 8:
+                    pos = _skip_value(payload, pos, value_type)
+        return payload[pos:]
+    except IndexError:
+        return payload[1:]
+
+
+def _skip_value(payload: bytes, pos: int, value_type: int) -> int:
+    """
+    Skip a value in the binary protocol
+
+    :param payload: The payload
+    :param pos: The position of the value
+    :param value_type: Its type
+    :return: The position after the value
+    """
+    if value_type == 1:
+        return pos + 1
+    if value_type in (2, 13):
+        return pos + 2
+    if value_type in (3, 4, 9):
+        return pos + 4
+    if value_type in (5, 8):
+        return pos + 8
+    if value_type == 6:
+        return pos
+    if value_type in (7, 10, 11, 12):
+        return pos + 1 + payload[pos]
+    length, pos = _length_encoded(payload, pos)
+    return pos + length
+
+
+def _length_encoded(payload: bytes, pos: int) -> Tuple[int, int]:
+    """
+    Read a length-encoded integer
+
+    :param payload: The payload
+    :param pos: The position of the integer
+    :return: The integer and the position after it
+    """
+    first = payload[pos]
+    if first < 0xFB:
+        return first, pos + 1
+    size = {0xFC: 2, 0xFD: 3, 0xFE: 8}.get(first)
+    if size is None or pos + 1 + size > len(payload):
+        raise IndexError("Invalid length-encoded integer")
+    return int.from_bytes(payload[pos + 1 : pos + 1 + size], "little"), pos + 1 + size
+
+
+def _null_terminated(payload: bytes, pos: int) -> Tuple[str, int]:
+    """
+    Read a null-terminated string
+
+    :param payload: The payload
+    :param pos: The position of the string
+    :return: The string and the position after its terminator
+    """
+    end = payload.find(b"\0", pos)
+    if end < 0:
+        end = len(payload)
+    return payload[pos:end].decode(errors="replace"), end + 1
+
+
+def _address(address: bytes, port: int) -> str:
+    """
+    Format an address and port
+
+    :param address: The IPv4 or IPv6 address
+    :param port: The port
+    :return: e.g. 10.0.0.1:3306 or [::1]:3306
+    """
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6:
+        return f"[{ip}]:{port}"
+    return f"{ip}:{port}"
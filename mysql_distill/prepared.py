@@ -0,0 +1,151 @@
+"""
+Queries prepared for repeated analysis
+
+This file is part of the mysql_distill package.
+
+Distilling a query looks at it several times: distill_verbs() reads its
+leading keyword and strips its comments, get_tables() masks its literals,
+and both check whether it is a data definition statement. A PreparedQuery
+computes each of these steps on first use and keeps the result, so every
+later stage reuses it. distill(), distill_result(), distill_verbs() and
+get_tables() accept a PreparedQuery wherever they accept a string:
+
+    prepared = PreparedQuery(query)
+    distilled = distill(prepared)
+    tables = get_tables(prepared)
+
+distill() prepares plain strings itself, so its own stages share the
+steps as well.
+"""
+import re
+
+from typing import List, Optional, Pattern, Tuple
+
+import mysql_distill
+from mysql_distill import limits, tokenizer
+
+__all__ = ["PreparedQuery"]
+
+# Data Definition Statements
+data_def_stmts: str = f"(?:{'|'.join(sorted(tokenizer.data_def_keywords))})"
+_data_def_re: Pattern[str] = re.compile(
+    rf"^\s*({data_def_stmts})\b", flags=re.IGNORECASE
+)
+
+# The keyword a statement starts with, after whitespace and comments. A
+# line comment runs to the end of its line and a comment to its first */,
+# so there is only one way to match a run of comments and no backtracking.
+_leading_keyword_re: Pattern[str] = re.compile(
+    r"\s*(?:(?:--|\#)[^\n]*(?:\n|\Z)\s*|/\*[^!](?:[^*]|\*(?!/))*\*/\s*)*"
+    r"([A-Za-z_]+)\b"
+)
+
+
+class PreparedQuery:
+    """
+    A query and the normalization steps computed for it so far
+
+    The steps are computed from text, the query without the rows of a bulk
+    insert and cut to the scan window, see scan_prefix().
+    """
+
+    __slots__ = (
+        "query",
+        "text",
+        "_stripped",
+        "_leading_keyword",
+        "_data_def",
+        "_stripped_data_def",
+        "_masked",
+        "_tokens",
+    )
+
+    def __init__(self, query: str):
+        self.query = query
+        self.text = limits.scan_prefix(query)
+        self._stripped: Optional[str] = None
+        self._leading_keyword: Optional[Tuple[str, int]] = None
+        self._data_def: Optional[str] = None
+        self._stripped_data_def: Optional[str] = None
+        self._masked: Optional[str] = None
+        self._tokens: Optional[List[tokenizer.Token]] = None
+
+    def __repr__(self) -> str:
+        return f"PreparedQuery({self.query!r})"
+
+    @property
+    def stripped(self) -> str:
+        """
+        The text without comments, see strip_comments()
+        """
+        if self._stripped is None:
+            # Imported here: the rewriter imports this module and distills
+            # its fixed statements before it is set on the package
+            from mysql_distill import rewriter
+
+            self._stripped = rewriter.strip_comments(self.text)
+        return self._stripped
+
+    @property
+    def leading_keyword(self) -> Tuple[str, int]:
+        """
+        The upper-cased first keyword after whitespace and comments and its
+        position, or ("", -1)
+        """
+        if self._leading_keyword is None:
+            match = _leading_keyword_re.match(self.text)
+            self._leading_keyword = (
+                (match.group(1).upper(), match.start(1)) if match else ("", -1)
+            )
+        return self._leading_keyword
+
+    @property
+    def data_def(self) -> str:
+        """
+        The data definition keyword the text starts with, as written, or ""
+        """
+        if self._data_def is None:
+            self._data_def = _data_def_keyword(self.text)
+        return self._data_def
+
+    @property
+    def stripped_data_def(self) -> str:
+        """
+        The data definition keyword the stripped text starts with, or ""
+        """
+        if self._stripped_data_def is None:
+            stripped = self.stripped
+            self._stripped_data_def = (
+                self.data_def if stripped == self.text else _data_def_keyword(stripped)
+            )
+        return self._stripped_data_def
+
+    @property
+    def masked(self) -> str:
+        """
+        The text as the regex engine searches it for tables: modifiers
+        removed, LOCK TABLES lists rewritten and quoted strings masked
+        """
+        if self._masked is None:
+            self._masked = mysql_distill.parser._mask_literals(self.text)
+        return self._masked
+
+    @property
+    def tokens(self) -> List[tokenizer.Token]:
+        """
+        The tokens of the text, see tokenize()
+        """
+        if self._tokens is None:
+            self._tokens = tokenizer.tokenize(self.text)
+        return self._tokens
+
+
+def _data_def_keyword(text: str) -> str:
+    """
+    Match a data definition keyword at the start of a text
+
+    :param text: The text
+    :return: The keyword as written, or ""
+    """
+    match = _data_def_re.match(text)
+    return match.group(1) if match else ""
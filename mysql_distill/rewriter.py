@@ -4,56 +4,78 @@ Rewrite queries for canonical form
 The distill() function is the main entry point. It takes a query string
 and returns the canonical form of the query.
 
-The distill_verbs() function is a helper function that distills only the
-verbs from a query. It is used by the distill() function.
+The distill_result() function returns a DistilledQuery instead, holding
+the verbs, tables and kind of the statement next to the canonical form,
+and optionally the checksum of the query fingerprint.
 
-The distill_tables() function is a helper function that distills only the
-tables from a query. It is used by the distill() function.
+The fingerprint() function replaces the literals of a query with
+placeholders and returns the result with its checksum. The
+distill_fingerprint() function distills and fingerprints a query from a
+single scan of its text.
 
-The strip_comments() function is a helper function that removes comments
-from a query. It is used by the distill_verbs() function.
+The distill_batch() function distills many queries at once, returning a
+code per query that indexes into the distinct classes.
 
-The following variables are regular expressions that match various types
-of comments in a query:
+The distill_bytes() function distills an undecoded query, e.g. a slice of
+a memory-mapped log, with the lexer engine.
 
-olc_re: One-line comments
-mlc_re: Multi-line comments
-vlc_re: Version comments
-vlc_rf: Version comments for SHOW queries
+The distill_bounded() function distills a query in time bounded by a
+maximum length, from a prefix of longer queries.
 
-The following variables are regular expressions that match the start of
-various types of queries:
+The distill_verbs() function is a helper function that distills only the
+verbs from a query, dispatching on its leading keyword. It is used by the
+distill() function, which gets the tables with parser.get_tables().
 
-call_re: Stored procedure calls
-VERBS:   Verbs that start queries
+The strip_comments() function is a helper function that removes comments
+from a query. It is used by the distill_verbs() function.
 """
 import re
+import hashlib
 import logging
 
-from typing import Tuple, Pattern, Match, List, Optional
+from array import array
+from time import perf_counter_ns
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Tuple,
+    Pattern,
+    Match,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
 
 import mysql_distill
+from mysql_distill import cache, interning, limits, stats, tokenizer
+from mysql_distill.prepared import PreparedQuery
 
 _logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_QUERY_LENGTH: int = 1 << 16
+
 _verbs_re_pattern: str = (
     r"(^SHOW|^FLUSH|^COMMIT|^ROLLBACK|^BEGIN|SELECT|"
     r"INSERT|UPDATE|DELETE|REPLACE|^SET|UNION|^START|^LOCK)"
 )
 _verbs_re = re.compile(rf"\b{_verbs_re_pattern}\b", re.IGNORECASE)
 
-# One-line comments
+# One-line comments. A comment marker followed by a quote on the same line
+# does not start a comment; the second alternative consumes such a run up
+# to the quote, leaving it unchanged, so it is not rescanned from every
+# marker in it.
 _olc_re: Pattern[str] = re.compile(
-    r"(?:--|#)[^'\"\r\n]*(?=[\r\n]|$)", flags=re.MULTILINE
+    r"(?:--|#)[^'\"\r\n]*(?=[\r\n]|$)|((?:--|#)[^'\"\r\n]*['\"])",
+    flags=re.MULTILINE,
 )
 
 # But not /*!version */
 _mlc_re: Pattern[str] = re.compile(r"/\*[^!].*?\*/", flags=re.DOTALL | re.MULTILINE)
 
-# For SHOW + /*!version */
-_vlc_re: Pattern[str] = re.compile(
-    r"/\*.*?[0-9]+.*?\*/", flags=re.DOTALL | re.MULTILINE
-)
+# For SHOW + /*!version */, see _sub_version_comments()
+_digit_re: Pattern[str] = re.compile(r"[0-9]")
 
 # Variation for SHOW
 _vlc_rf: Pattern[str] = re.compile(
@@ -61,15 +83,16 @@ _vlc_rf: Pattern[str] = re.compile(
     flags=re.IGNORECASE | re.DOTALL | re.MULTILINE,
 )
 
-_verb_call_re: Pattern[str] = re.compile(r"\A\s*call\s+(\S+)\(", flags=re.IGNORECASE)
+# Matched at the position of the leading keyword
+_verb_call_re: Pattern[str] = re.compile(r"call\s+(\S+)\(", flags=re.IGNORECASE)
+_verb_unlock_re: Pattern[str] = re.compile(r"UNLOCK TABLES", flags=re.IGNORECASE)
+_verb_xa_re: Pattern[str] = re.compile(r"xa\s+(\S+)", flags=re.IGNORECASE)
+_admin_command: str = "administrator command:"
+_admin_command_bytes: bytes = _admin_command.encode()
+
 _verb_show_re: Pattern[str] = re.compile(r"^SHOW", flags=re.IGNORECASE)
 _verb_show_ws_re = re.compile(r"\A\s*SHOW\s+", re.IGNORECASE)
-_verb_load_re = re.compile(r"\A\s*LOAD", flags=re.IGNORECASE)
-_verb_admin_command_re = re.compile(r"\Aadministrator command:")
 _verb_load_data_re: Pattern[str] = re.compile(r"^LOAD DATA", flags=re.IGNORECASE)
-_verb_use_re: Pattern[str] = re.compile(r"^USE", flags=re.IGNORECASE)
-_verb_unlock_re: Pattern[str] = re.compile(r"\A\s*UNLOCK TABLES", flags=re.IGNORECASE)
-_verb_xa_re: Pattern[str] = re.compile(r"\A\s*xa\s+(\S+)", flags=re.IGNORECASE)
 
 _show_modifier_re = re.compile(r"\s+(?:SESSION|FULL|STORAGE|ENGINE)\b")
 _show_modifier_count_re = re.compile(r"\s+COUNT[^)]+\)")
@@ -81,21 +104,288 @@ _whitespace_re = re.compile(r"\s+")
 
 _predicate_into_table_re = re.compile(r"INTO TABLE\s+(\S+)", flags=re.IGNORECASE)
 
-_dds_match_re: Pattern[str] = re.compile(
-    rf"^\s*({mysql_distill.parser.data_def_stmts})\b", flags=re.IGNORECASE
+_data_def_object_re: Pattern[str] = re.compile(
+    r"(DATABASE|TABLE)\b", flags=re.IGNORECASE
 )
 _table_name_rewrite_re: Pattern[str] = re.compile(r"(_?)[0-9]+")
 
+# Statements distilled by lookup. They are keyed as written, in upper and
+# lower case, and without whitespace in upper case.
+_fixed_statement_texts = (
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+    "START TRANSACTION",
+    "SET autocommit=0",
+    "SET autocommit=1",
+)
+_fixed_statement_keywords = ("BEGIN", "COMMIT", "ROLLBACK", "START", "SET")
+_fixed_statements: Dict[str, Tuple[Tuple[str, str], "DistilledQuery"]] = {}
+_fixed_statement_max_length: int = 64
+
+_fingerprint_literals = frozenset(("NULL", "TRUE", "FALSE"))
+_fingerprint_operator_re: Pattern[str] = re.compile(r"[^\w`?)]")
+
+
+# Statement kinds of DistilledQuery
+KIND_DML: str = "DML"
+KIND_DDL: str = "DDL"
+KIND_SHOW: str = "SHOW"
+KIND_ADMIN: str = "admin"
+KIND_TRANSACTION: str = "transaction"
+KIND_UNKNOWN: str = ""
+
+# By the first verb; XA_* verbs are transactions as well
+_statement_kinds: Dict[str, str] = {
+    **dict.fromkeys(
+        ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "UNION", "CALL", "LOAD"),
+        KIND_DML,
+    ),
+    **dict.fromkeys(tokenizer.data_def_keywords, KIND_DDL),
+    "SHOW": KIND_SHOW,
+    **dict.fromkeys(("ADMIN", "FLUSH", "SET", "USE"), KIND_ADMIN),
+    **dict.fromkeys(
+        ("BEGIN", "COMMIT", "ROLLBACK", "START", "LOCK", "UNLOCK"), KIND_TRANSACTION
+    ),
+}
+
+
+class Fingerprint(NamedTuple):
+    """
+    A literal-normalized query and the checksum of its text
+    """
+
+    fingerprint: str
+    checksum: str
 
-def distill(query: str) -> str:
+
+class DistilledQuery(NamedTuple):
+    """
+    The parts of a distilled query
+
+    The canonical form is what distill() returns. Its verbs are split into
+    words, e.g. ("SELECT", "UNION") or ("SHOW", "TABLES"), and the table of
+    a LOAD DATA statement is listed with the tables. The fingerprint and
+    its checksum are only set by distill_result(query, checksum=True).
+    """
+
+    verbs: Tuple[str, ...]
+    tables: Tuple[str, ...]
+    kind: str
+    canonical: str
+    fingerprint: Optional[str] = None
+    checksum: Optional[str] = None
+
+
+def distill(query: Union[str, PreparedQuery], engine: Optional[str] = None) -> str:
     """
     Distill a query into a canonical form
 
-    :param query:
+    :param query: The query, or a PreparedQuery to reuse the steps computed
+        for it
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return:
+    """
+    return distill_result(query, engine).canonical
+
+
+def distill_result(
+    query: Union[str, PreparedQuery],
+    engine: Optional[str] = None,
+    checksum: bool = False,
+) -> DistilledQuery:
+    """
+    Distill a query into its verbs, tables, kind and canonical form
+
+    :param query: The query to distill, or a PreparedQuery
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :param checksum: Also set the fingerprint of the query and its
+        checksum, see fingerprint(). With the lexer engine the query is
+        distilled from the same scan, like distill_fingerprint() does.
+    :return: The distilled query
+    """
+    collector = stats.collector
+    start = perf_counter_ns() if collector is not None else 0
+    if checksum:
+        text = query.query if isinstance(query, PreparedQuery) else query
+        if tokenizer.use_lexer(engine):
+            tokens, query_fingerprint = _fingerprint_tokens(text)
+            result = _distill(text, engine, tokens)
+        else:
+            query_fingerprint = fingerprint(text)
+            result = _distill_cached(query, engine)
+        result = result._replace(
+            fingerprint=query_fingerprint.fingerprint,
+            checksum=query_fingerprint.checksum,
+        )
+    else:
+        result = _distill_cached(query, engine)
+    if collector is not None:
+        collector.add_time("distill", perf_counter_ns() - start)
+    return result
+
+
+def distill_bounded(
+    query: str,
+    max_length: int = DEFAULT_MAX_QUERY_LENGTH,
+    engine: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """
+    Distill a query in time bounded by max_length
+
+    A query longer than max_length characters is distilled from its first
+    max_length characters, cut at the last whitespace. The class of such a
+    query is usually right, since verbs and most tables come first, but
+    tables after the cut are missing.
+
+    :param query: The query to distill
+    :param max_length: The maximum number of characters to look at
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: The class, and whether it was distilled from a prefix only
+    """
+    if len(query) <= max_length:
+        return distill(query, engine), False
+
+    if stats.collector is not None:
+        stats.collector.hit("truncated")
+    return distill(limits.truncate_query(query, max_length), engine), True
+
+
+def distill_bytes(query: tokenizer.BytesLike) -> str:
+    """
+    Distill an undecoded query into a canonical form
+
+    The query is classified with the lexer engine straight from its bytes,
+    so invalid UTF-8 in string literals is never an issue and only the
+    words of the result are decoded. The results are not cached.
+
+    :param query: The query as bytes, bytearray or memoryview, e.g. a slice
+        of a memory-mapped log
+    :return: The canonical form, as distill(query, ENGINE_LEXER) would
+        return for the decoded query
+    """
+    collector = stats.collector
+    start = perf_counter_ns() if collector is not None else 0
+    query = limits.scan_prefix(query)
+    if query[: len(_admin_command_bytes)] == _admin_command_bytes:
+        # Short and produced by the server, so decoding it is safe
+        return distill(bytes(query).decode(errors="replace"), tokenizer.ENGINE_LEXER)
+    tokens = tokenizer.tokenize_bytes(query)
+    if collector is not None:
+        collector.add_time("tokenize", perf_counter_ns() - start)
+    distilled = _distill("", tokenizer.ENGINE_LEXER, tokens).canonical
+    if collector is not None:
+        collector.add_time("distill", perf_counter_ns() - start)
+    return distilled
+
+
+def _distill_cached(
+    query: Union[str, PreparedQuery], engine: Optional[str]
+) -> DistilledQuery:
+    """
+    Distill a query through the cache, if enabled
+
+    :param query: The query, or a PreparedQuery
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return:
+    """
+    if cache.distill_cache is not None:
+        key = query.query if isinstance(query, PreparedQuery) else query
+        # A normalized key must be distilled as normalized
+        return cache.distill_cache.lookup(
+            key, engine, lambda text: _distill(query if text is key else text, engine)
+        )
+    return _distill(query, engine)
+
+
+def distill_batch(
+    queries: Iterable[Optional[str]], engine: Optional[str] = None
+) -> Tuple[array, List[str]]:
+    """
+    Factorize a column of queries into distilled class codes
+
+    Each distinct query text is distilled once. Anything that is not a
+    string, such as None or NaN, gets the code -1. Objects with a
+    to_pylist() method, like Arrow arrays, are converted first.
+
+    :param queries: The queries to distill
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :return: Signed 64-bit codes indexing into the distinct classes, and the
+        distinct classes in order of first appearance
+    """
+    if hasattr(queries, "to_pylist"):
+        queries = queries.to_pylist()
+
+    codes = array("q")
+    append = codes.append
+    uniques: List[str] = []
+    class_codes: Dict[str, int] = {}
+    text_codes: Dict[str, int] = {}
+    for query in queries:
+        if not isinstance(query, str):
+            append(-1)
+            continue
+        code = text_codes.get(query)
+        if code is None:
+            distilled = distill(query, engine)
+            code = class_codes.get(distilled)
+            if code is None:
+                code = class_codes[distilled] = len(uniques)
+                uniques.append(distilled)
+            text_codes[query] = code
+        append(code)
+
+    return codes, uniques
+
+
+def _distill(
+    query: Union[str, PreparedQuery],
+    engine: Optional[str],
+    tokens: Optional[List[tokenizer.Token]] = None,
+) -> DistilledQuery:
+    """
+    Distill a query into its parts, bypassing the cache
+
+    Without tokens, the query is prepared once and its verbs and tables are
+    distilled from the same PreparedQuery.
+
+    :param query: The query, or a PreparedQuery
+    :param engine: Engine to use, see tokenizer.set_engine()
+    :param tokens: The tokens of the query if already known
     :return:
     """
     _logger.info("distill: %s", query)
-    verbs, table = distill_verbs(query)
+    collector = stats.collector
+    prepared: Optional[PreparedQuery]
+    if isinstance(query, PreparedQuery):
+        prepared, text = query, query.query
+    else:
+        prepared, text = None, query
+    if tokens is not None:
+        if prepared is not None:
+            text = prepared.text
+        start = perf_counter_ns() if collector is not None else 0
+        verbs, table = tokenizer.tokens_distill_verbs(text, tokens)
+    else:
+        fixed = _fixed_statements.get(text)
+        if fixed is not None:
+            if collector is not None:
+                collector.hit("fixed")
+            return fixed[1]
+        if prepared is None:
+            prepared = PreparedQuery(text)
+        text = prepared.text
+        start = perf_counter_ns() if collector is not None else 0
+        if tokenizer.use_lexer(engine):
+            tokens = prepared.tokens
+            if collector is not None:
+                collector.add_time("tokenize", perf_counter_ns() - start)
+                start = perf_counter_ns()
+            verbs, table = tokenizer.tokens_distill_verbs(text, tokens)
+        else:
+            verbs, table = distill_verbs(prepared, tokenizer.ENGINE_REGEX)
+    if collector is not None:
+        collector.add_time("verbs", perf_counter_ns() - start)
     _logger.info("distill: verbs=%s, table=%s", verbs, table)
 
     if verbs and _verb_show_re.match(verbs):
@@ -103,86 +393,354 @@ def distill(query: str) -> str:
         for alias_for_key, alias_for_value in alias_for.items():
             verbs = verbs.replace(alias_for_key, alias_for_value)
         _logger.info("distill: show verbs=%s", verbs)
-        query = verbs
+        return _distilled_query(verbs.split(), (), verbs)
     elif verbs and _verb_load_data_re.match(verbs):
-        return verbs
+        words = verbs.split()
+        return _distilled_query(words[:2], words[2:], verbs)
     else:
-        tables = _distill_tables(query, table)
-        _logger.info("distill: query=%s verbs=%s tables=%s", query, verbs, tables)
-        query = " ".join([verbs] + tables)
+        start = perf_counter_ns() if collector is not None else 0
+        tables = _distill_tables(
+            prepared if prepared is not None else text,
+            table,
+            tokenizer.tokens_get_tables(tokens) if tokens is not None else None,
+        )
+        if collector is not None:
+            collector.add_time("tables", perf_counter_ns() - start)
+        _logger.info("distill: query=%s verbs=%s tables=%s", text, verbs, tables)
+        return _distilled_query(verbs.split(), tables, " ".join([verbs] + tables))
 
-    return query
 
+def _distilled_query(
+    verbs: List[str], tables: Iterable[str], canonical: str
+) -> DistilledQuery:
+    """
+    Build a DistilledQuery, determine its kind and intern its parts
+
+    :param verbs: The verb words
+    :param tables: The tables
+    :param canonical: The canonical form
+    :return: The distilled query
+    """
+    first = verbs[0] if verbs else ""
+    kind = _statement_kinds.get(first)
+    if kind is None:
+        kind = KIND_TRANSACTION if first.startswith("XA_") else KIND_UNKNOWN
+    table = interning.intern_table
+    if table is not None:
+        intern = table.intern
+        return DistilledQuery(
+            intern(tuple(map(intern, verbs))),
+            intern(tuple(map(intern, tables))),
+            kind,
+            intern(canonical),
+        )
+    return DistilledQuery(tuple(verbs), tuple(tables), kind, canonical)
+
+
+def fingerprint(query: str) -> Fingerprint:
+    """
+    Fingerprint a query by replacing its literals with placeholders
 
-def distill_verbs(query: str) -> Tuple[str, str]:
+    Numbers, quoted strings, hex and bit literals, NULL, TRUE and FALSE
+    become ?, IN (...) and multi-row VALUES (...) lists of literals become
+    (?+), comments are removed and whitespace is collapsed, and the rest is
+    lower-cased.
+
+    :param query: The query to fingerprint
+    :return: The fingerprint and its checksum
+    """
+    return _fingerprint_tokens(query)[1]
+
+
+def distill_fingerprint(query: str) -> Tuple[str, Fingerprint]:
+    """
+    Distill and fingerprint a query from a single scan of its text
+
+    The class is distilled with the lexer engine.
+
+    :param query: The query to distill and fingerprint
+    :return: The canonical form and the fingerprint of the query
+    """
+    tokens, query_fingerprint = _fingerprint_tokens(query)
+    return (
+        _distill(query, tokenizer.ENGINE_LEXER, tokens).canonical,
+        query_fingerprint,
+    )
+
+
+def _fingerprint_tokens(query: str) -> Tuple[List[tokenizer.Token], Fingerprint]:
+    """
+    Tokenize and fingerprint a query in one pass
+
+    :param query: The query to fingerprint
+    :return: The tokens of the query and its fingerprint
+    """
+    tokens: List[tokenizer.Token] = []
+    parts: List[str] = []
+    spaced: List[bool] = []
+    gap = False
+    for kind, text, space in tokenizer.scan(query):
+        if kind == tokenizer.COMMENT:
+            gap = True
+            continue
+        upper = text if kind == tokenizer.STRING else text.upper()
+        tokens.append((kind, text, upper))
+        if kind == tokenizer.VERSION:
+            # Kept for the table search, but not part of the fingerprint
+            gap = True
+            continue
+
+        if (
+            kind in (tokenizer.STRING, tokenizer.NUMBER)
+            or upper in _fingerprint_literals
+            and kind == tokenizer.WORD
+        ):
+            part = "?"
+            # Fold the sign of a number unless it follows an operand
+            if (
+                kind == tokenizer.NUMBER
+                and parts
+                and parts[-1] in ("-", "+")
+                and (len(parts) < 2 or _fingerprint_operator_re.match(parts[-2]))
+            ):
+                parts.pop()
+                space = spaced.pop()
+        elif kind == tokenizer.PUNCT:
+            part = text
+        else:
+            part = text.lower()
+        parts.append(part)
+        spaced.append(space or gap)
+        gap = False
+
+    parts, spaced = _fingerprint_lists(parts, spaced)
+    query_fingerprint = "".join(
+        " " + part if space else part for part, space in zip(parts, spaced)
+    ).lstrip()
+    checksum = (
+        hashlib.md5(query_fingerprint.encode(), usedforsecurity=False)
+        .hexdigest()[-16:]
+        .upper()
+    )
+    return tokens, Fingerprint(query_fingerprint, checksum)
+
+
+def _fingerprint_lists(
+    parts: List[str], spaced: List[bool]
+) -> Tuple[List[str], List[bool]]:
+    """
+    Collapse IN (...) and VALUES (...), (...) lists of placeholders to (?+)
+
+    :param parts: The fingerprint tokens
+    :param spaced: Whether each token is preceded by a space
+    :return: The collapsed tokens and spacing
+    """
+    out_parts: List[str] = []
+    out_spaced: List[bool] = []
+    count = len(parts)
+    i = 0
+    while i < count:
+        part = parts[i]
+        out_parts.append(part)
+        out_spaced.append(spaced[i])
+        i += 1
+        if part not in ("in", "value", "values"):
+            continue
+
+        j = i
+        end = i
+        while j < count and parts[j] == "(":
+            k = j + 1
+            while k < count and parts[k] in ("?", ","):
+                k += 1
+            if k >= count or parts[k] != ")":
+                break
+            end = j = k + 1
+            if j + 1 < count and parts[j] == "," and parts[j + 1] == "(":
+                j += 1
+        if end > i:
+            out_parts.append("(?+)")
+            out_spaced.append(False)
+            i = end
+
+    return out_parts, out_spaced
+
+
+def distill_verbs(
+    query: Union[str, PreparedQuery], engine: Optional[str] = None
+) -> Tuple[str, str]:
     """
     Distill the verbs from a query
 
-    :param query:
+    Fixed statements like BEGIN or SET autocommit=1 are looked up directly.
+    Otherwise the leading keyword is read once, skipping whitespace and
+    comments, and selects the handler for the statement.
+
+    Leading whitespace and comments never change the result, as with the
+    lexer engine: "\n COMMIT" and "/* app */ COMMIT" distill to COMMIT,
+    "/* app */ CALL foo()" to CALL foo and "  SHOW TABLES" to SHOW TABLES
+    without the leading spaces. The leading keyword is matched as a whole
+    word, so "users" is not a USE statement.
+
+    :param query: The query, or a PreparedQuery to reuse the steps computed
+        for it
+    :param engine: Engine to use, see tokenizer.set_engine()
     :return:
     """
-    match: Optional[Match[str]] = _verb_call_re.match(query)
+    collector = stats.collector
+    prepared: Optional[PreparedQuery]
+    if isinstance(query, PreparedQuery):
+        prepared, text = query, query.query
+    else:
+        prepared, text = None, query
+    fixed = _fixed_statements.get(text)
+    if fixed is not None:
+        if collector is not None:
+            collector.hit("fixed")
+        return fixed[0]
+
+    if prepared is None:
+        prepared = PreparedQuery(text)
+    text = prepared.text
+    if tokenizer.use_lexer(engine):
+        return tokenizer.tokens_distill_verbs(text, prepared.tokens)
+
+    keyword, pos = prepared.leading_keyword
+    handler = _verb_handlers.get(keyword)
+    if handler is not None:
+        verbs = handler(text, pos)
+        if verbs is not None:
+            if collector is not None:
+                collector.hit(_handler_branches[handler])
+            return verbs
+
+    stripped = prepared.stripped
+    if not keyword or keyword == "SHOW":
+        verbs = _show_verbs(stripped)
+        if verbs is not None:
+            return verbs
+    if not keyword or keyword in tokenizer.data_def_keywords:
+        dds = prepared.stripped_data_def
+        if dds:
+            return _data_def_verbs(stripped, dds)
+    if collector is not None:
+        collector.hit("generic")
+    return _generic_verbs(stripped.lstrip())
+
+
+def _call_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    match = _verb_call_re.match(query, pos)
     if match:
         return rf"CALL {match.group(1)}", ""
+    return None
+
 
-    if _verb_use_re.match(query):
-        return "USE", ""
+def _use_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    return "USE", ""
 
-    if _verb_unlock_re.match(query):
+
+def _unlock_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    if _verb_unlock_re.match(query, pos):
         return "UNLOCK", ""
+    return None
+
 
-    match = _verb_xa_re.match(query)
+def _xa_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    match = _verb_xa_re.match(query, pos)
     if match:
         return f"XA_{match.group(1)}", ""
+    return None
 
-    if _verb_load_re.match(query):
-        match = _predicate_into_table_re.search(query)
-        tbl = ""
-        if match:
-            tbl = match.group(1)
-        tbl = tbl.replace("`", "")
-        return f"LOAD DATA {tbl}", ""
 
-    if _verb_admin_command_re.match(query):
-        query = query.replace("administrator command:", "ADMIN")
-        query = query.upper()
-        return query, ""
+def _load_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    match = _predicate_into_table_re.search(query, pos)
+    tbl = ""
+    if match:
+        tbl = match.group(1)
+    tbl = tbl.replace("`", "")
+    return f"LOAD DATA {tbl}", ""
 
-    query = strip_comments(query)
 
-    if _verb_show_ws_re.match(query):
-        _logger.debug(query)
+def _admin_command_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    if query.startswith(_admin_command):
+        query = query.replace(_admin_command, "ADMIN")
         query = query.upper()
-        query = _show_modifier_re.sub(" ", query)
-        query = _show_modifier_count_re.sub("", query)
-        query = _show_modifier_predicate_re.sub("", query)
-        query = _show_modifier_2_rs.sub(r"\1", query)
-        query = _whitespace_re.sub(" ", query)
-        _logger.debug(query)
         return query, ""
+    return None
+
+
+def _show_verbs(query: str) -> Optional[Tuple[str, str]]:
+    if not _verb_show_ws_re.match(query):
+        return None
+    collector = stats.collector
+    start = perf_counter_ns() if collector is not None else 0
+    _logger.debug(query)
+    query = query.lstrip().upper()
+    query = _show_modifier_re.sub(" ", query)
+    query = _show_modifier_count_re.sub("", query)
+    query = _show_modifier_predicate_re.sub("", query)
+    query = _show_modifier_2_rs.sub(r"\1", query)
+    query = _whitespace_re.sub(" ", query)
+    _logger.debug(query)
+    if collector is not None:
+        collector.hit("SHOW")
+        collector.add_time("show", perf_counter_ns() - start)
+    return query, ""
+
+
+def _data_def_verbs(query: str, dds: str) -> Tuple[str, str]:
+    collector = stats.collector
+    start = perf_counter_ns() if collector is not None else 0
+    query = re.sub(r"\s+IF(?:\s+NOT)?\s+EXISTS", " ", query, re.IGNORECASE)
+    obj: str = _data_def_object(query, dds)
+    _logger.debug('Data definition statement "%s" for %s', dds, obj)
+    db_or_tbl_match: Optional[Match[str]] = re.search(
+        rf"(?:TABLE|DATABASE)\s+({mysql_distill.tbl_ident_sub})(\s+.*)?",
+        query,
+        re.IGNORECASE,
+    )
+    db_or_tbl: str = ""
+    if db_or_tbl_match:
+        db_or_tbl = db_or_tbl_match.group(1)
+    _logger.debug("Matches db or table: %s", db_or_tbl)
+    if collector is not None:
+        collector.hit("DDL")
+        collector.add_time("ddl", perf_counter_ns() - start)
+    return dds.upper() + (" " + obj if obj else ""), db_or_tbl
+
+
+def _data_def_object(query: str, dds: str) -> str:
+    """
+    Find the object type of a data definition statement
 
-    dds_match: Optional[Match[str]] = _dds_match_re.match(query)
-    if dds_match:
-        dds: str = dds_match.group(1)
-        query = re.sub(r"\s+IF(?:\s+NOT)?\s+EXISTS", " ", query, re.IGNORECASE)
-        obj_match: Optional[Match[str]] = re.search(
-            rf"{dds}.+(DATABASE|TABLE)\b", query, re.IGNORECASE
-        )
-        obj: str = ""
-        if obj_match:
-            obj = obj_match.group(1).upper()
-        _logger.debug('Data definition statement "%s" for %s', dds, obj)
-        db_or_tbl_match: Optional[Match[str]] = re.search(
-            rf"(?:TABLE|DATABASE)\s+({mysql_distill.tbl_ident_sub})(\s+.*)?",
-            query,
-            re.IGNORECASE,
-        )
-        db_or_tbl: str = ""
-        if db_or_tbl_match:
-            db_or_tbl = db_or_tbl_match.group(1)
-        _logger.debug("Matches db or table: %s", db_or_tbl)
-        return dds.upper() + (" " + obj if obj else ""), db_or_tbl
+    Returns the last DATABASE or TABLE on the first line where it follows
+    the statement keyword, like re.search(rf"{dds}.+(DATABASE|TABLE)\b")
+    but in linear time: once a line fails, later occurrences of the keyword
+    on the same line need not be tried.
 
+    :param query: The query
+    :param dds: The statement keyword, e.g. CREATE
+    :return: DATABASE, TABLE or an empty string
+    """
+    skip = 0
+    for dds_match in re.finditer(re.escape(dds), query, re.IGNORECASE):
+        if dds_match.start() < skip:
+            continue
+        line_end = query.find("\n", dds_match.end())
+        if line_end < 0:
+            line_end = len(query)
+        obj = ""
+        for obj_match in _data_def_object_re.finditer(
+            query, dds_match.end() + 1, line_end
+        ):
+            obj = obj_match.group(1)
+        if obj:
+            return obj.upper()
+        skip = line_end
+    return ""
+
+
+def _generic_verbs(query: str) -> Tuple[str, str]:
     verbs = _verbs_re.findall(query)
     last = ""
     verbs = [last := v for v in map(str.upper, verbs) if v != last]
@@ -196,17 +754,62 @@ def distill_verbs(query: str) -> Tuple[str, str]:
     return verb_str, ""
 
 
-def _distill_tables(query: str, table: str) -> List[str]:
+def _fixed_verbs(query: str, pos: int) -> Optional[Tuple[str, str]]:
+    # The leading comments, if any, are skipped like whitespace
+    if len(query) - pos > _fixed_statement_max_length:
+        return None
+    fixed = _fixed_statements.get(_fixed_statement_key(query[pos:]))
+    return fixed[0] if fixed is not None else None
+
+
+def _fixed_statement_key(query: str) -> str:
+    return "".join(query.split()).upper()
+
+
+# Handlers for statements recognized by their leading keyword before
+# comments are stripped. A handler gets the query and the position of the
+# keyword, and returns None if the statement is not what the keyword
+# suggested.
+_verb_handlers: Dict[str, Callable[[str, int], Optional[Tuple[str, str]]]] = {
+    "CALL": _call_verbs,
+    "USE": _use_verbs,
+    "UNLOCK": _unlock_verbs,
+    "XA": _xa_verbs,
+    "LOAD": _load_verbs,
+    "ADMINISTRATOR": _admin_command_verbs,
+    **{keyword: _fixed_verbs for keyword in _fixed_statement_keywords},
+}
+
+# Branch names for StatsCollector.hit()
+_handler_branches: Dict[Callable[[str, int], Optional[Tuple[str, str]]], str] = {
+    _call_verbs: "CALL",
+    _use_verbs: "USE",
+    _unlock_verbs: "UNLOCK",
+    _xa_verbs: "XA",
+    _load_verbs: "LOAD",
+    _admin_command_verbs: "admin",
+    _fixed_verbs: "fixed",
+}
+
+
+def _distill_tables(
+    query: Union[str, PreparedQuery],
+    table: str,
+    raw_tables: Optional[List[str]] = None,
+) -> List[str]:
     """
     Distill the tables from a query
 
-    :param query: The query to distill
+    :param query: The query to distill, or a PreparedQuery
     :param table: The table to add to the list of tables
+    :param raw_tables: The tables of the query if already known
     :return: The list of tables
     """
+    if raw_tables is None:
+        raw_tables = mysql_distill.parser._get_tables(query, tokenizer.ENGINE_REGEX)
     tables = [
         _table_name_rewrite_re.sub(r"\1?", table_name.replace("`", ""))
-        for table_name in mysql_distill.get_tables(query)
+        for table_name in raw_tables
         if table_name is not None
     ]
 
@@ -226,10 +829,61 @@ def strip_comments(query: str) -> str:
     :param query: The query to strip comments from
     :return:
     """
-    query = _mlc_re.sub("", query)
-    query = _olc_re.sub("", query)
-    match = _vlc_rf.match(query)
-    if match:
-        qualifier = match.group(1)
-        query = _vlc_re.sub(qualifier, query)
+    collector = stats.collector
+    start = perf_counter_ns() if collector is not None else 0
+    # A comment cannot extend past the last */, so only the text before it
+    # is searched. Without that, every unterminated /* would be scanned to
+    # the end of the query, which is quadratic.
+    close = query.rfind("*/")
+    if close >= 0:
+        query = _mlc_re.sub("", query[: close + 2]) + query[close + 2 :]
+    query = _olc_re.sub(r"\1", query)
+    close = query.rfind("*/")
+    if close >= 0:
+        match = _vlc_rf.match(query, 0, close + 2)
+        if match:
+            qualifier = match.group(1)
+            query = _sub_version_comments(qualifier, query)
+    if collector is not None:
+        collector.add_time("strip_comments", perf_counter_ns() - start)
     return query
+
+
+def _sub_version_comments(qualifier: str, query: str) -> str:
+    """
+    Replace comments containing a number with a qualifier
+
+    A comment runs from /* to the first */ after its first digit. Scanning
+    stops as soon as no further comment can be found, which keeps this
+    linear where the equivalent regular expression is not.
+
+    :param qualifier: The replacement
+    :param query: The query
+    :return: The query with the comments replaced
+    """
+    parts: List[str] = []
+    pos = 0
+    while True:
+        start = query.find("/*", pos)
+        if start < 0:
+            break
+        digit = _digit_re.search(query, start + 2)
+        if digit is None:
+            break
+        end = query.find("*/", digit.start() + 1)
+        if end < 0:
+            break
+        parts.append(query[pos:start])
+        parts.append(qualifier)
+        pos = end + 2
+    parts.append(query[pos:])
+    return "".join(parts)
+
+
+for _text in _fixed_statement_texts:
+    _fixed = (
+        distill_verbs(_text, tokenizer.ENGINE_REGEX),
+        _distill(_text, tokenizer.ENGINE_REGEX),
+    )
+    for _key in (_text, _text.upper(), _text.lower(), _fixed_statement_key(_text)):
+        _fixed_statements[_key] = _fixed
@@ -0,0 +1,186 @@
+"""
+Streaming reader for the MySQL slow query log
+
+This file is part of the mysql_distill package.
+
+The parse_slow_log() function reads a slow log line by line and yields one
+SlowLogRecord per logged statement, so memory use does not depend on the
+size of the log. A record holds the statement text and the attributes of
+its header lines, which are parsed on first access:
+
+    # Time: 2023-05-01T10:00:00.123456Z
+    # User@Host: app[app] @ db1 [10.0.0.1]  Id:    42
+    # Query_time: 1.500000  Lock_time: 0.000100 Rows_sent: 1  Rows_examined: 9
+    use shop;
+    SET timestamp=1682935200;
+    SELECT *
+      FROM orders WHERE id = 1;
+
+Attribute names are lower-cased: time, user, host, ip, id, query_time,
+lock_time, rows_sent, rows_examined, db and timestamp, plus any other
+"Name: value" pairs found in header lines (e.g. Percona Server's Schema
+or Thread_id). Numeric values are converted to int or float.
+
+A new record starts at a # Time:, # User@Host: or # Query_time: line, so
+lines starting with # within a multi-line statement, e.g. comments, stay
+part of the statement.
+"""
+import re
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Pattern
+
+_user_host_re: Pattern[str] = re.compile(
+    r"# User@Host: (?P<user>[^\[\s]*)(?:\[[^\]]*\])?\s*@\s*(?P<host>\S*)"
+    r"\s*\[(?P<ip>[^\]]*)\](?:\s+Id:\s*(?P<id>\d+))?"
+)
+_attribute_re: Pattern[str] = re.compile(r"(\w+): (\S+)")
+_int_re: Pattern[str] = re.compile(r"-?\d+\Z")
+_float_re: Pattern[str] = re.compile(r"-?\d*\.\d+(?:[eE][+-]?\d+)?\Z")
+_use_re: Pattern[str] = re.compile(r"use (\S+);\s*\Z", flags=re.IGNORECASE)
+_timestamp_re: Pattern[str] = re.compile(r"SET timestamp=(\d+);\s*\Z")
+_server_banner_re: Pattern[str] = re.compile(
+    r"(?:\S+, Version: |Tcp port: |Time\s+Id\s+Command\b)"
+)
+
+_server_banner_prefixes = ("Tcp port: ", "Time ")
+# The header lines a record can start with. Other lines starting with #
+# are headers before the statement and comments within it.
+_record_prefixes = ("# Time: ", "# User@Host: ", "# Query_time: ")
+_preamble_prefixes = ("SET timestamp=", "use ", "USE ")
+_admin_command: str = "# administrator command: "
+
+
+class SlowLogRecord:
+    """
+    One statement from a slow log
+
+    The header lines are kept as logged and only parsed into attributes
+    when the attributes are first accessed.
+    """
+
+    __slots__ = ("query", "_headers", "_attributes")
+
+    def __init__(self, query: str, headers: List[str]):
+        self.query = query
+        self._headers = headers
+        self._attributes: Optional[Dict[str, Any]] = None
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        if self._attributes is None:
+            attributes: Dict[str, Any] = {}
+            for line in self._headers:
+                _parse_header(line, attributes)
+            self._attributes = attributes
+        return self._attributes
+
+    def __repr__(self) -> str:
+        return f"SlowLogRecord({self.query!r}, {self.attributes!r})"
+
+
+def parse_slow_log(lines: Iterable[str]) -> Iterator[SlowLogRecord]:
+    """
+    Parse a slow query log into records
+
+    :param lines: The lines of the log, e.g. an open text file
+    :return: Iterator of records in log order
+    """
+    headers: List[str] = []
+    statement: List[str] = []
+
+    for line in lines:
+        if line[:1] == "#":
+            if line.startswith(_admin_command):
+                statement.append("administrator command: " + line[25:])
+                continue
+            if statement:
+                if not line.startswith(_record_prefixes):
+                    statement.append(line)
+                    continue
+                yield _record(statement, headers)
+                headers = []
+                statement = []
+            headers.append(line)
+            continue
+
+        if (
+            line.startswith(_server_banner_prefixes) or ", Version: " in line
+        ) and _server_banner_re.match(line):
+            continue
+
+        if not statement:
+            if line.startswith(_preamble_prefixes) and (
+                _timestamp_re.match(line) or _use_re.match(line)
+            ):
+                headers.append(line)
+                continue
+            if not line.strip():
+                continue
+
+        statement.append(line)
+
+    if statement:
+        yield _record(statement, headers)
+
+
+def _parse_header(line: str, attributes: Dict[str, Any]) -> None:
+    """
+    Add the attributes of a header line to a record
+
+    :param line: The header line, starting with #
+    :param attributes: The attributes of the record
+    """
+    if line[:1] != "#":
+        match = _timestamp_re.match(line)
+        if match:
+            attributes["timestamp"] = int(match.group(1))
+            return
+        match = _use_re.match(line)
+        if match:
+            attributes["db"] = match.group(1).strip("`")
+        return
+
+    if line.startswith("# Time: "):
+        attributes["time"] = line[8:].strip()
+        return
+
+    if line.startswith("# User@Host: "):
+        match = _user_host_re.match(line)
+        if match:
+            attributes["user"] = match.group("user")
+            attributes["host"] = match.group("host")
+            attributes["ip"] = match.group("ip")
+            if match.group("id") is not None:
+                attributes["id"] = int(match.group("id"))
+        return
+
+    for name, value in _attribute_re.findall(line):
+        attributes[name.lower()] = _convert(value)
+
+
+def _convert(value: str) -> Any:
+    """
+    Convert a numeric attribute value
+
+    :param value: The value as logged
+    :return: An int, a float or the value unchanged
+    """
+    if _int_re.match(value):
+        return int(value)
+    if _float_re.match(value):
+        return float(value)
+    return value
+
+
+def _record(statement: List[str], headers: List[str]) -> SlowLogRecord:
+    """
+    Build a record from the lines of a statement
+
+    :param statement: The lines of the statement
+    :param headers: The header and preamble lines of the record
+    :return: The record
+    """
+    query = "".join(statement).rstrip()
+    if query.endswith(";"):
+        query = query[:-1]
+    return SlowLogRecord(query, headers)
@@ -0,0 +1,277 @@
+"""
+Streaming statement splitter for SQL scripts
+
+This file is part of the mysql_distill package.
+
+The split_statements() function reads a text stream in large blocks and
+yields one statement at a time, the way the mysql client does: the
+delimiter only ends a statement outside of quoted strings, backtick
+identifiers and comments, and a DELIMITER command at the start of a
+statement changes it.
+
+Each statement is matched by a single regular expression that consumes
+ordinary text, quoted strings and comments as whole units, so splitting
+runs at regular expression speed no matter how many lines or literals a
+statement has. When a statement does not fit in the buffer, scanning
+resumes where it stopped once more data has been read.
+
+The split_buffer() function splits a buffer held in memory, such as a
+memory-mapped file, with the same patterns compiled for bytes. It returns
+the span of each statement instead of a copy of its text.
+"""
+import mmap
+import re
+
+from typing import Iterator, List, Optional, Pattern, TextIO, Tuple, Union
+
+DEFAULT_CHUNK_SIZE: int = 1 << 20
+DEFAULT_DELIMITER: str = ";"
+
+# Anything re can search and slice without a copy, e.g. an mmap
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+_space_re: Pattern[str] = re.compile(r"\s*")
+_comment_re: Pattern[str] = re.compile(
+    r"(?:--(?=\s)|#)[^\n]*(?:\n|\Z)|/\*(?!!).*?\*/", flags=re.DOTALL
+)
+_delimiter_command_re: Pattern[str] = re.compile(
+    r"DELIMITER[ \t]+(\S+)[^\r\n]*(\r?\n|\Z)", flags=re.IGNORECASE
+)
+
+# The same patterns for split_buffer()
+_space_bytes_re: Pattern[bytes] = re.compile(_space_re.pattern.encode())
+_comment_bytes_re: Pattern[bytes] = re.compile(
+    _comment_re.pattern.encode(), flags=re.DOTALL
+)
+_delimiter_command_bytes_re: Pattern[bytes] = re.compile(
+    _delimiter_command_re.pattern.encode(), flags=re.IGNORECASE
+)
+_whitespace_bytes: bytes = b" \t\n\r\f\v"
+
+
+def _statement_re(delimiter: str) -> Pattern[str]:
+    """
+    Compile the pattern matching a statement up to the delimiter
+
+    :param delimiter: The statement delimiter
+    :return: The compiled pattern
+    """
+    return re.compile(_statement_pattern(delimiter), flags=re.VERBOSE | re.DOTALL)
+
+
+def _statement_bytes_re(delimiter: str) -> Pattern[bytes]:
+    """
+    Compile the pattern matching a statement up to the delimiter in bytes
+
+    Delimiters read from bytes are decoded as Latin-1, which maps every
+    byte to one character and back.
+
+    :param delimiter: The statement delimiter
+    :return: The compiled pattern
+    """
+    return re.compile(
+        _statement_pattern(delimiter).encode("latin-1"), flags=re.VERBOSE | re.DOTALL
+    )
+
+
+def _statement_pattern(delimiter: str) -> str:
+    """
+    Build the pattern matching a statement up to the delimiter
+
+    The pattern stops at the delimiter, at the end of the buffer, or in
+    front of a construct that is not terminated within the buffer. Quoted
+    strings and one-line comments are only consumed when they cannot be
+    continued by the next block, so scanning can resume where it stopped.
+
+    :param delimiter: The statement delimiter
+    :return: The pattern, to be compiled with re.VERBOSE and re.DOTALL
+    """
+    first = re.escape(delimiter[0])
+    not_delimiter = rf"(?!{re.escape(delimiter)})"
+    # A lone first character of a multi-character delimiter is ordinary text,
+    # unless the rest of the delimiter could still follow in the next block
+    lone_first = (
+        rf"|{not_delimiter}(?!.{{0,{len(delimiter) - 1}}}\Z){first}"
+        if len(delimiter) > 1
+        else ""
+    )
+    return rf"""(?:
+            [^'"`\#/\-{first}]+
+           |'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'(?!\Z)
+           |"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"(?!\Z)
+           |`[^`]*(?:``[^`]*)*`(?!\Z)
+           |/\*.*?\*/
+           |(?:--(?=\s)|\#)[^\n]*\n
+           |{not_delimiter}/(?![*]|\Z)
+           |{not_delimiter}-(?!-(?:\s|\Z)|\Z)
+           {lone_first}
+        )*"""
+
+
+def _skip_comments(text: str, pos: int) -> int:
+    """
+    Skip whitespace and comments, but not /*!version */ comments
+
+    :param text: The text to scan
+    :param pos: The position to start at
+    :return: The position of the first character of code
+    """
+    pos = _space_re.match(text, pos).end()  # type: ignore
+    while True:
+        match = _comment_re.match(text, pos)
+        if not match:
+            return pos
+        pos = _space_re.match(text, match.end()).end()  # type: ignore
+
+
+def _skip_comments_bytes(buffer: Buffer, pos: int, end: int) -> int:
+    """
+    Skip whitespace and comments in bytes, see _skip_comments()
+
+    :param buffer: The buffer to scan
+    :param pos: The position to start at
+    :param end: The position to stop at
+    :return: The position of the first byte of code
+    """
+    pos = _space_bytes_re.match(buffer, pos, end).end()  # type: ignore
+    while True:
+        match = _comment_bytes_re.match(buffer, pos, end)
+        if not match:
+            return pos
+        pos = _space_bytes_re.match(buffer, match.end(), end).end()  # type: ignore
+
+
+def split_statements(
+    stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Split a stream of SQL into statements
+
+    Statements are yielded without their delimiter and surrounding
+    whitespace. Statements consisting only of comments are skipped;
+    /*!version */ comments count as code.
+
+    :param stream: The stream to read
+    :param chunk_size: The number of characters to read at a time
+    :return: Iterator of statements
+    """
+    delimiter = DEFAULT_DELIMITER
+    statement_re = _statement_re(delimiter)
+    buf = ""
+    start = scan = 0
+    eof = False
+
+    while True:
+        end = len(buf)
+        code = _skip_comments(buf, start)
+
+        command = (
+            _delimiter_command_re.match(buf, code)
+            if buf[code : code + 9].upper() == "DELIMITER"
+            else None
+        )
+        if command and (command.group(2) or eof):
+            delimiter = command.group(1)
+            statement_re = _statement_re(delimiter)
+            start = scan = command.end()
+            continue
+
+        if command is None and code < end:
+            stop = statement_re.match(buf, max(code, scan)).end()  # type: ignore
+            if buf.startswith(delimiter, stop):
+                statement = buf[code:stop].rstrip()
+                if statement:
+                    yield statement
+                start = scan = stop + len(delimiter)
+                continue
+            scan = stop
+
+        if eof:
+            # Unterminated final statement
+            statement = buf[code:].rstrip()
+            if statement:
+                yield statement
+            break
+
+        # Read at least as much as the pending statement holds so far
+        chunk = stream.read(max(chunk_size, end - start))
+        if chunk:
+            buf = buf[start:] + chunk
+            scan -= start
+            start = 0
+        else:
+            eof = True
+
+
+def split_buffer(
+    buffer: Buffer,
+    start: int = 0,
+    end: Optional[int] = None,
+    delimiter: str = DEFAULT_DELIMITER,
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    Find the statements in a buffer without copying or decoding it
+
+    Like split_statements(), but for a whole buffer held in memory, such
+    as a memory-mapped file. Since the buffer is complete, it is scanned
+    in one pass. A part of a buffer can be split on its own when it starts
+    at a statement and the delimiter in effect there is passed.
+
+    :param buffer: The buffer, e.g. bytes or an mmap
+    :param start: The position to start at
+    :param end: The position to stop at, None for the end of the buffer
+    :param delimiter: The delimiter in effect at start
+    :return: Iterator of (start, stop, delimiter) tuples: the span of each
+        statement without its delimiter and surrounding whitespace, and
+        the delimiter in effect for it
+    """
+    if end is None:
+        end = len(buffer)
+    statement_re = _statement_bytes_re(delimiter)
+    delimiter_bytes = delimiter.encode("latin-1")
+    pos = start
+
+    while pos < end:
+        code = _skip_comments_bytes(buffer, pos, end)
+        if code >= end:
+            break
+
+        command = _delimiter_command_bytes_re.match(buffer, code, end)
+        if command:
+            delimiter = command.group(1).decode("latin-1")
+            statement_re = _statement_bytes_re(delimiter)
+            delimiter_bytes = command.group(1)
+            pos = command.end()
+            continue
+
+        stop = statement_re.match(buffer, code, end).end()  # type: ignore
+        if buffer[stop : stop + len(delimiter_bytes)] == delimiter_bytes:
+            pos = stop + len(delimiter_bytes)
+        else:
+            # Unterminated final statement
+            pos = stop = end
+        while stop > code and buffer[stop - 1] in _whitespace_bytes:
+            stop -= 1
+        if stop > code:
+            yield code, stop, delimiter
+
+
+def batch_statements(statements: Iterator[str], batch_size: int) -> Iterator[List[str]]:
+    """
+    Group statements into batches of roughly equal size
+
+    :param statements: The statements to group
+    :param batch_size: The number of characters per batch
+    :return: Iterator of lists of statements
+    """
+    batch: List[str] = []
+    size = 0
+    for statement in statements:
+        batch.append(statement)
+        size += len(statement)
+        if size >= batch_size:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
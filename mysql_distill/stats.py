@@ -0,0 +1,150 @@
+"""
+Opt-in instrumentation of the distill pipeline
+
+This file is part of the mysql_distill package.
+
+While a StatsCollector is installed, distill() and its helpers record the
+wall time spent in each stage and count which distill_verbs() branch
+classified each query. When no collector is installed, each instrumented
+point costs one global lookup.
+
+    with mysql_distill.collect_stats() as collector:
+        for query in queries:
+            mysql_distill.distill(query)
+    print(collector.report())
+
+Stages nest: "distill" includes "tokenize" (lexer engine only), "verbs"
+and "tables", and "verbs" includes "strip_comments", "show" and "ddl", so
+times are inclusive. Collectors are not thread-safe; use one per thread
+or process and merge them.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+__all__ = [
+    "StatsCollector",
+    "collect_stats",
+    "disable_stats",
+    "enable_stats",
+]
+
+collector: Optional["StatsCollector"] = None
+
+
+class StatsCollector:
+    """
+    Per-stage wall time and per-branch hit counts
+    """
+
+    __slots__ = ("calls", "nanoseconds", "branches")
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.nanoseconds: Counter[str] = Counter()
+        self.branches: Counter[str] = Counter()
+
+    def add_time(self, stage: str, nanoseconds: int) -> None:
+        """
+        Record one call of a stage
+
+        :param stage: The stage name
+        :param nanoseconds: The wall time spent
+        """
+        self.calls[stage] += 1
+        self.nanoseconds[stage] += nanoseconds
+
+    def hit(self, branch: str) -> None:
+        """
+        Count a query classified by a branch
+
+        :param branch: The branch name
+        """
+        self.branches[branch] += 1
+
+    def merge(self, other: "StatsCollector") -> None:
+        """
+        Add the counts of another collector
+
+        :param other: The collector to merge into this one
+        """
+        self.calls.update(other.calls)
+        self.nanoseconds.update(other.nanoseconds)
+        self.branches.update(other.branches)
+
+    def as_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Get the statistics as plain data, e.g. for JSON
+
+        :return: Calls and seconds by stage, and hits by branch
+        """
+        return {
+            "stages": {
+                stage: {"calls": calls, "seconds": self.nanoseconds[stage] / 1e9}
+                for stage, calls in self.calls.items()
+            },
+            "branches": {
+                branch: {"hits": hits} for branch, hits in self.branches.most_common()
+            },
+        }
+
+    def report(self) -> str:
+        """
+        Format the statistics as a table
+
+        :return: The report, one stage or branch per line
+        """
+        lines = [f"{'stage':<16}{'calls':>12}{'total ms':>14}{'mean us':>12}"]
+        for stage, calls in sorted(
+            self.calls.items(), key=lambda item: -self.nanoseconds[item[0]]
+        ):
+            nanoseconds = self.nanoseconds[stage]
+            lines.append(
+                f"{stage:<16}{calls:>12}{nanoseconds / 1e6:>14.3f}"
+                f"{nanoseconds / calls / 1e3:>12.3f}"
+            )
+        lines.append(f"{'branch':<16}{'hits':>12}")
+        for branch, hits in self.branches.most_common():
+            lines.append(f"{branch:<16}{hits:>12}")
+        return "\n".join(lines)
+
+
+def enable_stats(stats: Optional[StatsCollector] = None) -> StatsCollector:
+    """
+    Install a collector
+
+    :param stats: The collector to install, or None for a new one
+    :return: The installed collector
+    """
+    global collector
+    collector = stats if stats is not None else StatsCollector()
+    return collector
+
+
+def disable_stats() -> None:
+    """
+    Remove the installed collector
+    """
+    global collector
+    collector = None
+
+
+@contextmanager
+def collect_stats(
+    stats: Optional[StatsCollector] = None,
+) -> Iterator[StatsCollector]:
+    """
+    Install a collector for the duration of a with block
+
+    The previously installed collector, if any, is restored afterwards.
+
+    :param stats: The collector to install, or None for a new one
+    :return: The installed collector
+    """
+    global collector
+    previous = collector
+    installed = enable_stats(stats)
+    try:
+        yield installed
+    finally:
+        collector = previous
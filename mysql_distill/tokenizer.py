@@ -0,0 +1,478 @@
+"""
+Single-pass tokenizer for MySQL queries.
+
+This file is part of the mysql_distill package.
+
+The tokenize() function walks a query once and returns the significant
+tokens: identifiers, quoted strings, numbers and punctuation. Comments are
+dropped and quoted strings are kept whole, so no later stage has to rescan
+the text to tell code apart from literals. The contents of /*!version */
+comments are kept (MySQL executes them), and so are their delimiters, as
+VERSION tokens: like the regex engine, the table search does not read a
+table list across them. A backslash-escaped quote outside a string is
+punctuation, as the regex engine drops it, and does not open a string.
+The tokenize_bytes() function does the same for undecoded bytes, decoding
+only the tokens that can end up in a result.
+
+The tokens_distill_verbs() and tokens_get_tables() functions are the
+"lexer" engine counterparts of rewriter.distill_verbs() and
+parser.get_tables(). They classify a query from its token list instead of
+running a cascade of regular expressions over the text.
+
+The engine used by distill(), distill_verbs() and get_tables() when no
+engine is passed explicitly is chosen with set_engine():
+
+ENGINE_REGEX: The original regular expression pipeline (default)
+ENGINE_LEXER: The single-pass tokenizer
+"""
+import re
+import logging
+
+from typing import Iterator, List, Pattern, Tuple, Union
+
+from mysql_distill import cache, stats
+
+_logger = logging.getLogger(__name__)
+
+ENGINE_REGEX: str = "regex"
+ENGINE_LEXER: str = "lexer"
+ENGINES: Tuple[str, ...] = (ENGINE_REGEX, ENGINE_LEXER)
+
+_engine: str = ENGINE_REGEX
+
+# Token kinds
+WORD: str = "w"  # Bare word: keyword or unquoted identifier
+IDENT: str = "i"  # Qualified and/or backtick-quoted identifier
+STRING: str = "s"  # Quoted string, including x'', b'' and n'' literals
+NUMBER: str = "n"  # Decimal, hexadecimal or bit number
+PUNCT: str = "p"  # Any other single character, or an escaped quote
+COMMENT: str = "c"  # Comment, see scan()
+VERSION: str = "v"  # Version comment delimiter
+
+# A token is (kind, text, upper-cased text)
+Token = Tuple[str, str, str]
+
+# Bytes-like queries, e.g. a slice of a memory-mapped log, see tokenize_bytes()
+BytesLike = Union[bytes, bytearray, memoryview]
+
+_token_pattern: str = r"""\s*(?:
+        (?P<c>(?:--|\#)[^\r\n]*         # One-line comments
+            |/\*(?!!).*?(?:\*/|\Z))     # Multi-line comments, but not /*!version
+       |(?P<v>/\*!\d*|\*/)              # Version comment delimiters
+       |(?P<s>[xXbBnN]?'[^'\\]*(?:(?:\\.|'')[^'\\]*)*(?:'|\Z)
+            |"[^"\\]*(?:(?:\\.|"")[^"\\]*)*(?:"|\Z))
+       |(?P<n>0x[0-9a-fA-F]+\b|0b[01]+\b
+            |(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![{word}.]))
+       |(?P<i>{part}(?:\.{part})+|`[^`]*`)
+       |(?P<w>[{word}]+)
+       |(?P<p>\\["']|\S)
+    )"""
+
+_token_re: Pattern[str] = re.compile(
+    _token_pattern.format(word=r"\w", part=r"(?:`[^`]*`|\w+)"),
+    re.VERBOSE | re.DOTALL,
+)
+# In bytes patterns \w is ASCII only, so bytes of multi-byte characters
+# count as word characters to keep non-ASCII identifiers whole
+_token_bytes_re: Pattern[bytes] = re.compile(
+    _token_pattern.format(
+        word=r"\w\x80-\xff", part=r"(?:`[^`]*`|[\w\x80-\xff]+)"
+    ).encode(),
+    re.VERBOSE | re.DOTALL,
+)
+
+_string_token: Token = (STRING, "''", "''")
+
+_has_letter_re: Pattern[str] = re.compile(r"[a-zA-Z]")
+
+# Data definition statements, see prepared.data_def_stmts
+data_def_keywords = frozenset(("CREATE", "ALTER", "TRUNCATE", "DROP", "RENAME"))
+_modifiers = frozenset(("LOW_PRIORITY", "IGNORE", "STRAIGHT_JOIN", "DELAYED"))
+_table_keywords = frozenset(("FROM", "JOIN", "INTO", "UPDATE"))
+_verbs = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "UNION"))
+_leading_verbs = frozenset(
+    ("SHOW", "FLUSH", "COMMIT", "ROLLBACK", "BEGIN", "SET", "START", "LOCK")
+)
+_show_modifiers = frozenset(("SESSION", "FULL", "STORAGE", "ENGINE"))
+_show_predicates = frozenset(("FOR", "FROM", "LIKE", "WHERE", "LIMIT", "IN"))
+# Reserved words that end a table list, e.g. "FROM a, b , WHERE"
+_reserved = frozenset(
+    (
+        "CROSS",
+        "FOR",
+        "FORCE",
+        "FROM",
+        "GROUP",
+        "HAVING",
+        "IGNORE",
+        "INNER",
+        "INTO",
+        "JOIN",
+        "LEFT",
+        "LIMIT",
+        "LOCK",
+        "NATURAL",
+        "ON",
+        "ORDER",
+        "OUTER",
+        "PARTITION",
+        "RIGHT",
+        "SELECT",
+        "SET",
+        "STRAIGHT_JOIN",
+        "UNION",
+        "USE",
+        "USING",
+        "VALUES",
+        "WHERE",
+        "WINDOW",
+    )
+)
+
+_admin_command: str = "administrator command:"
+
+
+def set_engine(engine: str) -> None:
+    """
+    Set the default engine used by distill(), distill_verbs() and get_tables()
+
+    :param engine: ENGINE_REGEX or ENGINE_LEXER
+    """
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine != _engine:
+        # Cached results of calls without an explicit engine are now stale
+        cache.cache_clear()
+    _engine = engine
+
+
+def get_engine() -> str:
+    """
+    Get the default engine used by distill(), distill_verbs() and get_tables()
+
+    :return: ENGINE_REGEX or ENGINE_LEXER
+    """
+    return _engine
+
+
+def use_lexer(engine: str | None) -> bool:
+    """
+    Resolve an engine argument against the default engine
+
+    :param engine: Engine name, or None for the default engine
+    :return: True if the lexer engine should be used
+    """
+    if engine is None:
+        return _engine == ENGINE_LEXER
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    return engine == ENGINE_LEXER
+
+
+def tokenize(query: str) -> List[Token]:
+    """
+    Split a query into its significant tokens in a single pass
+
+    :param query: Query to tokenize
+    :return: List of (kind, text, upper-cased text) tuples
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    for match in _token_re.finditer(query):
+        kind = match.lastgroup
+        if kind is None or kind == COMMENT:
+            continue
+        text = match.group(kind)
+        # Quoted strings are never compared against keywords, so skip the copy
+        append((kind, text, text if kind == STRING else text.upper()))
+    return tokens
+
+
+def tokenize_bytes(query: BytesLike) -> List[Token]:
+    """
+    Split an undecoded query into its significant tokens in a single pass
+
+    Only words, identifiers and numbers are decoded, as UTF-8 or else as
+    Latin-1, so binary data and other encodings in quoted strings never
+    cause an error. Quoted strings become the empty string literal ''.
+
+    :param query: Query to tokenize, e.g. bytes or a memoryview of a mmap
+    :return: List of (kind, text, upper-cased text) tuples
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    for match in _token_bytes_re.finditer(query):
+        kind = match.lastgroup
+        if kind == COMMENT:
+            continue
+        if kind == STRING:
+            append(_string_token)
+            continue
+        raw = match.group(kind)  # type: ignore
+        try:
+            text = raw.decode()
+        except UnicodeDecodeError:
+            text = raw.decode("latin-1")
+        append((kind, text, text.upper()))  # type: ignore
+    return tokens
+
+
+def scan(query: str) -> Iterator[Tuple[str, str, bool]]:
+    """
+    Iterate over all tokens of a query, including comments
+
+    :param query: Query to scan
+    :return: Iterator of (kind, text, preceded by whitespace) tuples
+    """
+    for match in _token_re.finditer(query):
+        kind = match.lastgroup
+        assert kind is not None
+        start = match.start(kind)
+        yield kind, match.group(kind), start != match.start()
+
+
+def tokens_distill_verbs(query: str, tokens: List[Token]) -> Tuple[str, str]:
+    """
+    Distill the verbs from a tokenized query
+
+    :param query: The original query
+    :param tokens: The tokens of the query, see tokenize()
+    :return: The verbs and the table or database of a DDL statement
+    """
+    branch, verbs, db_or_tbl = _tokens_distill_verbs(query, tokens)
+    if stats.collector is not None:
+        stats.collector.hit(branch)
+    return verbs, db_or_tbl
+
+
+def _tokens_distill_verbs(query: str, tokens: List[Token]) -> Tuple[str, str, str]:
+    """
+    Distill the verbs from a tokenized query, see tokens_distill_verbs()
+
+    :param query: The original query
+    :param tokens: The tokens of the query
+    :return: The name of the branch taken for StatsCollector.hit(), the
+        verbs and the table or database of a DDL statement
+    """
+    if query.startswith(_admin_command):
+        return "admin", query.replace(_admin_command, "ADMIN").upper(), ""
+
+    if not tokens:
+        return "generic", "", ""
+
+    first = tokens[0][2]
+    count = len(tokens)
+
+    if first == "CALL" and count > 2 and tokens[2][1] == "(":
+        return "CALL", f"CALL {tokens[1][1]}", ""
+
+    if first == "USE":
+        return "USE", "USE", ""
+
+    if first == "UNLOCK" and count > 1 and tokens[1][2] == "TABLES":
+        return "UNLOCK", "UNLOCK", ""
+
+    if first == "XA" and count > 1:
+        return "XA", f"XA_{tokens[1][1]}", ""
+
+    if first == "LOAD":
+        return "LOAD", f"LOAD DATA {_load_data_table(tokens).replace('`', '')}", ""
+
+    if first == "SHOW":
+        return "SHOW", _show_verbs(tokens), ""
+
+    if first in data_def_keywords:
+        tokens = _strip_if_exists(tokens)
+        obj = ""
+        db_or_tbl = ""
+        for i, token in enumerate(tokens):
+            if token[2] in ("DATABASE", "TABLE"):
+                obj = token[2]
+                if i + 1 < len(tokens) and tokens[i + 1][0] in (WORD, IDENT):
+                    db_or_tbl = tokens[i + 1][1]
+                break
+        _logger.debug('Data definition statement "%s" for %s', first, obj)
+        return "DDL", first + (" " + obj if obj else ""), db_or_tbl
+
+    verbs: List[str] = []
+    for kind, _text, upper in tokens:
+        if kind == WORD and upper in _verbs and (not verbs or verbs[-1] != upper):
+            verbs.append(upper)
+    if first in _leading_verbs:
+        verbs.insert(0, first)
+
+    if verbs and verbs[0] == "SELECT" and len(verbs) > 1:
+        _logger.debug('False-positive verbs after SELECT: "%s"', verbs[1:])
+        verbs = ["SELECT", "UNION"] if "UNION" in verbs else ["SELECT"]
+
+    return "generic", " ".join(verbs), ""
+
+
+def tokens_get_tables(tokens: List[Token]) -> List[str]:
+    """
+    Get all tables used in a tokenized query
+
+    :param tokens: The tokens of the query, see tokenize()
+    :return: List of tables
+    """
+    if not tokens:
+        return []
+
+    first = tokens[0][2]
+
+    if first in data_def_keywords:
+        tokens = _strip_if_exists(tokens)
+        if len(tokens) > 1 and tokens[1][2] == "DATABASE":
+            _logger.debug("Query alters database, not a table")
+            return []
+
+        if first == "CREATE":
+            for i, token in enumerate(tokens):
+                if token[2] == "SELECT" and token[0] == WORD:
+                    _logger.debug("CREATE TABLE ... SELECT")
+                    return tokens_get_tables(tokens[i:])
+
+        for i, token in enumerate(tokens[:-1]):
+            if token[2] == "TABLE" and tokens[i + 1][0] in (WORD, IDENT):
+                return [tokens[i + 1][1]]
+        return []
+
+    tokens = [token for token in tokens if token[2] not in _modifiers]
+    if not tokens:
+        return []
+
+    if first == "LOCK" and len(tokens) > 1 and tokens[1][2] == "TABLES":
+        _logger.debug("Special table type: LOCK TABLES")
+        tokens = [(WORD, "FROM", "FROM")] + _strip_lock_types(tokens[2:])
+    elif first in ("INSERT", "REPLACE") and (len(tokens) < 2 or tokens[1][2] != "INTO"):
+        tokens = tokens[:1] + [(WORD, "INTO", "INTO")] + tokens[1:]
+    elif first == "LOAD" and len(tokens) > 1 and tokens[1][2] == "DATA":
+        table = _load_data_table(tokens)
+        return [table] if table else []
+
+    tables: List[str] = []
+    count = len(tokens)
+    end = 0
+    for i, (kind, _text, upper) in enumerate(tokens):
+        # Like the matches of a regular expression, table lists do not
+        # overlap, which also keeps this linear
+        if i < end or kind != WORD or upper not in _table_keywords:
+            continue
+        if upper == "UPDATE" and i and tokens[i - 1][2] == "KEY":
+            continue
+
+        j = i + 1
+        if j < count and tokens[j][1] == "(":
+            j += 1
+        if j >= count or tokens[j][0] not in (WORD, IDENT) or tokens[j][2] == "SELECT":
+            continue
+
+        found = [tokens[j][1]]
+        j += 1
+        while j < count:
+            k = j
+            if tokens[k][0] == WORD:  # Alias
+                if tokens[k][2] == "AS" and k + 1 < count and tokens[k + 1][0] == WORD:
+                    k += 1
+                k += 1
+            if (
+                k + 1 < count
+                and tokens[k][1] == ","
+                and tokens[k + 1][0] in (WORD, IDENT)
+                and tokens[k + 1][2] not in _reserved
+            ):
+                found.append(tokens[k + 1][1])
+                j = k + 2
+            else:
+                break
+        end = j
+
+        _logger.debug("Match tables: %s", found)
+        for table in found:
+            if not _has_letter_re.search(table):
+                _logger.debug("Skipping suspicious table name: %s", table)
+                continue
+            tables.append(table)
+
+    return tables
+
+
+def _strip_if_exists(tokens: List[Token]) -> List[Token]:
+    """
+    Remove IF [NOT] EXISTS from a tokenized DDL statement
+
+    :param tokens: The tokens of the query
+    :return: The tokens without the first IF [NOT] EXISTS
+    """
+    for i, token in enumerate(tokens):
+        if token[2] == "IF":
+            end = i + 1
+            if end < len(tokens) and tokens[end][2] == "NOT":
+                end += 1
+            if end < len(tokens) and tokens[end][2] == "EXISTS":
+                return tokens[:i] + tokens[end + 1 :]
+            break
+    return tokens
+
+
+def _strip_lock_types(tokens: List[Token]) -> List[Token]:
+    """
+    Remove READ [LOCAL] and WRITE lock types from a LOCK TABLES list
+
+    :param tokens: The tokens following LOCK TABLES
+    :return: The tokens without lock types
+    """
+    stripped: List[Token] = []
+    previous = ""
+    for token in tokens:
+        upper = token[2]
+        if upper not in ("READ", "WRITE") and not (
+            upper == "LOCAL" and previous == "READ"
+        ):
+            stripped.append(token)
+        previous = upper
+    return stripped
+
+
+def _load_data_table(tokens: List[Token]) -> str:
+    """
+    Find the table of a LOAD DATA statement
+
+    :param tokens: The tokens of the query
+    :return: The table following INTO TABLE, or an empty string
+    """
+    for i in range(len(tokens) - 2):
+        if (
+            tokens[i][2] == "INTO"
+            and tokens[i + 1][2] == "TABLE"
+            and tokens[i + 2][0] in (WORD, IDENT)
+        ):
+            return tokens[i + 2][1]
+    return ""
+
+
+def _show_verbs(tokens: List[Token]) -> str:
+    """
+    Distill a tokenized SHOW statement
+
+    :param tokens: The tokens of the query, starting with SHOW
+    :return: SHOW followed by at most two words
+    """
+    words = ["SHOW"]
+    i = 1
+    count = len(tokens)
+    while i < count and len(words) < 3:
+        kind, _text, upper = tokens[i]
+        i += 1
+        if upper in _show_modifiers or kind == VERSION:
+            continue
+        if upper == "COUNT":
+            while i < count and tokens[i][1] != ")":
+                i += 1
+            i += 1
+            continue
+        if upper in _show_predicates or kind == PUNCT:
+            break
+        words.append(upper)
+    return " ".join(words)
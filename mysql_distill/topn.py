@@ -0,0 +1,226 @@
+"""
+Heavy hitters in fixed memory
+
+This file is part of the mysql_distill package.
+
+SpaceSaving finds the most frequent query classes of a stream with a
+fixed number of counters, so memory use depends on neither the number of
+queries nor the number of classes. It implements the Space-Saving
+algorithm of Metwally, Agrawal and El Abbadi: a class that is not counted
+takes over the counter with the lowest count, and inherits that count as
+its error.
+
+Every reported count is an overestimate by at most its error, which is at
+most total / capacity. So a class making up more than 1 / capacity of the
+stream is always counted. The counts can be weighted by an attribute,
+e.g. query_time to find the classes taking the most time.
+
+The counter with the lowest count is found with a heap that holds one
+entry per counter and is updated lazily. Counts only grow, so a stale
+entry understates its counter and is refreshed when it reaches the top of
+the heap. Counting a class that already has a counter is a dict update.
+"""
+import heapq
+
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from mysql_distill.rewriter import distill
+
+__all__ = ["HeavyHitter", "SpaceSaving"]
+
+
+class HeavyHitter(NamedTuple):
+    """
+    A reported class
+
+    The true count is between estimate - error and estimate. guaranteed is
+    set if the class is certainly among the classes reported with it.
+    """
+
+    distilled: str
+    estimate: float
+    error: float
+    guaranteed: bool
+
+
+class SpaceSaving:
+    """
+    Count the most frequent classes with a fixed number of counters
+    """
+
+    def __init__(self, capacity: int, weight: Optional[str] = None):
+        """
+        :param capacity: The number of counters, e.g. 10 times the number
+            of classes to report
+        :param weight: The attribute to weight queries by, e.g. query_time.
+            Queries without a positive value are not counted. By default
+            every query counts 1.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.weight = weight
+        # The total weight of the queries counted
+        self.total: float = 0
+        self._counts: Dict[str, float] = {}
+        self._errors: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    @property
+    def error_bound(self) -> float:
+        """
+        The maximum error of any count
+        """
+        return self.total / self.capacity
+
+    def add(self, query: str, attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """
+        Distill a query and count it
+
+        :param query: The query
+        :param attributes: Its attributes, e.g. SlowLogRecord.attributes
+        :return: The class of the query
+        """
+        distilled = distill(query)
+        self.add_class(distilled, attributes)
+        return distilled
+
+    def add_class(
+        self, distilled: str, attributes: Optional[Mapping[str, Any]] = None
+    ) -> None:
+        """
+        Count an already distilled query
+
+        :param distilled: The class of the query
+        :param attributes: Its attributes, used when weighting
+        """
+        weight: Any = 1
+        if self.weight is not None:
+            weight = attributes.get(self.weight) if attributes else None
+            if not isinstance(weight, (int, float)) or weight <= 0:
+                return
+        self.total += weight
+
+        counts = self._counts
+        count = counts.get(distilled)
+        if count is not None:
+            counts[distilled] = count + weight
+            return
+
+        heap = self._heap
+        if len(counts) < self.capacity:
+            counts[distilled] = weight
+            self._errors[distilled] = 0
+            heapq.heappush(heap, (weight, distilled))
+            return
+
+        while True:
+            count, victim = heap[0]
+            current = counts[victim]
+            if current == count:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        del self._errors[victim]
+        counts[distilled] = count + weight
+        self._errors[distilled] = count
+        heapq.heapreplace(heap, (count + weight, distilled))
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """
+        Add the counts of another summary, e.g. of another log
+
+        The merged counts keep their guarantees, with the errors of both
+        summaries added up.
+
+        :param other: The summary to merge into this one
+        """
+        if other.weight != self.weight:
+            raise ValueError("Cannot merge summaries of different weights")
+        # An uncounted class occurred at most as often as the lowest count
+        own_min = self._min_count()
+        other_min = other._min_count()
+        merged = []
+        for distilled in self._counts.keys() | other._counts.keys():
+            merged.append(
+                (
+                    self._counts.get(distilled, own_min)
+                    + other._counts.get(distilled, other_min),
+                    self._errors.get(distilled, own_min)
+                    + other._errors.get(distilled, other_min),
+                    distilled,
+                )
+            )
+        merged.sort(key=lambda item: (-item[0], item[2]))
+        del merged[self.capacity :]
+        self.total += other.total
+        self._counts = {distilled: count for count, _, distilled in merged}
+        self._errors = {distilled: error for _, error, distilled in merged}
+        self._heap = [(count, distilled) for count, _, distilled in merged]
+        heapq.heapify(self._heap)
+
+    def top(self, n: Optional[int] = None) -> List[HeavyHitter]:
+        """
+        Get the classes with the highest counts
+
+        :param n: The number of classes, by default all counted classes
+        :return: The classes, highest count first
+        """
+        counts = sorted(self._counts.items(), key=lambda item: (-item[1], item[0]))
+        if n is None:
+            n = len(counts)
+        # The highest count a class that is not reported can have
+        threshold = max(counts[n][1] if n < len(counts) else 0, self._min_count())
+        errors = self._errors
+        return [
+            HeavyHitter(
+                distilled,
+                count,
+                errors[distilled],
+                count - errors[distilled] >= threshold,
+            )
+            for distilled, count in counts[:n]
+        ]
+
+    def report(self, n: Optional[int] = None) -> Iterator[str]:
+        """
+        Format the classes with the highest counts as tab-separated lines
+
+        :param n: The number of classes, by default all counted classes
+        :return: Iterator of lines without newlines, starting with a header
+        """
+        yield "\t".join((self.weight or "count", "error", "guaranteed", "class"))
+        for hitter in self.top(n):
+            yield "\t".join(
+                (
+                    _format(hitter.estimate),
+                    _format(hitter.error),
+                    "yes" if hitter.guaranteed else "no",
+                    hitter.distilled,
+                )
+            )
+
+    def _min_count(self) -> float:
+        """
+        The highest count a class without a counter can have
+
+        :return: The lowest count if all counters are used, else 0
+        """
+        if len(self._counts) < self.capacity:
+            return 0
+        return min(self._counts.values())
+
+
+def _format(value: float) -> str:
+    """
+    Format a count for the report
+
+    :param value: The count, an int unless weighted
+    :return: The formatted count
+    """
+    if isinstance(value, int):
+        return str(value)
+    return f"{value:.6f}"
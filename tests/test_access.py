@@ -0,0 +1,113 @@
+import io
+import os
+import unittest
+
+from contextlib import redirect_stderr, redirect_stdout
+
+import mysql_distill
+
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestTableAccess(unittest.TestCase):
+    def test_access_types(self):
+        matrix = mysql_distill.TableAccess()
+        for query in [
+            "select * from foo join bar using (id)",
+            "insert into foo select * from bar",
+            "update foo join bar on foo.id = bar.id set foo.a = 1",
+            "delete from foo where id in (select id from bar)",
+            "replace into foo values (1)",
+            "load data infile 'x' into table foo",
+            "alter table foo add column a int",
+            "LOCK TABLES foo READ, bar WRITE",
+            "show tables",
+        ]:
+            matrix.add(query, {"query_time": 0.5})
+
+        self.assertEqual(
+            matrix.get_counts("foo"),
+            {
+                "SELECT": 1,
+                "INSERT": 2,
+                "UPDATE": 1,
+                "DELETE": 1,
+                "REPLACE": 1,
+                "DDL": 1,
+                "LOCK": 1,
+            },
+        )
+        self.assertEqual(
+            matrix.get_counts("bar"),
+            {
+                "SELECT": 3,
+                "INSERT": 0,
+                "UPDATE": 1,
+                "DELETE": 0,
+                "REPLACE": 0,
+                "DDL": 0,
+                "LOCK": 1,
+            },
+            msg="Read by INSERT ... SELECT and subqueries, maybe written by a "
+            "multi-table UPDATE",
+        )
+        self.assertEqual(matrix.get_times("bar")["SELECT"], 1.5)
+        self.assertEqual(matrix.get_counts("missing"), {})
+        self.assertEqual(matrix.tables, ["foo", "bar"])
+
+    def test_classes(self):
+        matrix = mysql_distill.TableAccess()
+        for query in [
+            "select * from foo where id = 1",
+            "select * from foo where id = 2",
+            "select * from foo join bar using (id)",
+            "insert into foo values (1)",
+        ]:
+            matrix.add(query)
+        self.assertEqual(
+            matrix.get_classes("foo"), ["SELECT foo", "SELECT foo bar", "INSERT foo"]
+        )
+        self.assertEqual(matrix.get_classes("bar"), ["SELECT foo bar"])
+        self.assertEqual(matrix.get_counts("foo")["SELECT"], 3)
+        self.assertEqual(matrix.get_times("foo")["SELECT"], 0)
+        self.assertEqual(matrix.most_accessed(), ["foo", "bar"])
+
+    def test_merge(self):
+        first = mysql_distill.TableAccess()
+        first.add("select * from foo", {"query_time": 1})
+        second = mysql_distill.TableAccess()
+        second.add("select * from bar", {"query_time": 2})
+        second.add("update foo set a = 1", {"query_time": 3})
+        first.merge(second)
+        self.assertEqual(first.tables, ["foo", "bar"])
+        self.assertEqual(first.get_counts("foo")["UPDATE"], 1)
+        self.assertEqual(first.get_times("foo")["UPDATE"], 3)
+        self.assertEqual(first.get_classes("foo"), ["SELECT foo", "UPDATE foo"])
+        first.add("update foo set a = 2")
+        self.assertEqual(first.get_counts("foo")["UPDATE"], 2)
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "slowlog",
+                    "--tables",
+                    "--file",
+                    os.path.join(DATA, "slow.log"),
+                ]
+            )
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("table\tselect\tinsert\t"))
+        self.assertEqual(lines[1].split("\t")[:3], ["orders", "1", "0"])
+        self.assertEqual(lines[1].split("\t")[8], "1.500000")
+        self.assertEqual(lines[0].split("\t")[-1], "class_count")
+        self.assertEqual(lines[1].split("\t")[-1], "1")
+
+        with redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+            main(["--query", "select 1", "--tables"])
+        self.assertIn("--tables cannot be combined with --query", stderr.getvalue())
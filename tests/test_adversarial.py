@@ -0,0 +1,72 @@
+import time
+import unittest
+
+import mysql_distill
+
+SIZE = 100_000
+
+# Inputs that made a pattern or loop quadratic in the size of the query
+ADVERSARIAL = {
+    "unterminated comments": "SELECT a FROM t WHERE " + "/*x " * (SIZE // 4),
+    "unterminated comments before a close": "SELECT " + "/*x " * (SIZE // 4) + "*/",
+    "comment markers before a quote": "SELECT 1 " + "-- " * (SIZE // 3) + "'",
+    "hash markers before a quote": "SELECT 1 " + "# " * (SIZE // 2) + '"',
+    "version comment without digits": "SHOW /*!5 a*/ " + "/* x */" * (SIZE // 7),
+    "unterminated version comments": "SHOW " + "/*!5 " * (SIZE // 5),
+    "repeated CREATE": "CREATE " * (SIZE // 7),
+    "repeated CREATE after TABLE": "CREATE TABLE t " + "CREATE " * (SIZE // 7),
+    "repeated JOIN lists": "SELECT * FROM a " + "JOIN b, " * (SIZE // 8),
+    "long table list": "SELECT * FROM " + "a b, " * (SIZE // 5) + "!",
+    "long qualified name": "SELECT * FROM " + "a." * (SIZE // 2) + "b",
+    "dashes in a line comment": "-- " + "-" * SIZE + "\n/*!40101 SET NAMES utf8 */",
+    "line comment markers": "-- " * (SIZE // 3) + "\n(",
+    "comments before a parenthesis": "/* a */" * (SIZE // 7) + "(",
+}
+
+# Inputs that made a pattern exponential in the size of the query
+EXPONENTIAL = {
+    "dashes in a line comment": "-- " + "-" * 30 + "\n/*!40101 SET NAMES utf8 */",
+    "line comment markers": "-- " * 18 + "\n(",
+    "comments before a parenthesis": "/* a */ " * 30 + "(",
+}
+
+
+class TestAdversarial(unittest.TestCase):
+    budget = 2.0  # Seconds; quadratic behavior takes minutes at this size
+
+    def test_linear_time(self):
+        for engine in mysql_distill.ENGINES:
+            for name, query in ADVERSARIAL.items():
+                start = time.perf_counter()
+                mysql_distill.distill(query, engine=engine)
+                self.assertLess(
+                    time.perf_counter() - start,
+                    self.budget,
+                    msg=f"{name} with the {engine} engine",
+                )
+
+    def test_exponential(self):
+        for engine in mysql_distill.ENGINES:
+            for name, query in EXPONENTIAL.items():
+                start = time.perf_counter()
+                mysql_distill.distill(query, engine=engine)
+                self.assertLess(
+                    time.perf_counter() - start,
+                    self.budget,
+                    msg=f"{name} with the {engine} engine",
+                )
+
+    def test_distill_bounded(self):
+        insert = "INSERT INTO t (a, b) VALUES " + "(1, 'x'), " * SIZE + "(2, 'y')"
+        self.assertEqual(
+            mysql_distill.distill_bounded(insert, max_length=1000), ("INSERT t", True)
+        )
+        self.assertEqual(
+            mysql_distill.distill_bounded("SELECT * FROM foo", max_length=1000),
+            ("SELECT foo", False),
+        )
+        self.assertEqual(
+            mysql_distill.distill_bounded("SELECT * FROM foo_table", max_length=20),
+            ("SELECT", True),
+            msg="Cuts at whitespace, not inside a table name",
+        )
@@ -0,0 +1,85 @@
+import io
+import os
+import random
+import unittest
+
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+import mysql_distill
+from mysql_distill import aggregate
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestAggregate(unittest.TestCase):
+    def test_latency_histogram(self):
+        rng = random.Random(42)
+        values = sorted(rng.lognormvariate(-4, 1.5) for _ in range(10000))
+        histogram = aggregate.LatencyHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.add(value)
+
+        for percent in (50, 95, 99):
+            exact = values[int(percent / 100 * (len(values) - 1))]
+            self.assertAlmostEqual(
+                histogram.percentile(percent) / exact, 1, delta=0.011
+            )
+        self.assertLess(len(histogram.buckets), 1500, msg="Bounded number of buckets")
+        self.assertIsNone(aggregate.LatencyHistogram().percentile(50))
+
+    def test_latency_histogram_merge(self):
+        first = aggregate.LatencyHistogram()
+        second = aggregate.LatencyHistogram()
+        both = aggregate.LatencyHistogram()
+        for value in range(1, 200):
+            (first if value % 2 else second).add(value / 1000)
+            both.add(value / 1000)
+        first.merge(second)
+        self.assertEqual(first.buckets, both.buckets)
+        self.assertEqual(first.percentile(99), both.percentile(99))
+        with self.assertRaises(ValueError):
+            first.merge(aggregate.LatencyHistogram(relative_accuracy=0.05))
+
+    def test_aggregator(self):
+        aggregator = mysql_distill.Aggregator()
+        for query_time in (0.5, 1.5, 1.0):
+            aggregator.add(
+                "select * from t where id = 1",
+                {"query_time": query_time, "lock_time": 0.001, "rows_examined": 10},
+            )
+        aggregator.add("update t set a = 1")
+
+        other = mysql_distill.Aggregator()
+        other.add("update t set a = 2", {"query_time": 2.0})
+        aggregator.merge(other)
+
+        [(select_class, select), (update_class, update)] = aggregator.most_common()
+        self.assertEqual(select_class, "SELECT t")
+        self.assertEqual(select.count, 3)
+        self.assertEqual(select.metrics["query_time"].sum, 3.0)
+        self.assertEqual(select.metrics["query_time"].min, 0.5)
+        self.assertEqual(select.metrics["rows_examined"].max, 10)
+        self.assertAlmostEqual(select.percentile(50), 1.0, delta=0.01)
+        self.assertEqual(select.percentile(100), 1.5)
+        self.assertEqual(update_class, "UPDATE t")
+        self.assertEqual(update.count, 2)
+        self.assertEqual(update.metrics["query_time"].max, 2.0)
+        self.assertNotIn("lock_time", update.metrics)
+
+    def test_cli_aggregate(self):
+        output = io.StringIO()
+        with open(os.path.join(DATA, "slow.log")) as log, mock.patch(
+            "sys.stdin", log
+        ), redirect_stdout(output):
+            main(["--input-format", "slowlog", "--aggregate"])
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("count\tquery_time_sum"))
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("1\t1.500000\t"))
+        self.assertTrue(lines[1].endswith("\tSELECT orders"))
+
+        with redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+            main(["--query", "select 1", "--aggregate"])
+        self.assertIn("--aggregate cannot be combined with --query", stderr.getvalue())
@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+from mysql_distill import aio, slowlog
+
+
+async def _queries(count, produced=None):
+    for i in range(count):
+        if produced is not None:
+            produced.append(i)
+        yield f"select * from t{i % 3}_x"
+        await asyncio.sleep(0)
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+    async def test_distill_async(self):
+        results = [
+            result async for result in aio.distill_async(_queries(1000), batch_size=10)
+        ]
+        self.assertEqual(
+            results,
+            [(f"select * from t{i % 3}_x", "SELECT t?_x") for i in range(1000)],
+            msg="Keeps source order",
+        )
+
+    async def test_records(self):
+        async def records():
+            for record in slowlog.parse_slow_log(
+                ["# Query_time: 1.5\n", "update t set a = 1;\n"]
+            ):
+                yield record
+
+        [(record, distilled)] = [
+            result async for result in aio.distill_async(records())
+        ]
+        self.assertEqual(record.attributes["query_time"], 1.5)
+        self.assertEqual(distilled, "UPDATE t")
+
+    async def test_process_executor(self):
+        with ProcessPoolExecutor(2) as executor:
+            results = [
+                distilled
+                async for _query, distilled in aio.distill_async(
+                    _queries(100), executor, max_length=10
+                )
+            ]
+        self.assertEqual(results, ["SELECT"] * 100)
+
+    async def test_backpressure(self):
+        produced = []
+        results = aio.distill_async(
+            _queries(100_000, produced), concurrency=2, batch_size=8, queue_size=16
+        )
+        await results.__anext__()
+        for _ in range(100):
+            await asyncio.sleep(0)
+        self.assertLessEqual(
+            len(produced), 16 + 2 * 8 + 2, msg="Stops reading a stalled consumer"
+        )
+        await results.aclose()
+
+    async def test_source_error(self):
+        async def failing():
+            yield "select 1 from a"
+            raise RuntimeError("lost connection")
+
+        results = []
+        with self.assertRaises(RuntimeError):
+            async for _query, distilled in aio.distill_async(failing()):
+                results.append(distilled)
+        self.assertEqual(results, ["SELECT a"])
+
+        with self.assertRaises(ValueError):
+            await aio.distill_async(_queries(1), batch_size=0).__anext__()
@@ -0,0 +1,82 @@
+import unittest
+
+import mysql_distill
+
+
+class TestCache(unittest.TestCase):
+    def tearDown(self):
+        mysql_distill.disable_cache()
+
+    def test_distill_cache(self):
+        self.assertEqual(mysql_distill.cache_info(), {}, msg="Disabled by default")
+
+        mysql_distill.enable_cache(maxsize=2)
+        self.assertEqual(mysql_distill.distill("select * from foo"), "SELECT foo")
+        self.assertEqual(mysql_distill.distill("select * from foo"), "SELECT foo")
+        self.assertEqual(mysql_distill.distill("delete from bar"), "DELETE bar")
+        self.assertEqual(mysql_distill.distill("update baz set a=1"), "UPDATE baz")
+
+        info = mysql_distill.cache_info()["distill"]
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.evictions, 1)
+        self.assertEqual(info.currsize, 2)
+
+        mysql_distill.cache_clear()
+        info = mysql_distill.cache_info()["distill"]
+        self.assertEqual((info.hits, info.misses, info.currsize), (0, 0, 0))
+
+    def test_get_tables_cache(self):
+        mysql_distill.enable_cache()
+        tables = mysql_distill.get_tables("select * from foo join bar")
+        tables.append("mutated")
+        self.assertEqual(
+            mysql_distill.get_tables("select * from foo join bar"),
+            ["foo", "bar"],
+            msg="Callers cannot mutate cached results",
+        )
+        self.assertEqual(mysql_distill.cache_info()["get_tables"].hits, 1)
+
+    def test_maxbytes(self):
+        lru = mysql_distill.LRUCache(maxsize=None, maxbytes=500)
+        for i in range(20):
+            lru.lookup(f"select * from t{i}", None, mysql_distill.distill)
+        info = lru.cache_info()
+        self.assertLessEqual(info.currbytes, 500)
+        self.assertGreater(info.evictions, 0)
+        self.assertEqual(info.currsize + info.evictions, 20)
+
+    def test_normalize(self):
+        self.assertEqual(
+            mysql_distill.normalize_whitespace("select  *\tfrom foo \n -- c\n  x"),
+            "select * from foo\n-- c\nx",
+            msg="Collapses whitespace but keeps line breaks",
+        )
+
+        mysql_distill.enable_cache(normalize=mysql_distill.normalize_whitespace)
+        mysql_distill.distill("select * from foo")
+        mysql_distill.distill("select   *  from\tfoo")
+        self.assertEqual(
+            mysql_distill.distill("select \n--bar\n from foo"), "SELECT foo"
+        )
+        info = mysql_distill.cache_info()["distill"]
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+        self.assertEqual(
+            mysql_distill.normalize_whitespace(
+                "select  'a  b',\t`c\t d` -- x  'y\n  from  \"e  f\""
+            ),
+            "select 'a  b', `c\t d` -- x  'y\nfrom \"e  f\"",
+            msg="Keeps whitespace in strings, identifiers and comments",
+        )
+        self.assertEqual(mysql_distill.get_tables("select * from `a  b`"), ["`a  b`"])
+        self.assertEqual(mysql_distill.get_tables("select * from `a b`"), ["`a b`"])
+
+    def test_engine_change_clears_cache(self):
+        mysql_distill.enable_cache()
+        mysql_distill.distill("select * from foo")
+        mysql_distill.set_engine(mysql_distill.ENGINE_LEXER)
+        try:
+            self.assertEqual(mysql_distill.cache_info()["distill"].currsize, 0)
+        finally:
+            mysql_distill.set_engine(mysql_distill.ENGINE_REGEX)
@@ -0,0 +1,129 @@
+import io
+import os
+import unittest
+
+from contextlib import redirect_stdout
+
+import mysql_distill
+
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestExports(unittest.TestCase):
+    def test_read_csv_export(self):
+        with open(os.path.join(DATA, "events_statements.csv"), newline="") as export:
+            records = list(
+                mysql_distill.read_csv_export(
+                    export,
+                    fields={
+                        "timer_wait": "query_time",
+                        "LOCK_TIME": "lock_time",
+                        "ROWS_EXAMINED": "rows_examined",
+                        "CURRENT_SCHEMA": "db",
+                    },
+                    time_unit=1e-12,
+                )
+            )
+
+        self.assertEqual(
+            [record.query for record in records],
+            [
+                "SELECT * FROM orders WHERE id = 1",
+                "INSERT INTO items (a, b)\nVALUES (1, 'x,\"y\"')",
+                "select count(*) from hits",
+            ],
+            msg="Finds SQL_TEXT and skips NULL queries",
+        )
+        self.assertEqual(records[0].attributes["db"], "shop")
+        self.assertEqual(records[0].attributes["rows_examined"], 1)
+        self.assertAlmostEqual(records[0].attributes["query_time"], 0.0025)
+        self.assertAlmostEqual(records[0].attributes["lock_time"], 1e-6)
+
+        with self.assertRaises(ValueError):
+            list(mysql_distill.read_csv_export(["a,b\n"]))
+        with self.assertRaises(ValueError):
+            list(mysql_distill.read_csv_export(["sql_text\n"], "query"))
+        self.assertEqual(
+            [
+                (record.query, record.attributes)
+                for record in mysql_distill.read_csv_export(
+                    ["n;q\n", "1;select 1\n", "2\n"], "q", {"n": "n"}, delimiter=";"
+                )
+            ],
+            [("select 1", {"n": 1})],
+        )
+
+    def test_read_jsonl_export(self):
+        with open(os.path.join(DATA, "audit.jsonl")) as export:
+            records = list(
+                mysql_distill.read_jsonl_export(
+                    export,
+                    fields={"connection_id": "id", "account.user": "user"},
+                    batch_size=2,
+                )
+            )
+
+        self.assertEqual(
+            [(record.query, record.attributes) for record in records],
+            [
+                ("SELECT * FROM orders WHERE id = 1", {"id": 42, "user": "app"}),
+                ("update orders set paid = 1", {"id": 42, "user": "app"}),
+            ],
+            msg="Finds general_data.query and skips invalid lines",
+        )
+
+        lines = ['{"sql_text": "select %d", "timer_wait": 1e9}\n' % i for i in range(5)]
+        self.assertEqual(
+            [
+                (record.query, record.attributes)
+                for record in mysql_distill.read_jsonl_export(
+                    lines,
+                    "sql_text",
+                    {"timer_wait": "query_time"},
+                    time_unit=1e-12,
+                    batch_size=2,
+                )
+            ],
+            [(f"select {i}", {"query_time": 0.001}) for i in range(5)],
+        )
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "csv",
+                    "--field",
+                    "TIMER_WAIT=query_time",
+                    "--field",
+                    "ROWS_EXAMINED",
+                    "--time-unit",
+                    "ps",
+                    "--aggregate",
+                    "--file",
+                    os.path.join(DATA, "events_statements.csv"),
+                ]
+            )
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("1\t0.015000\t"))
+        self.assertTrue(lines[1].endswith("\t1000\tSELECT hits"))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "jsonl",
+                    "--query-field",
+                    "general_data.query",
+                    "--file",
+                    os.path.join(DATA, "audit.jsonl"),
+                ]
+            )
+        self.assertEqual(
+            output.getvalue().splitlines(), ["SELECT orders", "UPDATE orders"]
+        )
@@ -0,0 +1,96 @@
+import io
+import os
+import unittest
+
+from contextlib import redirect_stdout
+
+import mysql_distill
+
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestGeneralLog(unittest.TestCase):
+    def test_parse_general_log(self):
+        with open(os.path.join(DATA, "general.log")) as log:
+            records = list(mysql_distill.parse_general_log(log))
+
+        self.assertEqual(
+            [(record.connection_id, record.db, record.query) for record in records],
+            [
+                (42, "shop", "SELECT *\n  FROM orders\n WHERE id = 1"),
+                (42, "archive", "insert into items (a, b) values (1, 'x;y')"),
+                (43, None, "use `stats`"),
+                (43, "stats", "select count(*) from hits"),
+                (42, None, "update orders set paid = 1"),
+                (43, None, "select 1"),
+            ],
+            msg="Tracks the database per connection until Quit or a restart",
+        )
+        self.assertEqual(
+            records[0].attributes,
+            {
+                "id": 42,
+                "command": "Query",
+                "time": "2023-05-01T10:00:00.124000Z",
+                "db": "shop",
+                "user": "app",
+                "host": "10.0.0.1",
+            },
+        )
+        self.assertEqual(records[3].user, "report")
+        self.assertIsNone(records[5].user)
+        self.assertEqual(
+            [mysql_distill.distill(record.query) for record in records],
+            [
+                "SELECT orders",
+                "INSERT items",
+                "USE",
+                "SELECT hits",
+                "UPDATE orders",
+                "SELECT",
+            ],
+        )
+
+    def test_commands(self):
+        with open(os.path.join(DATA, "general.log")) as log:
+            records = list(mysql_distill.parse_general_log(log, commands=None))
+        self.assertEqual(
+            [record.command for record in records[:5]],
+            ["Connect", "Query", "Connect", "Init DB", "Query"],
+        )
+        self.assertEqual(records[0].query, "app@10.0.0.1 on shop using TCP/IP")
+        self.assertEqual(records[3].query, "archive")
+        self.assertEqual(records[3].db, "shop", msg="The database before the command")
+
+    def test_old_format(self):
+        log = io.StringIO(
+            "230501 10:00:00\t    7 Connect\tapp@localhost on shop\n"
+            "\t\t    7 Query\tselect a\n"
+            "2\tfrom t\n"
+            "230501 10:00:01\t    7 Query\tUSE other\n"
+            "\t\t    7 Quit\t\n"
+        )
+        first, second = mysql_distill.parse_general_log(log)
+        self.assertEqual(first.query, "select a\n2\tfrom t")
+        self.assertEqual(first.time, "230501 10:00:00", msg="Same second")
+        self.assertEqual(first.db, "shop")
+        self.assertEqual(second.query, "USE other")
+        self.assertEqual(second.time, "230501 10:00:01")
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["--input-format", "generallog", "--file", f"{DATA}/general.log"])
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "SELECT orders",
+                "INSERT items",
+                "USE",
+                "SELECT hits",
+                "UPDATE orders",
+                "SELECT",
+            ],
+        )
@@ -0,0 +1,58 @@
+import unittest
+
+import mysql_distill
+
+
+class TestInterning(unittest.TestCase):
+    def tearDown(self):
+        mysql_distill.disable_interning()
+        mysql_distill.disable_cache()
+
+    def test_distill(self):
+        self.assertIsNone(mysql_distill.intern_info(), msg="Disabled by default")
+
+        # Build the queries at runtime so their parts are distinct objects
+        queries = [f"select * from {name} join bar" for name in ("foo", "foo")]
+        first, second = map(mysql_distill.distill_result, queries)
+        self.assertIsNot(first.canonical, second.canonical)
+
+        mysql_distill.enable_interning()
+        first, second = map(mysql_distill.distill_result, queries)
+        self.assertIs(first.canonical, second.canonical)
+        self.assertIs(first.tables, second.tables)
+        self.assertIs(first.verbs[0], second.verbs[0])
+        self.assertIs(
+            mysql_distill.distill(queries[0]), mysql_distill.distill(queries[1])
+        )
+        self.assertIs(
+            mysql_distill.get_tables(queries[0])[0],
+            mysql_distill.get_tables(queries[1])[0],
+        )
+
+        info = mysql_distill.intern_info()
+        self.assertGreater(info.hits, 0)
+        self.assertEqual(info.maxsize, None)
+
+        mysql_distill.intern_clear()
+        info = mysql_distill.intern_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (0, 0, 0))
+
+    def test_cache(self):
+        mysql_distill.enable_cache()
+        query = "select * from foo"
+        before = mysql_distill.distill_result(query)
+        mysql_distill.enable_interning()
+        after = mysql_distill.distill_result(query)
+        self.assertIsNot(before.canonical, after.canonical, msg="Clears the cache")
+        self.assertIs(
+            after.canonical, mysql_distill.distill_result("SELECT * FROM foo").canonical
+        )
+
+    def test_maxsize(self):
+        table = mysql_distill.enable_interning(maxsize=3)
+        for i in range(10):
+            mysql_distill.distill(f"select * from t_{i}")
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.intern_info().currsize, 3)
+        with self.assertRaises(ValueError):
+            mysql_distill.InternTable(maxsize=0)
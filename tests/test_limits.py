@@ -0,0 +1,138 @@
+import time
+import unittest
+
+import mysql_distill
+from mysql_distill import limits
+
+ROWS = 200_000
+
+
+class TestLimits(unittest.TestCase):
+    def tearDown(self):
+        limits.set_scan_window(None)
+
+    def test_trim_values(self):
+        self.assertEqual(
+            limits.trim_values("INSERT INTO t (a) VALUES (1), (2)"),
+            "INSERT INTO t (a) VALUES ",
+        )
+        self.assertEqual(
+            limits.trim_values("replace into t value(1)"), "replace into t value"
+        )
+        self.assertEqual(
+            limits.trim_values(
+                "INSERT INTO t VALUES (1) ON DUPLICATE KEY UPDATE a = VALUES(a)"
+            ),
+            "INSERT INTO t VALUES  ON DUPLICATE KEY UPDATE a = VALUES(a)",
+        )
+        self.assertEqual(
+            limits.trim_values("INSERT INTO t VALUES (1) AS n ON DUPLICATE KEY UPDATE"),
+            "INSERT INTO t VALUES  ON DUPLICATE KEY UPDATE",
+        )
+        self.assertEqual(
+            limits.trim_values(
+                "INSERT INTO t VALUES (1, 'it''s'), (-1.5e3, NULL), "
+                "(_utf8mb4'\\'(', 0xFF, \"q\"), (x'00', DEFAULT);"
+            ),
+            "INSERT INTO t VALUES ",
+            msg="Rows of literals of any kind are cut",
+        )
+        self.assertEqual(
+            limits.trim_values(
+                "INSERT INTO t VALUES (1, 'a')"
+                " ON DUPLICATE KEY UPDATE a = 'b', " + "c = 'd', " * 1000 + "e = 1"
+            ),
+            "INSERT INTO t VALUES  ON DUPLICATE KEY UPDATE a = 'b', "
+            + "c = 'd', " * 1000
+            + "e = 1",
+            msg="The clause is kept however long it is",
+        )
+        for query in (
+            "INSERT INTO t SELECT * FROM u",
+            "INSERT INTO log (msg) SELECT 'insert values(1)' FROM src JOIN other",
+            "INSERT INTO t /* VALUES (1) */ SELECT a FROM u",
+            "INSERT INTO t (a, b) VALUES (1, (SELECT x FROM other))",
+            "INSERT INTO t VALUES (1, 'x'), (NOW(), 'y')",
+            "INSERT INTO t VALUES (1, 'x'); DELETE FROM u",
+            "INSERT INTO t VALUES (1, 'x",
+            "SELECT * FROM t WHERE a IN (SELECT b FROM u) AND VALUES (1)",
+            "UPDATE t SET a = 1",
+        ):
+            self.assertEqual(limits.trim_values(query), query)
+
+    def test_trim_values_bytes(self):
+        self.assertEqual(
+            limits.trim_values(b"INSERT t VALUES ('\xff') ON DUPLICATE KEY UPDATE"),
+            b"INSERT t VALUES  ON DUPLICATE KEY UPDATE",
+        )
+        self.assertEqual(
+            limits.trim_values(b"INSERT t VALUES (1, (SELECT a FROM u))"),
+            b"INSERT t VALUES (1, (SELECT a FROM u))",
+        )
+        trimmed = limits.trim_values(memoryview(b"REPLACE t VALUES (1)"))
+        self.assertIsInstance(trimmed, memoryview)
+        self.assertEqual(trimmed, b"REPLACE t VALUES ")
+        self.assertEqual(limits.truncate_query(memoryview(b"SELECT a_b"), 8), b"SELECT")
+
+    def test_bulk_insert(self):
+        rows = ", ".join(f"({i}, 'x; SELECT * FROM u')" for i in range(ROWS))
+        insert = f"INSERT INTO db.t (a, b) VALUES {rows}"
+        upsert = f"{insert} ON DUPLICATE KEY UPDATE b = VALUES(b)"
+        for engine in mysql_distill.ENGINES:
+            for query, distilled in (
+                (insert, "INSERT db.t"),
+                (upsert, "INSERT UPDATE db.t"),
+            ):
+                mysql_distill.cache_clear()
+                start = time.perf_counter()
+                self.assertEqual(
+                    mysql_distill.distill(query, engine=engine), distilled, msg=engine
+                )
+                self.assertEqual(
+                    mysql_distill.get_tables(query, engine=engine), ["db.t"]
+                )
+                # The rows are matched once, without trimming it takes seconds
+                self.assertLess(time.perf_counter() - start, 0.5, msg=engine)
+
+    def test_rows_with_words(self):
+        # Verbs and tables in strings, subqueries and long clauses are kept
+        long_clause = (
+            " ON DUPLICATE KEY UPDATE " + "a = 1, " * 1000 + "b = (SELECT c FROM u)"
+        )
+        for query, distilled in (
+            (
+                "INSERT INTO log (msg) SELECT 'insert values(1)' FROM src JOIN other",
+                "INSERT SELECT INSERT log src other",
+            ),
+            (
+                "INSERT INTO t (a, b) VALUES (1, (SELECT x FROM other))",
+                "INSERT SELECT t other",
+            ),
+            (
+                "INSERT INTO t (a) VALUES (1), (2)" + long_clause,
+                "INSERT UPDATE SELECT t u",
+            ),
+        ):
+            self.assertEqual(mysql_distill.distill(query), distilled)
+
+    def test_scan_window(self):
+        query = "SELECT * FROM foo WHERE a IN (SELECT b FROM bar)"
+        self.assertEqual(mysql_distill.distill(query), "SELECT foo bar")
+
+        limits.set_scan_window(20)
+        self.assertEqual(limits.get_scan_window(), 20)
+        self.assertEqual(mysql_distill.distill(query), "SELECT foo")
+        self.assertEqual(mysql_distill.get_tables(query), ["foo"])
+
+        limits.set_scan_window(None)
+        self.assertEqual(mysql_distill.distill(query), "SELECT foo bar")
+
+        with self.assertRaises(ValueError):
+            limits.set_scan_window(0)
+
+    def test_truncate_query(self):
+        self.assertEqual(limits.truncate_query("SELECT 1", 20), "SELECT 1")
+        self.assertEqual(
+            limits.truncate_query("SELECT * FROM foo_table", 20), "SELECT * FROM"
+        )
+        self.assertEqual(limits.truncate_query("SELECT_FOO", 6), "SELECT")
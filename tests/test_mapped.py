@@ -0,0 +1,142 @@
+import io
+import os
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout
+from unittest import mock
+
+from mysql_distill import mapped, parallel
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestMapped(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def test_line_spans(self):
+        for line in (
+            "  select * from a; select 1",
+            "select * from a ;  ",
+            "select * from a\r",
+            "(select 1)",
+            "\x1c select 1",
+            "\u00e9t\u00e9 select",
+            "\u00a0select 1",
+            "select 1\u00a0",
+            "select 'caf\u00e9'",
+            "\u00ab select 1",
+            "# select 1",
+            "; select 1",
+            " \t",
+            "",
+        ):
+            data = line.encode()
+            query = parallel.prepare_line(line)
+            self.assertEqual(
+                [data[start:stop].decode() for start, stop in mapped.line_spans(data)],
+                [] if query is None else [query],
+                msg=f"Files and stdin split {line!r} alike",
+            )
+
+    def test_file_ranges(self):
+        script = b"".join(b"select * from t%d;\n" % i for i in range(100))
+        path = self.write("script.sql", script)
+        with mapped.map_file(path) as buffer:
+            ranges = list(mapped.file_ranges(path, buffer, chunk_size=200))
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[0][1], 0)
+        self.assertEqual(ranges[-1][2], len(script))
+        for (_, _, end, _), (_, start, _, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(script[end - 2 : end], b";\n")
+        self.assertEqual(
+            "".join(mapped.distill_range(file_range) for file_range in ranges),
+            "SELECT t?\n" * 100,
+        )
+
+    def test_ranges_not_between_statements(self):
+        script = (
+            b"select 'a;\nb' from t1;\n"
+            b"DELIMITER //\n"
+            b"create procedure p() begin select 1 from t2;\n end//\n"
+            b"select * from t3;\n//\n"
+            b"DELIMITER ;\n"
+            b"/* c;\n*/ update t4 set a = 1;\n"
+        ) * 20
+        path = self.write("script.sql", script)
+        expected = "".join(mapped.distill_files([path]))
+        self.assertEqual(expected.count("\n"), 80)
+        for chunk_size in (1, 8, 30, 100):
+            self.assertEqual(
+                "".join(mapped.distill_files([path], jobs=2, chunk_size=chunk_size)),
+                expected,
+                msg=chunk_size,
+            )
+
+    def test_distill_files(self):
+        paths = [
+            self.write("a.sql", b"select 1 from a;\ninsert into b values ('\xff');\n"),
+            self.write("empty.sql", b""),
+            self.write("c.sql", b"update c set x = 1"),
+        ]
+        expected = "SELECT a\nINSERT b\nUPDATE c\n"
+        self.assertEqual("".join(mapped.distill_files(paths)), expected)
+        self.assertEqual(
+            "".join(mapped.distill_files(paths, jobs=2, chunk_size=4)), expected
+        )
+
+        path = self.write("lines.txt", b"# x\nselect * from a; b\n  delete from c\n")
+        self.assertEqual(
+            "".join(mapped.distill_files([path], statements=False)),
+            "SELECT a\nDELETE c\n",
+        )
+
+    def test_cli_file(self):
+        path = self.write("a.sql", b"select 1 from a;\n")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["--file", path, "--file", path])
+        self.assertEqual(output.getvalue(), "SELECT a\nSELECT a\n")
+
+        script = b"/*!40101 SET NAMES utf8 */;\nALTER TABLE a ADD COLUMN b INT;\n"
+        path = self.write("dump.sql", script)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["--input-format", "statements", "--file", path])
+        stdin_output = io.StringIO()
+        with redirect_stdout(stdin_output), mock.patch(
+            "sys.stdin", io.StringIO(script.decode())
+        ):
+            main(["--input-format", "statements"])
+        self.assertEqual(
+            output.getvalue(),
+            stdin_output.getvalue(),
+            msg="Files and stdin are distilled with the same engine",
+        )
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "slowlog",
+                    "--aggregate",
+                    "--file",
+                    os.path.join(DATA, "slow.log"),
+                ]
+            )
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith("\tSELECT orders"))
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import os
+import unittest
+
+from contextlib import redirect_stdout
+from unittest import mock
+
+import mysql_distill
+
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+query = "SELECT a FROM foo JOIN bar USING (id)\nWHERE b = 'x\ty'"
+
+
+def write(output_format: str, **kwargs) -> str:
+    stream = io.StringIO()
+    with mysql_distill.RecordWriter(stream, output_format, **kwargs) as writer:
+        distilled, fingerprint = mysql_distill.distill_record(
+            query, fingerprint=kwargs.get("fingerprint", False)
+        )
+        writer.write(query, distilled, {"query_time": 1.5, "db": "shop"}, fingerprint)
+        writer.write("select 1", mysql_distill.distill_result("select 1"))
+    return stream.getvalue()
+
+
+class TestOutput(unittest.TestCase):
+    def test_text(self):
+        self.assertEqual(write("text"), "SELECT foo bar\nSELECT\n")
+
+    def test_tsv(self):
+        self.assertEqual(
+            write("tsv").splitlines(),
+            [
+                "class\tkind\tverbs\ttables\tquery_time\tdb\tquery",
+                "SELECT foo bar\tDML\tSELECT\tfoo,bar\t1.5\tshop\t"
+                "SELECT a FROM foo JOIN bar USING (id)\\nWHERE b = 'x\\ty'",
+                "SELECT\tDML\tSELECT\t\t\t\tselect 1",
+            ],
+        )
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(write("csv", fingerprint=True))))
+        self.assertEqual(
+            rows[0],
+            [
+                "class",
+                "kind",
+                "verbs",
+                "tables",
+                "fingerprint",
+                "checksum",
+                "query_time",
+                "db",
+                "query",
+            ],
+        )
+        self.assertEqual(rows[1][:4], ["SELECT foo bar", "DML", "SELECT", "foo,bar"])
+        self.assertEqual(
+            rows[1][4], "select a from foo join bar using (id) where b = ?"
+        )
+        self.assertEqual(rows[1][6:], ["1.5", "shop", query])
+        self.assertEqual(rows[2][4:8], ["", "", "", ""])
+
+        rows = list(csv.reader(io.StringIO(write("csv", attributes=["db", "id"]))))
+        self.assertEqual(rows[0][4:], ["db", "id", "query"])
+        self.assertEqual(rows[1][4:6], ["shop", ""])
+
+        stream = io.StringIO()
+        mysql_distill.RecordWriter(stream, "csv").close()
+        self.assertEqual(stream.getvalue(), "class,kind,verbs,tables,query\n")
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in write("jsonl").splitlines()]
+        self.assertEqual(
+            records[0],
+            {
+                "class": "SELECT foo bar",
+                "kind": "DML",
+                "verbs": ["SELECT"],
+                "tables": ["foo", "bar"],
+                "attributes": {"query_time": 1.5, "db": "shop"},
+                "query": query,
+            },
+        )
+        self.assertEqual(records[1]["attributes"], {})
+
+        records = [
+            json.loads(line)
+            for line in write("jsonl", attributes=["db"], fingerprint=True).splitlines()
+        ]
+        self.assertEqual(records[0]["attributes"], {"db": "shop"})
+        self.assertEqual(len(records[0]["checksum"]), 16)
+        self.assertIsNone(records[1]["fingerprint"])
+
+    def test_distill_record(self):
+        query = "insert into log select * from src where x = 'a; insert into other'"
+        distilled, fingerprint = mysql_distill.distill_record(query, fingerprint=True)
+        self.assertEqual(
+            distilled.canonical,
+            mysql_distill.distill(query),
+            msg="Fingerprinting does not change the engine",
+        )
+        self.assertEqual(fingerprint, mysql_distill.fingerprint(query))
+        self.assertEqual(
+            (distilled.fingerprint, distilled.checksum),
+            tuple(fingerprint),
+        )
+        self.assertEqual(
+            mysql_distill.distill_record(query)[0],
+            mysql_distill.distill_result(query),
+        )
+
+    def test_buffering(self):
+        stream = io.StringIO()
+        distilled = mysql_distill.distill_result("select 1")
+        with mock.patch.object(stream, "write", wraps=stream.write) as stream_write:
+            with mysql_distill.RecordWriter(stream, "jsonl") as writer:
+                for _ in range(1000):
+                    writer.write("select 1", distilled, {"id": 1})
+            self.assertEqual(stream_write.call_count, 1)
+
+            writer = mysql_distill.RecordWriter(stream, "text", buffer_size=0)
+            writer.write("select 1", distilled)
+            self.assertEqual(stream_write.call_count, 2, msg="Unbuffered")
+        self.assertEqual(len(stream.getvalue().splitlines()), 1001)
+
+        with self.assertRaises(ValueError):
+            mysql_distill.RecordWriter(stream, "xml")
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "slowlog",
+                    "--output-format",
+                    "jsonl",
+                    "--fingerprint",
+                    "--attribute",
+                    "query_time",
+                    "--max-query-length",
+                    "1000",
+                    "--file",
+                    os.path.join(DATA, "slow.log"),
+                ]
+            )
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(records[0]["class"], "SELECT orders")
+        self.assertEqual(records[0]["attributes"], {"query_time": 1.5})
+        self.assertEqual(records[0]["fingerprint"], "select * from orders where id = ?")
+
+        output = io.StringIO()
+        with redirect_stdout(output), mock.patch(
+            "sys.stdin", io.StringIO("select * from foo;\nupdate bar set a = 1;\n")
+        ):
+            main(["--output-format", "tsv"])
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "class\tkind\tverbs\ttables\tquery",
+                "SELECT foo\tDML\tSELECT\tfoo\tselect * from foo",
+                "UPDATE bar\tDML\tUPDATE\tbar\tupdate bar set a = 1",
+            ],
+        )
@@ -0,0 +1,71 @@
+import io
+import unittest
+
+from contextlib import redirect_stderr
+
+from mysql_distill import parallel
+from mysql_distill.__main__ import main
+
+
+class TestParallel(unittest.TestCase):
+    def test_prepare_line(self):
+        self.assertEqual(
+            parallel.prepare_line("  select * from foo; select 1\n"),
+            "select * from foo",
+        )
+        self.assertIsNone(parallel.prepare_line("# Time: 2023-01-01\n"))
+        self.assertIsNone(parallel.prepare_line("\n"))
+
+    def test_read_blocks(self):
+        self.assertEqual(
+            list(parallel.read_blocks(io.StringIO("abc\ndef\nghi"), chunk_size=5)),
+            ["abc", "def", "ghi"],
+            msg="Blocks end at line boundaries",
+        )
+        self.assertEqual(
+            list(parallel.read_blocks(io.StringIO("a\nb\nc\n"), chunk_size=1 << 10)),
+            ["a\nb\nc"],
+        )
+        self.assertEqual(
+            list(
+                parallel.read_blocks(io.StringIO("x" * 20 + "\nab\ncd"), chunk_size=3)
+            ),
+            ["x" * 20, "ab", "cd"],
+            msg="A line longer than a chunk is read whole",
+        )
+
+    def test_distill_parallel(self):
+        lines = [f"select * from t{i % 7}_x\n" for i in range(500)]
+        expected = "".join(parallel.distill_block("".join(lines)))
+
+        ordered = "".join(
+            parallel.distill_parallel(io.StringIO("".join(lines)), 2, chunk_size=64)
+        )
+        self.assertEqual(ordered, expected, msg="Keeps input order")
+
+        unordered = "".join(
+            parallel.distill_parallel(
+                io.StringIO("".join(lines)), 2, ordered=False, chunk_size=64
+            )
+        )
+        self.assertEqual(
+            sorted(unordered.splitlines()),
+            sorted(expected.splitlines()),
+            msg="Unordered output has the same lines",
+        )
+
+    def test_distill_parallel_statements(self):
+        script = "".join(f"select *\n  from t{i % 7}_x;\n" for i in range(200))
+        self.assertEqual(
+            "".join(
+                parallel.distill_parallel(
+                    io.StringIO(script), 2, chunk_size=64, statements=True
+                )
+            ),
+            "SELECT t?_x\n" * 200,
+        )
+
+    def test_cli_unordered(self):
+        with redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+            main(["--query", "select 1", "--unordered"])
+        self.assertIn("--unordered requires --jobs", stderr.getvalue())
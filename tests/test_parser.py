@@ -787,3 +787,27 @@ class TestQueryParser(unittest.TestCase):
             ["db.tbl"],
             "LOAD DATA db.tbl",
         )
+
+    def test_get_tables_bytes(self):
+        self.assertEqual(
+            mysql_distill.get_tables_bytes(
+                b"SELECT * FROM a JOIN `db`.`b` WHERE c = '\xff'"
+            ),
+            ["a", "`db`.`b`"],
+        )
+        self.assertEqual(
+            mysql_distill.get_tables_bytes(bytearray(b"UPDATE t\xc3\xa9 SET a = 1")),
+            ["t\xe9"],
+        )
+
+
+class TestQueryParserLexer(TestQueryParser):
+    """
+    The same cases, run against the single-pass tokenizer engine.
+    """
+
+    def setUp(self):
+        mysql_distill.set_engine(mysql_distill.ENGINE_LEXER)
+
+    def tearDown(self):
+        mysql_distill.set_engine(mysql_distill.ENGINE_REGEX)
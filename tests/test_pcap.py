@@ -0,0 +1,333 @@
+import io
+import os
+import struct
+import unittest
+import zlib
+
+from contextlib import redirect_stdout
+from typing import List, Optional
+
+import mysql_distill
+
+from mysql_distill import pcap
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+CLIENT_CAPABILITIES = 0x000FA68D  # protocol 41, secure connection, plugin auth
+SERVER_CAPABILITIES = 0xFFFFF7FF  # everything but SSL
+
+
+class Capture:
+    """
+    Writes a classic pcap of one client talking to one server over Ethernet
+    """
+
+    def __init__(self, client_port: int = 50000, server_port: int = 3306):
+        self.frames: List[bytes] = [
+            struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+        ]
+        self.client_port = client_port
+        self.server_port = server_port
+        self.client_seq = 1000
+        self.server_seq = 5000
+        self.time = 1682935200.0
+
+    def segment(
+        self,
+        from_client: bool,
+        payload: bytes = b"",
+        flags: int = 0x18,
+        seq: Optional[int] = None,
+        delay: float = 0.001,
+        snap: Optional[int] = None,
+    ) -> None:
+        self.time += delay
+        if from_client:
+            ports = (self.client_port, self.server_port)
+            addresses = (bytes([10, 0, 0, 2]), bytes([10, 0, 0, 1]))
+            default_seq = self.client_seq
+        else:
+            ports = (self.server_port, self.client_port)
+            addresses = (bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2]))
+            default_seq = self.server_seq
+        if seq is None:
+            seq = default_seq
+            advance = len(payload) + (1 if flags & 0x03 else 0)
+            if from_client:
+                self.client_seq += advance
+            else:
+                self.server_seq += advance
+        tcp = struct.pack("!HHIIBBHHH", *ports, seq, 0, 5 << 4, flags, 65535, 0, 0)
+        ip = struct.pack(
+            "!BBHHHBBH4s4s",
+            0x45,
+            0,
+            20 + len(tcp) + len(payload),
+            0,
+            0x4000,
+            64,
+            6,
+            0,
+            *addresses,
+        )
+        frame = b"\x00" * 12 + b"\x08\x00" + ip + tcp + payload
+        captured = frame[:snap] if snap is not None else frame
+        seconds = int(self.time)
+        micros = round((self.time - seconds) * 1e6)
+        self.frames.append(
+            struct.pack("<IIII", seconds, micros, len(captured), len(frame)) + captured
+        )
+
+    def client(self, data: bytes, **kwargs) -> None:
+        self.segment(True, data, **kwargs)
+
+    def server(self, data: bytes, **kwargs) -> None:
+        self.segment(False, data, **kwargs)
+
+    def connect(
+        self,
+        capabilities: int = CLIENT_CAPABILITIES,
+        user: bytes = b"app",
+        db: Optional[bytes] = None,
+        thread_id: int = 42,
+    ) -> None:
+        self.segment(True, flags=0x02)
+        self.segment(False, flags=0x12)
+        greeting = (
+            b"\x0a8.0.32\x00"
+            + struct.pack("<I", thread_id)
+            + b"abcdefgh\x00"
+            + struct.pack("<HBHH", SERVER_CAPABILITIES & 0xFFFF, 255, 2, 0xFFFF)
+            + b"\x15"
+            + b"\x00" * 10
+            + b"ijklmnopqrst\x00caching_sha2_password\x00"
+        )
+        self.server(packet(0, greeting))
+        if db is not None:
+            capabilities |= 0x08
+        response = (
+            struct.pack("<IIB", capabilities, 1 << 24, 255)
+            + b"\x00" * 23
+            + user
+            + b"\x00\x20"
+            + b"x" * 32
+            + (db + b"\x00" if db is not None else b"")
+            + b"caching_sha2_password\x00"
+        )
+        self.client(packet(1, response))
+        if capabilities & 0x800:
+            return
+        self.server(packet(2, b"\x01\x03"))
+        self.server(packet(3, b"\x00\x00\x00\x02\x00\x00\x00"))
+
+    def close(self) -> None:
+        self.segment(True, flags=0x11)
+        self.segment(False, flags=0x11)
+
+    def bytes(self) -> bytes:
+        return b"".join(self.frames)
+
+
+def packet(seq: int, payload: bytes) -> bytes:
+    return struct.pack("<I", len(payload))[:3] + bytes([seq]) + payload
+
+
+def compressed(seq: int, data: bytes) -> bytes:
+    body = zlib.compress(data)
+    return (
+        struct.pack("<I", len(body))[:3]
+        + bytes([seq])
+        + struct.pack("<I", len(data))[:3]
+        + body
+    )
+
+
+def query(text: bytes) -> bytes:
+    return packet(0, b"\x03" + text)
+
+
+def read(data: bytes, chunk_size: int = pcap.DEFAULT_CHUNK_SIZE):
+    return list(pcap.read_pcap(io.BytesIO(data), chunk_size=chunk_size))
+
+
+class TestPcap(unittest.TestCase):
+    def test_read_pcap(self):
+        with open(os.path.join(DATA, "mysql.pcap"), "rb") as capture:
+            queries = list(mysql_distill.read_pcap(capture))
+
+        self.assertEqual(
+            [(captured.db, captured.query) for captured in queries],
+            [
+                ("shop", "SELECT * FROM orders WHERE id = 1"),
+                ("shop", "use archive"),
+                ("archive", "insert into items (a, b) values (1, 'x;y')"),
+                ("stats", "select count(*) from hits"),
+            ],
+            msg="Tracks the database from the handshake, USE and COM_INIT_DB",
+        )
+        first = queries[0]
+        self.assertEqual(first.client, "10.0.0.2:50000")
+        self.assertEqual(first.server, "10.0.0.1:3306")
+        self.assertEqual(first.connection_id, 42)
+        self.assertEqual(first.user, "app")
+        self.assertAlmostEqual(first.latency, 0.0025, places=5)
+        self.assertEqual(first.attributes["query_time"], first.latency)
+        self.assertIsNone(queries[-1].latency, msg="Closed before a response")
+        self.assertEqual(
+            [mysql_distill.distill(captured.query) for captured in queries],
+            ["SELECT orders", "USE", "INSERT items", "SELECT hits"],
+        )
+
+    def test_chunks(self):
+        with open(os.path.join(DATA, "mysql.pcap"), "rb") as capture:
+            data = capture.read()
+        reader = mysql_distill.PcapReader()
+        queries = []
+        for pos in range(len(data)):
+            queries += reader.feed(data[pos : pos + 1])
+        queries += reader.close()
+        self.assertEqual(
+            [captured.query for captured in queries],
+            [captured.query for captured in read(data)],
+            msg="Any chunk size",
+        )
+        self.assertEqual(reader.packets, 18)
+
+    def test_compressed(self):
+        with open(os.path.join(DATA, "mysql_compressed.pcap"), "rb") as capture:
+            queries = list(mysql_distill.read_pcap(capture))
+        self.assertEqual(
+            [captured.query for captured in queries],
+            ["select @@version_comment limit 1", "SELECT * FROM t1 JOIN t2 USING (id)"],
+        )
+
+    def test_large_payload(self):
+        capture = Capture()
+        capture.connect()
+        text = b"SELECT * FROM big WHERE a IN (" + b"1," * (9 << 20) + b"1)"
+        payload = b"\x03" + text
+        data = packet(0, payload[:0xFFFFFF]) + packet(1, payload[0xFFFFFF:])
+        for pos in range(0, len(data), 65000):
+            capture.client(data[pos : pos + 65000], delay=0)
+        capture.server(packet(1, b"\x01"))
+        (captured,) = read(capture.bytes())
+        self.assertEqual(captured.query.encode(), text)
+
+    def test_reassembly(self):
+        capture = Capture()
+        capture.connect()
+        data = query(b"select * from reordered")
+        start = capture.client_seq
+        capture.client(data[10:], seq=start + 10)
+        capture.client(data[:10], seq=start)
+        # Retransmitted
+        capture.client(data[:15], seq=start)
+        capture.client_seq += len(data)
+        capture.server(packet(1, b"\x01"))
+        capture.client(query(b"select 2"))
+        capture.close()
+        queries = read(capture.bytes())
+        self.assertEqual(
+            [captured.query for captured in queries],
+            ["select * from reordered", "select 2"],
+        )
+
+    def test_mid_stream(self):
+        capture = Capture()
+        # No handshake: the capture started on an open connection
+        capture.client(b"ERY, but only the end of a query")
+        capture.client(query(b"select 1"))
+        capture.server(packet(1, b"\x01"))
+        capture.close()
+        queries = read(capture.bytes())
+        self.assertEqual(
+            [(captured.query, captured.connection_id) for captured in queries],
+            [("select 1", None)],
+            msg="Waits for a segment starting a command",
+        )
+
+        capture = Capture()
+        capture.client(compressed(0, query(b"select * from zipped")))
+        capture.client(compressed(0, query(b"select 2")))
+        capture.close()
+        self.assertEqual(
+            [captured.query for captured in read(capture.bytes())],
+            ["select * from zipped", "select 2"],
+            msg="Recognizes compression",
+        )
+
+    def test_lost_data(self):
+        capture = Capture()
+        capture.connect()
+        capture.client(query(b"select * from cut " + b"x" * 200), snap=100)
+        capture.client(query(b"select 2"))
+        capture.close()
+        reader = mysql_distill.PcapReader()
+        queries = reader.feed(capture.bytes()) + reader.close()
+        self.assertEqual([captured.query for captured in queries], ["select 2"])
+        self.assertEqual(reader.gaps, 1)
+
+    def test_skipped(self):
+        capture = Capture()
+        capture.connect(capabilities=CLIENT_CAPABILITIES | 0x800)
+        capture.client(b"\x16\x03\x01 TLS client hello")
+        capture.close()
+        reader = mysql_distill.PcapReader()
+        self.assertEqual(reader.feed(capture.bytes()) + reader.close(), [])
+        self.assertEqual(reader.skipped, 1)
+
+        with self.assertRaises(ValueError):
+            mysql_distill.PcapReader().feed(b"\x0a\x0d\x0d\x0a" + b"\x00" * 20)
+
+    def test_query_attributes(self):
+        capture = Capture()
+        capture.connect(capabilities=CLIENT_CAPABILITIES | 0x08000000)
+        attribute = b"\x01\x01\x00\x01\xfe\x00\x03key\x05value"
+        capture.client(packet(0, b"\x03" + attribute + b"select 1"))
+        capture.client(packet(0, b"\x03\x00\x01select 2"))
+        capture.close()
+        self.assertEqual(
+            [captured.query for captured in read(capture.bytes())],
+            ["select 1", "select 2"],
+        )
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["--input-format", "pcap", "--file", f"{DATA}/mysql.pcap"])
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            ["SELECT orders", "USE", "INSERT items", "SELECT hits"],
+        )
+
+
+def write_fixtures() -> None:
+    """
+    Write the capture fixtures, in the framing tcpdump writes
+    """
+    capture = Capture()
+    capture.connect(db=b"shop")
+    capture.client(query(b"SELECT * FROM orders WHERE id = 1"))
+    capture.server(packet(1, b"\x01"), delay=0.0025)
+    capture.server(packet(2, b"\x03def\x00\x00\x00\x02id\x00\x0c?\x00"))
+    capture.client(query(b"use archive"))
+    capture.server(packet(1, b"\x00\x00\x00\x02\x00\x00\x00"))
+    capture.client(query(b"insert into items (a, b) values (1, 'x;y')"))
+    capture.server(packet(1, b"\x00\x01\x00\x02\x00\x00\x00"))
+    capture.client(packet(0, b"\x02stats"))
+    capture.server(packet(1, b"\x00\x00\x00\x02\x00\x00\x00"))
+    capture.client(query(b"select count(*) from hits"))
+    capture.close()
+    with open(os.path.join(DATA, "mysql.pcap"), "wb") as fixture:
+        fixture.write(capture.bytes())
+
+    capture = Capture(client_port=50001)
+    capture.connect(capabilities=CLIENT_CAPABILITIES | 0x20)
+    capture.client(compressed(0, query(b"select @@version_comment limit 1")))
+    capture.server(compressed(1, packet(1, b"\x01")))
+    capture.client(compressed(0, query(b"SELECT * FROM t1 JOIN t2 USING (id)")))
+    capture.server(compressed(1, packet(1, b"\x01")))
+    capture.close()
+    with open(os.path.join(DATA, "mysql_compressed.pcap"), "wb") as fixture:
+        fixture.write(capture.bytes())
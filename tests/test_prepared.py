@@ -0,0 +1,81 @@
+import unittest
+
+from unittest import mock
+
+import mysql_distill
+
+from mysql_distill import parser, rewriter
+
+queries = [
+    "select * from foo join bar using (id)",
+    "/* app */ CREATE TABLE db.tbl (a int)",
+    "INSERT LOW_PRIORITY INTO t1 (a) VALUES ('x'), ('y')",
+    "LOCK TABLES t1 READ, t2 WRITE",
+    "SHOW /*!50002 FULL*/ TABLES",
+    "BEGIN",
+    "update t set a = 'delete from x' where id = 1",
+]
+
+
+class TestPreparedQuery(unittest.TestCase):
+    def tearDown(self):
+        mysql_distill.disable_cache()
+
+    def test_results(self):
+        for engine in (mysql_distill.ENGINE_REGEX, mysql_distill.ENGINE_LEXER):
+            for query in queries:
+                prepared = mysql_distill.PreparedQuery(query)
+                self.assertEqual(
+                    mysql_distill.distill_result(prepared, engine),
+                    mysql_distill.distill_result(query, engine),
+                )
+                self.assertEqual(
+                    mysql_distill.get_tables(prepared, engine),
+                    mysql_distill.get_tables(query, engine),
+                )
+                self.assertEqual(
+                    mysql_distill.distill_verbs(prepared, engine),
+                    mysql_distill.distill_verbs(query, engine),
+                )
+
+    def test_steps_computed_once(self):
+        prepared = mysql_distill.PreparedQuery(
+            "select a from foo where b = 'it''s' -- comment"
+        )
+        with mock.patch.object(
+            rewriter, "strip_comments", wraps=rewriter.strip_comments
+        ) as strip_comments, mock.patch.object(
+            parser, "_mask_literals", wraps=parser._mask_literals
+        ) as mask_literals:
+            mysql_distill.distill(prepared)
+            mysql_distill.distill_verbs(prepared)
+            mysql_distill.get_tables(prepared)
+            mysql_distill.get_tables(prepared)
+        strip_comments.assert_called_once()
+        mask_literals.assert_called_once()
+        self.assertEqual(prepared.leading_keyword, ("SELECT", 0))
+        self.assertEqual(prepared.masked, "select a from foo where b = ?? -- comment")
+
+    def test_steps(self):
+        prepared = mysql_distill.PreparedQuery("-- x\ndrop table if exists t")
+        self.assertEqual(prepared.stripped, "\ndrop table if exists t")
+        self.assertEqual(prepared.leading_keyword, ("DROP", 5))
+        self.assertEqual(prepared.data_def, "", msg="Not at the start of the text")
+        self.assertEqual(prepared.stripped_data_def, "drop")
+
+        prepared = mysql_distill.PreparedQuery("INSERT INTO t VALUES (1), (2)")
+        self.assertEqual(prepared.query, "INSERT INTO t VALUES (1), (2)")
+        self.assertEqual(prepared.text, "INSERT INTO t VALUES ")
+        self.assertIs(prepared.tokens, prepared.tokens)
+
+    def test_cache(self):
+        mysql_distill.enable_cache()
+        query = "select * from foo"
+        prepared = mysql_distill.PreparedQuery(query)
+        self.assertEqual(mysql_distill.distill(prepared), "SELECT foo")
+        self.assertEqual(mysql_distill.get_tables(prepared), ["foo"])
+        self.assertEqual(mysql_distill.cache_info()["distill"].misses, 1)
+        mysql_distill.distill(query)
+        self.assertEqual(
+            mysql_distill.cache_info()["distill"].hits, 1, msg="Keyed by the query"
+        )
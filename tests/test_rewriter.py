@@ -628,6 +628,186 @@ class TestQueryRewriter(unittest.TestCase):
             msg="distill UNION",
         )
 
+    def test_fingerprint(self):
+        fingerprints = {
+            "SELECT * FROM foo WHERE id = 1": "select * from foo where id = ?",
+            "select * from foo where name='a' and b IS NULL": (
+                "select * from foo where name=? and b is ?"
+            ),
+            "select * from t where a in (1, 2,3) and b=-5 and c = d - 3": (
+                "select * from t where a in(?+) and b=? and c = d - ?"
+            ),
+            "select x'ab', b'01', 0x1F, 1.5e-3, TRUE": "select ?, ?, ?, ?, ?",
+            "INSERT INTO t (a,b) VALUES (1,'a'),(2,'b'), (3, NULL)": (
+                "insert into t (a,b) values(?+)"
+            ),
+            "select /* hi */ count(*)\n\tfrom  `Foo`.Bar -- c\n": (
+                "select count(*) from `foo`.bar"
+            ),
+            "select 1 from a where b in (select c from d)": (
+                "select ? from a where b in (select c from d)"
+            ),
+        }
+        for query, expected in fingerprints.items():
+            self.assertEqual(
+                mysql_distill.fingerprint(query).fingerprint,
+                expected,
+                msg=f"fingerprints {query}",
+            )
+
+        self.assertEqual(
+            mysql_distill.fingerprint("select * from foo where id = 1"),
+            mysql_distill.fingerprint("SELECT *\nFROM foo WHERE id = 42"),
+            msg="Queries of the same shape share a fingerprint and checksum",
+        )
+        self.assertEqual(
+            mysql_distill.fingerprint("select 1").checksum,
+            "16219655761820A2",
+            msg="Checksum is stable",
+        )
+        self.assertEqual(
+            mysql_distill.distill_fingerprint("insert into foo(a) values(1),(2)"),
+            (
+                "INSERT foo",
+                mysql_distill.fingerprint("insert into foo(a) values(1),(2)"),
+            ),
+            msg="Distills and fingerprints together",
+        )
+
+    def test_distill_batch(self):
+        codes, uniques = mysql_distill.distill_batch(
+            [
+                "select * from foo",
+                "SELECT * FROM foo",
+                "delete from bar",
+                None,
+                "select * from foo",
+                "select a from foo",
+            ]
+        )
+        self.assertEqual(uniques, ["SELECT foo", "DELETE bar"])
+        self.assertEqual(list(codes), [0, 0, 1, -1, 0, 0])
+        self.assertEqual(memoryview(codes).format, "q", msg="Exposes a buffer")
+
+        codes, uniques = mysql_distill.distill_batch(iter([]))
+        self.assertEqual((list(codes), uniques), ([], []))
+
+    def test_distill_bytes(self):
+        for query in (
+            "SELECT /*!40001 SQL_NO_CACHE */ * FROM `film`",
+            "CALL foo(1, 2, 3)",
+            "SHOW FULL PROCESSLIST",
+            "DROP TABLE IF EXISTS foo",
+            "LOAD DATA INFILE '/tmp/foo.txt' INTO TABLE db.tbl",
+            "administrator command: Quit",
+            "INSERT INTO t (a) VALUES (1), (2) ON DUPLICATE KEY UPDATE a = 1",
+        ):
+            self.assertEqual(
+                mysql_distill.distill_bytes(query.encode()),
+                mysql_distill.distill(query, mysql_distill.ENGINE_LEXER),
+                msg=query,
+            )
+
+        data = b"x INSERT INTO caf\xc3\xa9 VALUES ('\xff\xfe'); y"
+        self.assertEqual(
+            mysql_distill.distill_bytes(memoryview(data)[2:-3]),
+            "INSERT caf\xe9",
+            msg="Distills a slice with binary data without decoding it",
+        )
+
+    def test_distill_result(self):
+        for query, verbs, tables, kind in (
+            ("select * from a join b", ("SELECT",), ("a", "b"), "DML"),
+            ("(select 1 from a) union (select 2)", ("SELECT", "UNION"), ("a",), "DML"),
+            ("CREATE TABLE db.t (a int)", ("CREATE", "TABLE"), ("db.t",), "DDL"),
+            ("SHOW FULL TABLES", ("SHOW", "TABLES"), (), "SHOW"),
+            ("LOAD DATA INFILE 'f' INTO TABLE t", ("LOAD", "DATA"), ("t",), "DML"),
+            ("administrator command: Ping", ("ADMIN", "PING"), (), "admin"),
+            ("LOCK TABLES t READ", ("LOCK",), ("t",), "transaction"),
+            ("XA START 'x'", ("XA_START",), (), "transaction"),
+            ("commit", ("COMMIT",), (), "transaction"),
+        ):
+            result = mysql_distill.distill_result(query)
+            self.assertEqual(
+                (result.verbs, result.tables, result.kind), (verbs, tables, kind)
+            )
+            self.assertEqual(result.canonical, mysql_distill.distill(query))
+            self.assertIsNone(result.fingerprint)
+            self.assertIsNone(result.checksum)
+
+        result = mysql_distill.distill_result(
+            "select * from a where b = 1", checksum=True
+        )
+        self.assertEqual(
+            result.checksum,
+            mysql_distill.fingerprint("select * from a where b = 2").checksum,
+        )
+        self.assertEqual(result.canonical, "SELECT a")
+
+        query = "insert into log select * from src where x = 'a; insert into other'"
+        for engine in (mysql_distill.ENGINE_REGEX, mysql_distill.ENGINE_LEXER):
+            result = mysql_distill.distill_result(query, engine, checksum=True)
+            self.assertEqual(
+                result.canonical,
+                mysql_distill.distill(query, engine),
+                msg=f"The checksum does not change the {engine} engine",
+            )
+            self.assertEqual(
+                (result.fingerprint, result.checksum),
+                tuple(mysql_distill.fingerprint(query)),
+            )
+
+    def test_distill_verbs_dispatch(self):
+        for query, verbs in (
+            ("BEGIN", "BEGIN"),
+            ("  rollback ", "ROLLBACK"),
+            ("set autocommit = 1", "SET"),
+            ("START TRANSACTION", "START"),
+            ("/* app */ CALL foo(1)", "CALL foo"),
+            ("-- app\nUSE db", "USE"),
+            ("users", ""),
+            ("CALL foo", ""),
+            ("# c\nSHOW FULL PROCESSLIST", "SHOW PROCESSLIST"),
+        ):
+            self.assertEqual(
+                mysql_distill.distill_verbs(query), (verbs, ""), msg=repr(query)
+            )
+
+    def test_engine_parity(self):
+        for query, distilled in (
+            ("\\' SELECT * FROM t WHERE a = 'x'", "SELECT t"),
+            ("INSERT /*!40001 SQL_NO_CACHE */ INTO foo VALUES (1)", "INSERT foo"),
+            ("UPDATE /*!40001 LOW_PRIORITY */ foo SET a = 1", "UPDATE"),
+            ("SELECT * FROM foo, bar , WHERE a = 1", "SELECT foo bar"),
+            ("SELECT * FROM foo, bar , ORDER BY a", "SELECT foo bar"),
+            ("/*!40101 SET NAMES utf8 */", ""),
+        ):
+            self.assertEqual(mysql_distill.distill(query), distilled, msg=repr(query))
+            self.assertEqual(
+                mysql_distill.distill_bytes(query.encode()), distilled, msg=repr(query)
+            )
+
+    def test_leading_whitespace_and_comments(self):
+        for query, distilled in (
+            ("\n COMMIT", "COMMIT"),
+            ("/* x */ COMMIT", "COMMIT"),
+            ("-- x\n# y\n  begin", "BEGIN"),
+            ("/* x */ COMMIT WORK", "COMMIT"),
+            ("\t set autocommit=1", "SET"),
+            ("  SHOW AS ROLLBACK WRITE t2", "SHOW AS ROLLBACK"),
+            ("/* c */ USE SELECT x FROM COMMIT", "USE COMMIT"),
+            ("/* a */ /* b */ xa start 1", "XA_start"),
+            ("# c\n CALL foo(1)", "CALL foo"),
+            ("/* c */ select * from t", "SELECT t"),
+        ):
+            for engine in mysql_distill.ENGINES:
+                self.assertEqual(
+                    mysql_distill.distill(query, engine),
+                    distilled,
+                    msg=f"{query!r} with the {engine} engine",
+                )
+            self.assertEqual(mysql_distill.distill_bytes(query.encode()), distilled)
+
     def test_strip_comments(self):
         self.assertEqual(
             mysql_distill.strip_comments("select \n--bar\n foo"),
@@ -656,3 +836,15 @@ class TestQueryRewriter(unittest.TestCase):
             "select /*!40101 hello*/ 1",
             msg="Left version star comment",
         )
+
+
+class TestQueryRewriterLexer(TestQueryRewriter):
+    """
+    The same cases, run against the single-pass tokenizer engine.
+    """
+
+    def setUp(self):
+        mysql_distill.set_engine(mysql_distill.ENGINE_LEXER)
+
+    def tearDown(self):
+        mysql_distill.set_engine(mysql_distill.ENGINE_REGEX)
@@ -0,0 +1,83 @@
+import io
+import os
+import unittest
+
+import mysql_distill
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestSlowLog(unittest.TestCase):
+    def test_parse_slow_log(self):
+        with open(os.path.join(DATA, "slow.log")) as log:
+            records = list(mysql_distill.parse_slow_log(log))
+
+        self.assertEqual(
+            [record.query for record in records],
+            [
+                "SELECT *\n  FROM orders\n WHERE id = 1",
+                "insert into items (a, b) values (1, 'x;y')",
+                "administrator command: Quit",
+            ],
+            msg="Skips the server banner and preambles, keeps multi-line queries",
+        )
+        self.assertEqual(
+            records[0].attributes,
+            {
+                "time": "2023-05-01T10:00:00.123456Z",
+                "user": "app",
+                "host": "db1",
+                "ip": "10.0.0.1",
+                "id": 42,
+                "query_time": 1.5,
+                "lock_time": 0.0001,
+                "rows_sent": 1,
+                "rows_examined": 9,
+                "db": "shop",
+                "timestamp": 1682935200,
+            },
+        )
+        self.assertNotIn("db", records[1].attributes)
+        self.assertEqual(records[2].attributes["query_time"], 0.00001)
+        self.assertEqual(
+            [mysql_distill.distill(record.query) for record in records],
+            ["SELECT orders", "INSERT items", "ADMIN QUIT"],
+        )
+
+    def test_comment_in_statement(self):
+        log = io.StringIO(
+            "# User@Host: app[app] @ db1 [10.0.0.1]\n"
+            "# Query_time: 1  Lock_time: 0\n"
+            "SELECT *\n"
+            "# Rows: many\n"
+            "  FROM orders;\n"
+            "# User@Host: app[app] @ db1 [10.0.0.1]\n"
+            "# Query_time: 2  Lock_time: 0\n"
+            "select 1;\n"
+        )
+        records = list(mysql_distill.parse_slow_log(log))
+        self.assertEqual(
+            [record.query for record in records],
+            ["SELECT *\n# Rows: many\n  FROM orders", "select 1"],
+            msg="A comment line does not split the statement",
+        )
+        self.assertNotIn("rows", records[0].attributes)
+        self.assertEqual(records[1].attributes["query_time"], 2)
+
+    def test_percona_attributes(self):
+        log = io.StringIO(
+            "# Time: 230501 10:00:00\n"
+            "# User@Host: app[app] @  [10.0.0.2]\n"
+            "# Thread_id: 7  Schema: shop  QC_hit: No\n"
+            "# Query_time: 2  Lock_time: 0\n"
+            "select 1;\n"
+        )
+        (record,) = mysql_distill.parse_slow_log(log)
+        self.assertEqual(record.query, "select 1")
+        self.assertEqual(record.attributes["time"], "230501 10:00:00")
+        self.assertEqual(record.attributes["host"], "")
+        self.assertEqual(record.attributes["ip"], "10.0.0.2")
+        self.assertEqual(record.attributes["thread_id"], 7)
+        self.assertEqual(record.attributes["schema"], "shop")
+        self.assertEqual(record.attributes["qc_hit"], "No")
+        self.assertEqual(record.attributes["query_time"], 2)
@@ -0,0 +1,75 @@
+import io
+import unittest
+
+from mysql_distill import splitter
+
+SCRIPT = """-- header comment
+/*!40101 SET NAMES utf8 */;
+select 1; select 'a;b', "c;d", `e;f` from t -- tail; comment
+where x = 5--3;
+# hash ; comment
+insert into t values ('it''s; \\' ok');
+/* block ; comment */
+DELIMITER $$
+CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END$$
+select $a$$
+delimiter //
+select 4/2, a/**/b//
+delimiter ;
+select delimiter_x from t # x;y
+;
+update t set a = 'x'"""
+
+STATEMENTS = [
+    "/*!40101 SET NAMES utf8 */",
+    "select 1",
+    "select 'a;b', \"c;d\", `e;f` from t -- tail; comment\nwhere x = 5--3",
+    "insert into t values ('it''s; \\' ok')",
+    "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END",
+    "select $a",
+    "select 4/2, a/**/b",
+    "select delimiter_x from t # x;y",
+    "update t set a = 'x'",
+]
+
+
+class TestSplitter(unittest.TestCase):
+    def test_split_statements(self):
+        self.assertEqual(
+            list(splitter.split_statements(io.StringIO(SCRIPT))), STATEMENTS
+        )
+        self.assertEqual(
+            list(splitter.split_statements(io.StringIO(" ;\n-- only\n;"))), []
+        )
+
+    def test_split_statements_chunk_size(self):
+        for chunk_size in range(1, len(SCRIPT) + 1, 3):
+            self.assertEqual(
+                list(splitter.split_statements(io.StringIO(SCRIPT), chunk_size)),
+                STATEMENTS,
+                msg=f"chunk_size={chunk_size}",
+            )
+
+    def test_split_buffer(self):
+        buffer = SCRIPT.encode()
+        spans = list(splitter.split_buffer(buffer))
+        self.assertEqual(
+            [buffer[start:stop].decode() for start, stop, _ in spans], STATEMENTS
+        )
+        self.assertEqual(
+            [delimiter for _, _, delimiter in spans],
+            [";"] * 4 + ["$$"] * 2 + ["//", ";", ";"],
+        )
+        self.assertEqual(list(splitter.split_buffer(memoryview(b" ;\n-- only\n;"))), [])
+
+        for start, stop, delimiter in spans:
+            self.assertEqual(
+                list(splitter.split_buffer(buffer, start, len(buffer), delimiter))[0],
+                (start, stop, delimiter),
+                msg="Splits from any statement given its delimiter",
+            )
+
+        self.assertEqual(
+            list(splitter.batch_statements(iter(["ab", "cd", "e", "f"]), 3)),
+            [["ab", "cd"], ["e", "f"]],
+        )
@@ -0,0 +1,55 @@
+import unittest
+
+import mysql_distill
+from mysql_distill import stats
+
+
+class TestStats(unittest.TestCase):
+    queries = [
+        "BEGIN",
+        "SELECT * FROM foo /* comment */ WHERE id = 1",
+        "CALL foo(1)",
+        "SHOW FULL PROCESSLIST",
+        "DROP TABLE IF EXISTS bar",
+        "administrator command: Ping",
+    ]
+    branches = {"fixed": 1, "generic": 1, "CALL": 1, "SHOW": 1, "DDL": 1, "admin": 1}
+
+    def test_collect_stats(self):
+        with mysql_distill.collect_stats() as collector:
+            for query in self.queries:
+                mysql_distill.distill(query)
+        self.assertIsNone(stats.collector, msg="Removed after the block")
+
+        self.assertEqual(dict(collector.branches), self.branches)
+        self.assertEqual(collector.calls["distill"], len(self.queries))
+        self.assertEqual(collector.calls["verbs"], len(self.queries) - 1)
+        self.assertEqual(collector.calls["show"], 1)
+        self.assertEqual(collector.calls["ddl"], 1)
+        self.assertGreater(collector.nanoseconds["distill"], 0)
+
+        data = collector.as_dict()
+        self.assertEqual(data["branches"]["generic"], {"hits": 1})
+        self.assertEqual(data["stages"]["distill"]["calls"], len(self.queries))
+        self.assertTrue(collector.report().startswith("stage"))
+
+        mysql_distill.distill("SELECT 1")
+        self.assertEqual(collector.calls["distill"], len(self.queries))
+
+    def test_collect_stats_lexer(self):
+        with mysql_distill.collect_stats() as collector:
+            for query in self.queries:
+                mysql_distill.distill(query, engine=mysql_distill.ENGINE_LEXER)
+        self.assertEqual(dict(collector.branches), self.branches)
+        self.assertEqual(collector.calls["tokenize"], len(self.queries) - 1)
+
+    def test_merge(self):
+        first = stats.StatsCollector()
+        first.hit("generic")
+        first.add_time("verbs", 10)
+        second = stats.StatsCollector()
+        second.hit("generic")
+        second.add_time("verbs", 5)
+        first.merge(second)
+        self.assertEqual(first.branches["generic"], 2)
+        self.assertEqual((first.calls["verbs"], first.nanoseconds["verbs"]), (2, 15))
@@ -0,0 +1,126 @@
+import unittest
+
+import mysql_distill
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            mysql_distill.tokenize("select a.b, `x y`.z from t"),
+            [
+                ("w", "select", "SELECT"),
+                ("i", "a.b", "A.B"),
+                ("p", ",", ","),
+                ("i", "`x y`.z", "`X Y`.Z"),
+                ("w", "from", "FROM"),
+                ("w", "t", "T"),
+            ],
+            msg="Tokenizes words, qualified identifiers and punctuation",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("select 'it''s', \"a\\\"b\", 'from x'"),
+            [
+                ("w", "select", "SELECT"),
+                ("s", "'it''s'", "'it''s'"),
+                ("p", ",", ","),
+                ("s", '"a\\"b"', '"a\\"b"'),
+                ("p", ",", ","),
+                ("s", "'from x'", "'from x'"),
+            ],
+            msg="Keeps quoted strings whole, including escaped quotes",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("select /* from x */ 1 -- from y\n# from z\n"),
+            [("w", "select", "SELECT"), ("n", "1", "1")],
+            msg="Drops comments",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("SHOW /*!50002 GLOBAL */ STATUS"),
+            [
+                ("w", "SHOW", "SHOW"),
+                ("v", "/*!50002", "/*!50002"),
+                ("w", "GLOBAL", "GLOBAL"),
+                ("v", "*/", "*/"),
+                ("w", "STATUS", "STATUS"),
+            ],
+            msg="Keeps version comments and their contents",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("\\' select 'a'"),
+            [("p", "\\'", "\\'"), ("w", "select", "SELECT"), ("s", "'a'", "'a'")],
+            msg="An escaped quote outside a string does not open one",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("select 5.001, -1e3, 0x1F, b'01', 12_foo"),
+            [
+                ("w", "select", "SELECT"),
+                ("n", "5.001", "5.001"),
+                ("p", ",", ","),
+                ("p", "-", "-"),
+                ("n", "1e3", "1E3"),
+                ("p", ",", ","),
+                ("n", "0x1F", "0X1F"),
+                ("p", ",", ","),
+                ("s", "b'01'", "b'01'"),
+                ("p", ",", ","),
+                ("w", "12_foo", "12_FOO"),
+            ],
+            msg="Tokenizes numbers and bit literals",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize("select 'unterminated"),
+            [("w", "select", "SELECT"), ("s", "'unterminated", "'unterminated")],
+            msg="Tolerates unterminated strings",
+        )
+
+    def test_tokenize_bytes(self):
+        query = "SELECT `a`.b, 0x1F FROM db.t -- x\nWHERE c = /*!50000 1 */ 2"
+        self.assertEqual(
+            mysql_distill.tokenize_bytes(query.encode()),
+            mysql_distill.tokenize(query),
+            msg="Tokenizes bytes like text",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize_bytes(
+                memoryview(b"select * from t_\xc3\xa9 where s = '\xff\x00'")
+            ),
+            [
+                ("w", "select", "SELECT"),
+                ("p", "*", "*"),
+                ("w", "from", "FROM"),
+                ("w", "t_\xe9", "T_\xc9"),
+                ("w", "where", "WHERE"),
+                ("w", "s", "S"),
+                ("p", "=", "="),
+                ("s", "''", "''"),
+            ],
+            msg="Decodes UTF-8 words but not strings",
+        )
+
+        self.assertEqual(
+            mysql_distill.tokenize_bytes(bytearray(b"select caf\xe9")),
+            [("w", "select", "SELECT"), ("w", "caf\xe9", "CAF\xc9")],
+            msg="Decodes other words as Latin-1",
+        )
+
+    def test_engine(self):
+        self.assertEqual(mysql_distill.get_engine(), mysql_distill.ENGINE_REGEX)
+        self.assertEqual(
+            mysql_distill.distill("select * from t where c = 'delete'", "lexer"),
+            "SELECT t",
+        )
+        self.assertEqual(
+            mysql_distill.get_tables("select * from t1 join t2", "lexer"),
+            ["t1", "t2"],
+        )
+        with self.assertRaises(ValueError):
+            mysql_distill.set_engine("nonsense")
+        with self.assertRaises(ValueError):
+            mysql_distill.distill("select 1", "nonsense")
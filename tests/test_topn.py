@@ -0,0 +1,119 @@
+import io
+import os
+import random
+import unittest
+
+from collections import Counter
+from contextlib import redirect_stderr, redirect_stdout
+
+import mysql_distill
+
+from mysql_distill.__main__ import main
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def zipf_stream(size: int, seed: int = 1):
+    generator = random.Random(seed)
+    return [f"SELECT t{int(generator.paretovariate(1.2))}" for _ in range(size)]
+
+
+class TestSpaceSaving(unittest.TestCase):
+    def assertBounds(self, summary, exact):
+        for hitter in summary.top():
+            self.assertGreaterEqual(hitter.estimate + 1e-6, exact[hitter.distilled])
+            self.assertLessEqual(
+                hitter.estimate - hitter.error, exact[hitter.distilled] + 1e-6
+            )
+            self.assertLessEqual(hitter.error, summary.error_bound)
+
+    def test_exact_below_capacity(self):
+        summary = mysql_distill.SpaceSaving(10)
+        for query in ["select * from foo", "select * from bar", "select * from foo"]:
+            summary.add(query)
+        self.assertEqual(
+            summary.top(),
+            [
+                mysql_distill.HeavyHitter("SELECT foo", 2, 0, True),
+                mysql_distill.HeavyHitter("SELECT bar", 1, 0, True),
+            ],
+        )
+        self.assertEqual(summary.total, 3)
+
+    def test_bounds(self):
+        stream = zipf_stream(50000)
+        exact = Counter(stream)
+        summary = mysql_distill.SpaceSaving(100)
+        for distilled in stream:
+            summary.add_class(distilled)
+
+        self.assertEqual(len(summary), 100, msg="Fixed number of counters")
+        self.assertBounds(summary, exact)
+        top = summary.top(10)
+        self.assertTrue(all(hitter.guaranteed for hitter in top))
+        self.assertEqual(
+            [hitter.distilled for hitter in top],
+            [distilled for distilled, _ in exact.most_common(10)],
+        )
+        self.assertFalse(summary.top()[-1].guaranteed, msg="The tail is not guaranteed")
+
+    def test_weight(self):
+        generator = random.Random(2)
+        stream = [
+            (distilled, {"query_time": generator.random()})
+            for distilled in zipf_stream(20000)
+        ]
+        exact: Counter = Counter()
+        summary = mysql_distill.SpaceSaving(50, weight="query_time")
+        for distilled, attributes in stream:
+            exact[distilled] += attributes["query_time"]
+            summary.add_class(distilled, attributes)
+        summary.add_class("SELECT untimed")
+        summary.add_class("SELECT untimed", {"query_time": 0})
+
+        self.assertAlmostEqual(summary.total, sum(exact.values()))
+        self.assertBounds(summary, exact)
+        self.assertEqual(summary.top(1)[0].distilled, exact.most_common(1)[0][0])
+
+    def test_merge(self):
+        stream = zipf_stream(20000, seed=3)
+        exact = Counter(stream)
+        summaries = [mysql_distill.SpaceSaving(60) for _ in range(2)]
+        for pos, distilled in enumerate(stream):
+            summaries[pos % 2].add_class(distilled)
+        summaries[0].merge(summaries[1])
+        self.assertEqual(len(summaries[0]), 60)
+        self.assertEqual(summaries[0].total, len(stream))
+        self.assertBounds(summaries[0], exact)
+
+        with self.assertRaises(ValueError):
+            summaries[0].merge(mysql_distill.SpaceSaving(60, weight="query_time"))
+        with self.assertRaises(ValueError):
+            mysql_distill.SpaceSaving(0)
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "--input-format",
+                    "slowlog",
+                    "--top",
+                    "2",
+                    "--weight",
+                    "query_time",
+                    "--file",
+                    os.path.join(DATA, "slow.log"),
+                ]
+            )
+        self.assertEqual(
+            output.getvalue().splitlines()[:2],
+            [
+                "query_time\terror\tguaranteed\tclass",
+                "1.500000\t0\tyes\tSELECT orders",
+            ],
+        )
+
+        with redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+            main(["--query", "select 1", "--top", "2"])
+        self.assertIn("--top cannot be combined with --query", stderr.getvalue())